@@ -53,7 +53,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.HealthCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -134,7 +136,7 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.2/howto/static-files/
 
 STATIC_URL = '/static/static/'
-MEDIA_URL = '/static/media/'
+MEDIA_URL = '/media/'
 
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
@@ -148,8 +150,98 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.ScopedTokenBucketThrottle',
+    ],
+    # Per user token bucket rates ('<tokens>/<s|m|h|d>'); empty disables.
+    'DEFAULT_THROTTLE_RATES': {
+        'recipe_list': os.environ.get('THROTTLE_RECIPE_LIST', '600/m') or None,
+        'recipe_write': os.environ.get('THROTTLE_RECIPE_WRITE', '120/m') or None,
+        'recipe_upload': os.environ.get('THROTTLE_RECIPE_UPLOAD', '20/m') or None,
+    },
 }
 
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
+
+# Version of the deployed code, used to key the precomputed OpenAPI
+# schema. Falls back to a hash of the Python sources when unset.
+APP_VERSION = os.environ.get('APP_VERSION', '')
+SCHEMA_CACHE_DIR = os.environ.get('SCHEMA_CACHE_DIR', '/vol/web/schema')
+
+# Maintain the denormalized recipe summary table on writes and serve
+# recipe lists from it. Run `rebuild_recipe_summaries` after enabling.
+RECIPE_SUMMARY_ENABLED = bool(int(os.environ.get('RECIPE_SUMMARY_ENABLED', 0)))
+
+# Seconds a /readyz result is reused before dependencies are probed again.
+READINESS_CACHE_SECONDS = float(os.environ.get('READINESS_CACHE_SECONDS', 5))
+
+# The 'shared' cache is seen by all workers. CACHE_BACKEND is 'locmem'
+# (one process only, e.g. tests), 'file' (a CACHE_LOCATION directory
+# shared by the workers of a host) or 'memcached' (CACHE_LOCATION
+# host:port, needs pymemcache). 'default' keeps recently used entries
+# in process for CACHE_LOCAL_TIMEOUT seconds in front of it.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'core.cache.SharedFileCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_TIMEOUT': float(os.environ.get('CACHE_LOCAL_TIMEOUT', 5)),
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    'shared': {
+        'BACKEND': CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')],
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 100000)),
+        },
+    },
+}
+
+# Cache alias holding throttle buckets; must be shared by all workers.
+THROTTLE_CACHE = os.environ.get('THROTTLE_CACHE', 'shared')
+
+# Recipe images are served at MEDIA_URL by Django to their owner or to
+# anyone with a signed URL from the API, valid for MEDIA_URL_MAX_AGE to
+# twice that many seconds. With MEDIA_ACCEL_REDIRECT the response hands
+# the file off to the proxy's internal MEDIA_ACCEL_PREFIX location
+# instead of sending it.
+DEFAULT_FILE_STORAGE = 'core.storage.SignedMediaStorage'
+MEDIA_URL_MAX_AGE = int(os.environ.get('MEDIA_URL_MAX_AGE', 24 * 60 * 60))
+MEDIA_ACCEL_REDIRECT = bool(int(
+    os.environ.get('MEDIA_ACCEL_REDIRECT', int(not DEBUG))))
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Text responses smaller than this many bytes are sent uncompressed.
+GZIP_MIN_LENGTH = int(os.environ.get('GZIP_MIN_LENGTH', 1024))
+
+# Hashed static file names with gzipped copies, served by the proxy with
+# far-future expiry.
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
+# Users with at least this many recipes are matched against the
+# ingredients they have in an in-memory index instead of by a query.
+COOKABLE_INDEX_MIN_RECIPES = int(
+    os.environ.get('COOKABLE_INDEX_MIN_RECIPES', 5000))
+
+# User data can be spread over several databases, see core.sharding.
+# DB_SHARDS adds databases on the DB_HOST server as comma separated
+# alias=name pairs (e.g. "shard1=recipes1"), which need `migrate
+# --database <alias>`. SHARDS lists the aliases new users are placed on;
+# existing users stay where they are until moved with `move_user`.
+for _shard in filter(None, os.environ.get('DB_SHARDS', '').split(',')):
+    _alias, _name = _shard.split('=')
+    DATABASES[_alias] = {**DATABASES['default'], 'NAME': _name}
+SHARDS = os.environ.get('SHARDS', 'default').split(',')
+DATABASE_ROUTERS = ['core.sharding.ShardRouter']
+
+# Number of hash partitions by user of the recipe tables, see
+# core.partitioning. Changing it only affects tables partitioned later.
+RECIPE_PARTITIONS = int(os.environ.get('RECIPE_PARTITIONS', 16))
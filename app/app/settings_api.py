@@ -0,0 +1,54 @@
+"""
+Settings for the API worker pool.
+
+Extends the default settings, dropping the apps and middleware only the
+admin, browsable API and schema views need, so workers import and run
+less per request. Serve the admin and API docs from a process using
+`app.settings`.
+"""
+
+from app.settings import *  # noqa: F401,F403
+
+API_EXCLUDED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'drf_spectacular',
+]
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS  # noqa: F405
+    if app not in API_EXCLUDED_APPS
+]
+
+API_EXCLUDED_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE  # noqa: F405
+    if middleware not in API_EXCLUDED_MIDDLEWARE
+]
+
+ROOT_URLCONF = 'app.urls_api'
+
+TEMPLATES[0]['OPTIONS']['context_processors'] = [  # noqa: F405
+    'django.template.context_processors.request',
+]
+
+# Token authentication only (no sessions), JSON responses only (no
+# browsable API templates) and DRF's own schema class, so the OpenAPI
+# generator is never imported.
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,  # noqa: F405
+    'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.openapi.AutoSchema',
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+}
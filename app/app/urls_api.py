@@ -0,0 +1,20 @@
+"""
+URL configuration for the API worker pool (see app.settings_api).
+
+Only the API endpoints; the admin, schema and docs are served by
+processes using the default URLconf.
+"""
+from django.conf import settings
+from django.urls import include, path
+
+from recipe.views import RecipeImageView
+
+urlpatterns = [
+    path('api/user/', include('user.urls')),
+    path('api/recipe/', include('recipe.urls')),
+    path(
+        settings.MEDIA_URL.lstrip('/') + '<path:name>',
+        RecipeImageView.as_view(),
+        name='media',
+    ),
+]
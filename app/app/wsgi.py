@@ -7,10 +7,40 @@ For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 """
 
+import gc
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+
+from rest_framework.settings import api_settings
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+
+def preload():
+    '''Import everything a request needs before workers are forked.
+
+    uWSGI imports this module once in the master (no --lazy-apps) and
+    forks workers from it, so modules imported here are shared
+    copy-on-write instead of imported by every worker on its first
+    request. Freezing the garbage collector afterwards keeps collections
+    in workers from touching, and so copying, those shared objects. No
+    connections are opened here; they must not be shared across forks.
+    '''
+    get_resolver().url_patterns
+    for name in (
+        'DEFAULT_AUTHENTICATION_CLASSES',
+        'DEFAULT_PERMISSION_CLASSES',
+        'DEFAULT_RENDERER_CLASSES',
+        'DEFAULT_PARSER_CLASSES',
+        'DEFAULT_CONTENT_NEGOTIATION_CLASS',
+    ):
+        getattr(api_settings, name)
+    gc.collect()
+    gc.freeze()
+
+
+preload()
@@ -1,18 +1,271 @@
 '''Django admin customization.'''
+from collections import defaultdict
 
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.forms.models import BaseInlineFormSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-from core import models
+from core import deletion, hooks, models, sharding, summary
+
+# Counts estimated below this are exact counts instead.
+EXACT_COUNT_LIMIT = 10000
+CURSOR_VAR = 'after'
+
+
+def estimate_count(queryset):
+    '''Return the planner's estimate of the queryset's row count.
+
+    Unfiltered querysets are estimated from the table statistics in
+    pg_class (summed over partitions), others by EXPLAIN. Returns None
+    for tables that were never analyzed.
+    '''
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                'SELECT sum(reltuples), min(reltuples) FROM pg_class '
+                "WHERE relkind = 'r' AND (oid = %s::regclass OR oid IN "
+                '(SELECT relid FROM pg_partition_tree(%s::regclass)))',
+                [queryset.model._meta.db_table] * 2,
+            )
+            total, smallest = cursor.fetchone()
+            return None if smallest is None or smallest < 0 else int(total)
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        return cursor.fetchone()[0][0]['Plan']['Plan Rows']
+
+
+class EstimatedCountPaginator(Paginator):
+    '''Paginator estimating the count of large querysets.'''
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_LIMIT:
+            return super().count
+        self.estimated = True
+        return estimate
+
+
+class KeysetChangeList(ChangeList):
+    '''Change list paged by id, newest first, rather than by offset.
+
+    A page is the rows with an id below the `after` cursor, so late
+    pages cost as little as the first. Pages can only be followed
+    forward, and the list can't be sorted by other columns.
+    '''
+    keyset = True
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        super().__init__(request, *args, **kwargs)
+        # Like the page number, filter and search links drop the cursor.
+        self.params.pop(CURSOR_VAR, None)
+        self.first_url = self.cursor and self.get_query_string()
+        self.next_url = self.next_cursor and self.get_query_string(
+            {CURSOR_VAR: self.next_cursor})
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        queryset = self.queryset.order_by('-pk')
+        if self.cursor is not None:
+            try:
+                queryset = queryset.filter(pk__lt=int(self.cursor))
+            except ValueError:
+                raise IncorrectLookupParameters
+        rows = list(queryset[:self.list_per_page + 1])
+
+        self.paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.result_list = rows[:self.list_per_page]
+        self.next_cursor = (
+            self.result_list[-1].pk if len(rows) > self.list_per_page
+            else None
+        )
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.next_cursor)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    '''Admin pages for user data tables too large to count or page by
+    offset, listed newest first with their user.'''
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ['-id']
+    sortable_by = []
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
 
 
 class UserAdmin(BaseUserAdmin):
-    '''Define the admin pages for users.'''
+    '''Define the admin pages for users.
+
+    Users are deleted in the background by `core.deletion`, so deleting
+    one neither lists nor cascades to their data in the request.
+    '''
     ordering = ['id']
-    list_display = ['email', 'name']
+    list_display = ['email', 'name', 'is_active']
+    actions = ['delete_in_background']
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_deleted_objects(self, objs, request):
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        deletion.schedule(obj)
+
+    @admin.action(
+        description='Delete selected users in the background',
+        permissions=['delete'],
+    )
+    def delete_in_background(self, request, queryset):
+        '''Deactivate the users and queue the deletion of their data.'''
+        users = list(queryset)
+        for user in users:
+            deletion.schedule(user)
+        self.message_user(
+            request, f'Deleting {len(users)} users in the background.')
+
+
+class RecipeLinkFormSet(BaseInlineFormSet):
+    '''Recipe links refusing tags or ingredients of another user.
+
+    The autocomplete widgets search every user's items, as their
+    requests don't say which recipe is being edited.
+    '''
+
+    def clean(self):
+        super().clean()
+        user_id = self.instance.user_id
+        for form in self.forms:
+            for name in form._meta.fields:
+                value = getattr(form, 'cleaned_data', {}).get(name)
+                if getattr(value, 'user_id', user_id) != user_id:
+                    form.add_error(
+                        name, 'Must belong to the user of the recipe.')
+
+
+class RecipeTagInline(admin.TabularInline):
+    '''Tags of a recipe.'''
+    model = models.RecipeTag
+    formset = RecipeLinkFormSet
+    fields = ['tag']
+    autocomplete_fields = ['tag']
+    extra = 1
+
+
+class RecipeIngredientInline(admin.TabularInline):
+    '''Ingredients of a recipe.'''
+    model = models.RecipeIngredient
+    formset = RecipeLinkFormSet
+    fields = ['ingredient']
+    autocomplete_fields = ['ingredient']
+    extra = 1
+
+
+class RecipeAdmin(LargeTableAdmin):
+    '''Define the admin pages for recipes.
+
+    Saves and deletes run `core.hooks` like the API, so summaries, stats
+    and the change log follow admin edits.
+    '''
+    list_display = ['title', 'user', 'time_minutes', 'price']
+    search_fields = ['title']
+    inlines = [RecipeTagInline, RecipeIngredientInline]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        hooks.recipes_saved(form.instance.user_id, [form.instance.id])
+
+    def delete_model(self, request, obj):
+        recipe_id = obj.id
+        super().delete_model(request, obj)
+        hooks.recipes_deleted(obj.user_id, [recipe_id])
+
+    @sharding.atomic()
+    def delete_queryset(self, request, queryset):
+        recipe_ids = defaultdict(list)
+        for user_id, recipe_id in queryset.values_list('user_id', 'id'):
+            recipe_ids[user_id].append(recipe_id)
+        super().delete_queryset(request, queryset)
+        for user_id in sorted(recipe_ids):
+            hooks.recipes_deleted(user_id, recipe_ids[user_id])
+
+
+class AttrAdmin(LargeTableAdmin):
+    '''Define the admin pages for tags and ingredients.
+
+    Renames and deletes refresh the recipes using the items through
+    `core.hooks`, like the API.
+    '''
+    list_display = ['name', 'user']
+    search_fields = ['name']
+
+    @property
+    def recipe_relation(self):
+        return f'{self.model._meta.model_name}s'
+
+    def _recipe_ids(self, user_id, obj_ids):
+        return summary.recipe_ids_for(self.recipe_relation, user_id, obj_ids)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        hooks.attrs_saved(
+            obj.user_id, self.model, [obj.id],
+            self._recipe_ids(obj.user_id, [obj.id]),
+        )
+
+    def delete_model(self, request, obj):
+        obj_id = obj.id
+        recipe_ids = self._recipe_ids(obj.user_id, [obj_id])
+        super().delete_model(request, obj)
+        hooks.attrs_deleted(obj.user_id, self.model, [obj_id], recipe_ids)
+
+    @sharding.atomic()
+    def delete_queryset(self, request, queryset):
+        obj_ids = defaultdict(list)
+        for user_id, obj_id in queryset.values_list('user_id', 'id'):
+            obj_ids[user_id].append(obj_id)
+        recipe_ids = {
+            user_id: self._recipe_ids(user_id, ids)
+            for user_id, ids in obj_ids.items()
+        }
+        super().delete_queryset(request, queryset)
+        for user_id in sorted(obj_ids):
+            hooks.attrs_deleted(
+                user_id, self.model, obj_ids[user_id], recipe_ids[user_id])
+
+
+class JobAdmin(admin.ModelAdmin):
+    '''Define the admin pages for queued jobs.'''
+    ordering = ['-priority', 'run_at']
+    list_display = ['name', 'status', 'priority', 'attempts', 'run_at']
+    list_filter = ['status']
 
 
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, AttrAdmin)
+admin.site.register(models.Ingredient, AttrAdmin)
+admin.site.register(models.Job, JobAdmin)
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core import sharding
+
+        post_save.connect(
+            sharding.place_user,
+            sender='core.User',
+            dispatch_uid='core.sharding.place_user',
+        )
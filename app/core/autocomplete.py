@@ -0,0 +1,99 @@
+'''
+Prefix suggestions for tag and ingredient names.
+
+A user's names are kept sorted by key in the cache (whose in-process
+tier answers repeated keystrokes without leaving the worker), versioned
+by the user's change log cursor so any write of a tag or ingredient
+retires them. A lookup is then a binary search in memory. Vocabularies
+larger than CACHE_MAX_ITEMS are not cached and are searched with a
+prefix query on the (user, key) index instead, whose pattern opclass
+supports LIKE 'prefix%'.
+
+Keys are stems rather than words ("tomatoes" -> "tomato"), so a prefix
+running past the stem ("tomatoe") is also matched against the folded
+names.
+'''
+import bisect
+
+from django.core.cache import cache
+
+from core import changes
+from core.models import fold_name, normalize_name
+
+CACHE_MAX_ITEMS = 5000
+CACHE_TIMEOUT = 60 * 60
+
+
+def _vocabulary(model, user_id):
+    '''Return the user's items sorted by key, or None if too big.
+
+    That is ([keys], [(id, name)], [(folded name, index)]) where the
+    last list, sorted by name, indexes into the other two.
+    '''
+    rows = list(model.objects.filter(user_id=user_id).order_by(
+        'key').values_list('key', 'id', 'name')[:CACHE_MAX_ITEMS + 1])
+    if len(rows) > CACHE_MAX_ITEMS:
+        return None
+    names = sorted(
+        (fold_name(name), index) for index, (_, _, name) in enumerate(rows))
+    return (
+        [key for key, _, _ in rows],
+        [(pk, name) for _, pk, name in rows],
+        names,
+    )
+
+
+def _prefixes(prefix):
+    '''Return the key prefixes to search for a typed prefix.
+
+    A typed plural ("tomatoes") only matches the singular key once
+    normalized, while a partial word must not be singularized.
+    '''
+    return sorted({fold_name(prefix), normalize_name(prefix)})
+
+
+def suggest(model, user_id, prefix, limit):
+    '''Return [(id, name)] of items whose key or name starts with prefix.'''
+    cursor = changes.current_cursor(user_id)
+    vocabulary = cache.get_or_set(
+        f'autocomplete:v2:{model._meta.model_name}:{user_id}:{cursor}',
+        lambda: _vocabulary(model, user_id) or False,
+        CACHE_TIMEOUT,
+    )
+    if not vocabulary:
+        return _query(model, user_id, prefix, limit)
+
+    keys, items, names = vocabulary
+    found = set()
+    for key_prefix in _prefixes(prefix):
+        start = index = bisect.bisect_left(keys, key_prefix)
+        while (index < len(keys) and index - start < limit
+               and keys[index].startswith(key_prefix)):
+            found.add(index)
+            index += 1
+    name_prefix = fold_name(prefix)
+    start = index = bisect.bisect_left(names, (name_prefix,))
+    while (index < len(names) and index - start < limit
+           and names[index][0].startswith(name_prefix)):
+        found.add(names[index][1])
+        index += 1
+    return [items[index] for index in sorted(found)[:limit]]
+
+
+def _query(model, user_id, prefix, limit):
+    '''Return [(id, name)] matching prefix from the database.
+
+    Names are not indexed, so matching them scans the user's items.
+    '''
+    queryset = model.objects.filter(user_id=user_id)
+    lookups = [{'key__startswith': key_prefix}
+               for key_prefix in _prefixes(prefix)]
+    lookups.append({'name__istartswith': fold_name(prefix)})
+    found = {}
+    for lookup in lookups:
+        found.update(
+            (key, (pk, name))
+            for key, pk, name in queryset.filter(**lookup).order_by(
+                'key').values_list('key', 'id', 'name')[:limit]
+        )
+    return [found[key] for key in sorted(found)[:limit]]
@@ -0,0 +1,137 @@
+'''
+Set-based bulk writes for recipe attributes (tags and ingredients).
+'''
+from django.db import connections, router
+
+from core.models import Recipe, normalize_name
+from core.summary import recipe_ids_for
+
+# Starts the placeholder keys renamed objects hold for a moment; typed
+# names do not.
+STAGING_KEY_PREFIX = '\x01'
+
+
+def _through(relation):
+    '''Return the through model and its attribute column for a relation.'''
+    field = Recipe._meta.get_field(relation)
+    through = field.remote_field.through
+    target_column = through._meta.get_field(
+        field.m2m_reverse_field_name()).column
+    return through, target_column
+
+
+def bulk_create(model, user, names):
+    '''Create missing attributes by name.
+
+    Names are matched by their normalized key, so a name differing from
+    an existing one only in case, spacing or plural returns that one.
+    Returns a tuple of (objects in order of `names`, once each, ids of
+    the objects that were missing). A concurrent request creating the
+    same key wins, and its object is returned.
+    '''
+    keys = {}
+    for name in names:
+        keys.setdefault(normalize_name(name), name)
+    existing = {
+        obj.key: obj
+        for obj in model.objects.filter(user=user, key__in=keys)
+    }
+    missing = [key for key in keys if key not in existing]
+    if not missing:
+        return [existing[key] for key in keys], []
+
+    model.objects.bulk_create([
+        model(user=user, name=keys[key], key=key) for key in missing
+    ], ignore_conflicts=True)
+    # Ids are not returned when conflicts are ignored.
+    created = {
+        obj.key: obj
+        for obj in model.objects.filter(user=user, key__in=missing)
+    }
+    by_key = {**existing, **created}
+    return [by_key[key] for key in keys], [obj.id for obj in created.values()]
+
+
+def _repoint_links(relation, user, merges):
+    '''Move the user's recipe links from merged attributes to targets.'''
+    through, target_column = _through(relation)
+    connection = connections[router.db_for_write(through)]
+    table = connection.ops.quote_name(through._meta.db_table)
+    column = connection.ops.quote_name(target_column)
+    values = ', '.join(['(%s, %s)'] * len(merges))
+    params = [value for pair in merges.items() for value in pair]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, recipe_id, {column}) '
+            f'SELECT link.user_id, link.recipe_id, merge.target_id '
+            f'FROM {table} link '
+            f'JOIN (VALUES {values}) AS merge (source_id, target_id) '
+            f'ON link.{column} = merge.source_id '
+            f'WHERE link.user_id = %s '
+            f'ON CONFLICT DO NOTHING',
+            [*params, user.id],
+        )
+
+
+def bulk_rename(model, relation, user, renames):
+    '''Rename attributes, merging into existing ones on name collision.
+
+    `renames` maps attribute id to its new name. Returns a tuple of
+    (surviving objects by requested id, ids of renamed objects,
+    {merged id: target id}, ids of recipes whose attributes changed).
+    Must run inside a transaction.
+    '''
+    objs = {
+        obj.id: obj for obj in model.objects.select_for_update().filter(
+            user=user, id__in=renames)
+    }
+    keys = {obj_id: normalize_name(name) for obj_id, name in renames.items()}
+    survivors = dict(model.objects.filter(
+        user=user, key__in=set(keys.values()),
+    ).exclude(id__in=renames).values_list('key', 'id'))
+
+    merges = {}
+    renamed = []
+    for obj_id in sorted(objs):
+        name = renames[obj_id]
+        target = survivors.setdefault(keys[obj_id], obj_id)
+        if target != obj_id:
+            merges[obj_id] = target
+        elif objs[obj_id].name != name:
+            objs[obj_id].name = name
+            objs[obj_id].key = keys[obj_id]
+            renamed.append(objs[obj_id])
+
+    recipe_ids = recipe_ids_for(relation, user, list(objs))
+    if merges:
+        _repoint_links(relation, user, merges)
+        model.objects.filter(id__in=merges).delete()
+    # After the merges, which may have held the new keys, and through
+    # placeholders, as a swap or chain of renames moves a key onto an
+    # object that only gives it up later in the same UPDATE.
+    final_keys = {obj.id: obj.key for obj in renamed}
+    for obj in renamed:
+        obj.key = f'{STAGING_KEY_PREFIX}{obj.id}'
+    model.objects.bulk_update(renamed, ['key'])
+    for obj in renamed:
+        obj.key = final_keys[obj.id]
+    model.objects.bulk_update(renamed, ['name', 'key'])
+
+    survivor_objs = model.objects.in_bulk(set(survivors.values()))
+    result = {
+        obj_id: survivor_objs[merges.get(obj_id, obj_id)]
+        for obj_id in objs
+    }
+    return result, [obj.id for obj in renamed], merges, recipe_ids
+
+
+def bulk_delete(model, relation, user, obj_ids):
+    '''Delete attributes.
+
+    Returns a tuple of (ids deleted, ids of recipes that used them).
+    '''
+    queryset = model.objects.filter(user=user, id__in=obj_ids)
+    deleted_ids = list(queryset.values_list('id', flat=True))
+    recipe_ids = recipe_ids_for(relation, user, deleted_ids)
+    model.objects.filter(id__in=deleted_ids).delete()
+    return deleted_ids, recipe_ids
@@ -0,0 +1,297 @@
+'''
+Cache backends.
+
+`SharedFileCache` is Django's file-based cache with `add` and `incr`
+made atomic across processes, so uWSGI workers on one host can share
+counters (e.g. throttle buckets) through a directory.
+
+`TieredCache` keeps a small in-process LRU in front of a shared cache
+alias (its LOCATION). Local entries live for at most LOCAL_TIMEOUT
+seconds, so a change made by another worker is seen after that delay.
+`get_or_set` protects expensive values from stampedes: threads of a
+process wait for one computation, processes take a short lock in the
+shared cache, and values are recomputed early with a probability that
+grows as they near expiry ("XFetch"), so popular keys rarely expire
+under load. Hit and miss counts are periodically added to totals in the
+shared cache, see the `cache_stats` command.
+'''
+import math
+import os
+import pickle
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+STATS = ('local_hits', 'shared_hits', 'misses', 'recomputes')
+
+_missing = object()
+
+# A value stored by get_or_set, with what is needed to recompute early.
+Entry = namedtuple('Entry', ['value', 'expires', 'cost'])
+
+
+def _unwrap(value):
+    return value.value if isinstance(value, Entry) else value
+
+
+class SharedFileCache(FileBasedCache):
+    '''File-based cache with atomic add and incr across processes.'''
+    lock_name = 'lock'
+
+    @contextmanager
+    def _locked(self):
+        self._createdir()
+        with open(os.path.join(self._dir, self.lock_name), 'ab') as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(lock)
+
+    def _get_with_expiry(self, key, version):
+        '''Return (value, expiry) of a key, value is _missing if absent.'''
+        try:
+            with open(self._key_to_file(key, version), 'rb') as f:
+                expiry = pickle.load(f)
+                if expiry is None or expiry >= time.time():
+                    return pickle.loads(zlib.decompress(f.read())), expiry
+        except (FileNotFoundError, EOFError):
+            pass
+        return _missing, None
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._locked():
+            value, expiry = self._get_with_expiry(key, version)
+            if value is _missing:
+                raise ValueError("Key '%s' not found" % key)
+            value += delta
+            # Keep the key's expiry instead of resetting it.
+            timeout = None
+            if expiry is not None:
+                timeout = max(expiry - time.time(), 0.001)
+            self.set(key, value, timeout, version)
+            return value
+
+
+class TieredCache(BaseCache):
+    '''In-process LRU in front of a shared cache alias.'''
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location
+        self.local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self.lock_timeout = float(options.get('LOCK_TIMEOUT', 10))
+        self.early_beta = float(options.get('EARLY_RECOMPUTE_BETA', 1))
+        self.stats_interval = float(options.get('STATS_INTERVAL', 10))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(64)]
+        self._stats = dict.fromkeys(STATS, 0)
+        self._stats_flushed = time.monotonic()
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _full_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _timeout(self, timeout):
+        '''Return the timeout in seconds, None for no expiry.'''
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _local_get(self, full_key):
+        with self._lock:
+            item = self._local.get(full_key)
+            if item is None:
+                return _missing
+            pickled, expires = item
+            if expires <= time.monotonic():
+                del self._local[full_key]
+                return _missing
+            self._local.move_to_end(full_key)
+        return pickle.loads(pickled)
+
+    def _local_set(self, full_key, value, timeout=None):
+        local_timeout = self.local_timeout
+        if timeout is not None:
+            local_timeout = min(local_timeout, timeout)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[full_key] = (pickled, time.monotonic() + local_timeout)
+            self._local.move_to_end(full_key)
+            while len(self._local) > self._max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, full_key):
+        with self._lock:
+            self._local.pop(full_key, None)
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+            due = time.monotonic() - self._stats_flushed >= self.stats_interval
+        if due:
+            self.flush_stats()
+
+    def _lookup(self, key, version):
+        '''Return the stored value (maybe an Entry) or _missing.'''
+        full_key = self._full_key(key, version)
+        value = self._local_get(full_key)
+        if value is not _missing:
+            self._count('local_hits')
+            return value
+        value = self.shared.get(key, _missing, version=version)
+        if value is _missing:
+            self._count('misses')
+            return value
+        self._count('shared_hits')
+        if isinstance(value, Entry) and value.expires is not None:
+            self._local_set(full_key, value, value.expires - time.time())
+        else:
+            self._local_set(full_key, value)
+        return value
+
+    def get(self, key, default=None, version=None):
+        value = self._lookup(key, version)
+        return default if value is _missing else _unwrap(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(self._full_key(key, version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(self._full_key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self._full_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self._full_key(key, version))
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def _needs_recompute(self, value):
+        '''Return True if value is missing or due for early recomputation.'''
+        if value is _missing:
+            return True
+        if not isinstance(value, Entry) or value.expires is None:
+            return False
+        jitter = value.cost * self.early_beta * -math.log(random.random())
+        return time.time() + jitter >= value.expires
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        '''Return the cached value, computing it at most once at a time.'''
+        value = self._lookup(key, version)
+        if not self._needs_recompute(value):
+            return _unwrap(value)
+
+        full_key = self._full_key(key, version)
+        with self._key_locks[hash(full_key) % len(self._key_locks)]:
+            # Another thread may have computed it while we waited.
+            fresh = self._local_get(full_key)
+            if fresh is not _missing and not self._needs_recompute(fresh):
+                return _unwrap(fresh)
+
+            lock_key = f'{key}:recompute'
+            locked = self.shared.add(
+                lock_key, 1, self.lock_timeout, version=version)
+            if not locked:
+                if value is not _missing:
+                    # Someone else is refreshing; serve the current value.
+                    return _unwrap(value)
+                value = self._wait_for(key, version)
+                if value is not _missing:
+                    return _unwrap(value)
+            try:
+                return self._recompute(key, default, timeout, version)
+            finally:
+                if locked:
+                    self.shared.delete(lock_key, version=version)
+
+    def _wait_for(self, key, version):
+        '''Poll the shared cache until another process stored the key.'''
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.01
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            value = self.shared.get(key, _missing, version=version)
+            if value is not _missing:
+                return value
+            delay = min(delay * 2, 0.5)
+        return _missing
+
+    def _recompute(self, key, default, timeout, version):
+        self._count('recomputes')
+        started = time.monotonic()
+        value = default() if callable(default) else default
+        timeout = self._timeout(timeout)
+        expires = None if timeout is None else time.time() + timeout
+        self.set(
+            key,
+            Entry(value, expires, time.monotonic() - started),
+            timeout,
+            version=version,
+        )
+        return value
+
+    def _stats_key(self, stat):
+        return self.make_key(f'cache-stats:{stat}')
+
+    def flush_stats(self):
+        '''Add the counts since the last flush to the shared totals.'''
+        with self._lock:
+            counts, self._stats = self._stats, dict.fromkeys(STATS, 0)
+            self._stats_flushed = time.monotonic()
+        shared = self.shared
+        for stat, count in counts.items():
+            if not count:
+                continue
+            key = self._stats_key(stat)
+            if not shared.add(key, count, None):
+                try:
+                    shared.incr(key, count)
+                except ValueError:
+                    shared.add(key, count, None)
+
+    def stats(self):
+        '''Return the totals of all processes, including unflushed counts.'''
+        self.flush_stats()
+        shared = self.shared
+        return {
+            stat: shared.get(self._stats_key(stat), 0) for stat in STATS
+        }
+
+    def reset_stats(self):
+        '''Forget the recorded hit and miss counts.'''
+        with self._lock:
+            self._stats = dict.fromkeys(STATS, 0)
+        self.shared.delete_many([self._stats_key(stat) for stat in STATS])
@@ -0,0 +1,125 @@
+'''
+Append-only change log used for incremental client sync.
+
+Entries are written by the hooks in `core.hooks` inside the write's
+transaction, after taking a per-user advisory lock. The lock makes a
+user's entries commit in id order, so an id is a safe sync cursor.
+Entries live on the user's shard (see `core.sharding`).
+'''
+from datetime import timedelta
+
+from django.db import connections
+from django.db.models import Max
+from django.utils import timezone
+
+from core import sharding
+from core.models import (
+    Change,
+    ChangeCompaction,
+)
+
+USER_LOCK_NAMESPACE = 2030
+
+
+def lock_user_in(alias, user_id):
+    '''Take the user's lock in a database until its transaction ends.'''
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(%s, %s)',
+            [USER_LOCK_NAMESPACE, user_id % 2 ** 31],
+        )
+
+
+def lock_user(user_id):
+    '''Serialize change logging for a user until the transaction ends.
+
+    Raises `sharding.UserMoving` if the user's data is being moved or
+    was moved away from the shard the transaction runs on.
+    '''
+    alias = sharding.db_for_user(user_id)
+    # Checked first so writes fail fast rather than queue behind a move
+    # holding the lock, and again for moves started while waiting.
+    sharding.check_writable(user_id, alias)
+    lock_user_in(alias, user_id)
+    sharding.check_writable(user_id, alias)
+
+
+def record(user_id, model, object_ids, action):
+    '''Append an entry per object to the change log.'''
+    kind = model._meta.model_name
+    Change.objects.bulk_create([
+        Change(user_id=user_id, kind=kind, object_id=object_id,
+               action=action)
+        for object_id in sorted(set(object_ids))
+    ])
+
+
+def current_cursor(user_id):
+    '''Return the id of the user's latest entry, 0 if there is none.'''
+    return Change.objects.filter(
+        user_id=user_id).aggregate(cursor=Max('id'))['cursor'] or 0
+
+
+def horizon(user_id):
+    '''Return the oldest cursor the user's log can still answer from.'''
+    return ChangeCompaction.objects.filter(
+        user_id=user_id).aggregate(cursor=Max('cursor'))['cursor'] or 0
+
+
+def latest(user_id, since, limit):
+    '''Return (cursor, has_more, {kind: {object_id: action}}).
+
+    Only the latest action per object is kept, so the result is a
+    compact delta rather than the raw history.
+    '''
+    entries = list(Change.objects.filter(
+        user_id=user_id, id__gt=since,
+    ).order_by('id').values_list('id', 'kind', 'object_id', 'action')[
+        :limit
+    ])
+    actions = {}
+    for _, kind, object_id, action in entries:
+        actions.setdefault(kind, {})[object_id] = action
+    cursor = entries[-1][0] if entries else since
+    return cursor, len(entries) == limit, actions
+
+
+@sharding.atomic()
+def compact(older_than_days):
+    '''Compact the current shard's log, return (superseded, tombstones).
+
+    Entries superseded by a newer entry for the same object are removed
+    regardless of age; this never changes what any cursor observes.
+    Deletions older than `older_than_days` are then dropped and the
+    highest id dropped for each user is recorded as their horizon: the
+    user's cursors before it can no longer be served and their clients
+    must resync from scratch.
+    '''
+    connection = connections[sharding.current_db()]
+    table = connection.ops.quote_name(Change._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} old USING {table} new '
+            f'WHERE new.user_id = old.user_id AND new.kind = old.kind '
+            f'AND new.object_id = old.object_id AND new.id > old.id'
+        )
+        superseded = cursor.rowcount
+
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    tombstones = Change.objects.filter(
+        action=Change.DELETE, created__lt=cutoff)
+    dropped_cursors = list(tombstones.values('user_id').annotate(
+        cursor=Max('id')).order_by('user_id'))
+    if not dropped_cursors:
+        return superseded, 0
+
+    ChangeCompaction.objects.bulk_create([
+        ChangeCompaction(user_id=row['user_id'], cursor=row['cursor'])
+        for row in dropped_cursors
+    ])
+    deleted = 0
+    for row in dropped_cursors:
+        count, _ = tombstones.filter(
+            user_id=row['user_id'], id__lte=row['cursor']).delete()
+        deleted += count
+    return superseded, deleted
@@ -0,0 +1,66 @@
+'''
+"What can I cook": recipes ranked by how few ingredients are missing.
+
+Small libraries are ranked by one grouped query counting, per recipe,
+all its ingredients and those that were given. Aggregating the whole
+library gets slow for large ones, which are searched in the in-memory
+index of `core.similarity` instead (also used whenever this process
+already holds the user's index). Both return the same ranking.
+'''
+from django.conf import settings
+from django.db.models import (
+    Count,
+    F,
+    FilteredRelation,
+    IntegerField,
+    Q,
+    Value,
+)
+
+from core import similarity
+from core.models import Recipe
+
+
+def rank_with_query(user_id, ingredient_ids, max_missing, limit):
+    '''Return [(missing, matched, recipe_id)] using a grouped query.'''
+    ingredient_ids = list(ingredient_ids)
+    # An empty IN () matches nothing, so nothing is matched either.
+    matched = Value(0, output_field=IntegerField())
+    if ingredient_ids:
+        matched = Count(
+            'links', filter=Q(links__ingredient_id__in=ingredient_ids))
+    recipes = Recipe.objects.filter(user_id=user_id).annotate(
+        # Joining on the user too lets Postgres prune the link table to
+        # the user's partition.
+        links=FilteredRelation(
+            'recipeingredient',
+            condition=Q(recipeingredient__user_id=user_id),
+        ),
+    ).annotate(
+        total=Count('links'),
+        matched=matched,
+    ).annotate(missing=F('total') - F('matched'))
+    if max_missing is not None:
+        recipes = recipes.filter(missing__lte=max_missing)
+    return list(recipes.order_by('missing', '-matched', '-id').values_list(
+        'missing', 'matched', 'id')[:limit])
+
+
+def use_index(user_id):
+    '''Return True if the user's library is searched in memory.'''
+    if similarity.is_indexed(user_id):
+        return True
+    threshold = settings.COOKABLE_INDEX_MIN_RECIPES
+    return Recipe.objects.filter(
+        user_id=user_id)[threshold - 1:threshold].exists()
+
+
+def rank(user_id, ingredient_ids, max_missing=None, limit=20):
+    '''Return [(missing, matched, recipe_id)] fewest missing first.
+
+    Ties are broken by most matched, then newest recipe.
+    '''
+    if use_index(user_id):
+        return similarity.search(user_id, lambda index: index.cookable(
+            ingredient_ids, max_missing, limit))
+    return rank_with_query(user_id, ingredient_ids, max_missing, limit)
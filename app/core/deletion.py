@@ -0,0 +1,113 @@
+'''
+Background deletion of users and their data.
+
+Deleting a user with `User.delete()` collects every recipe, link, tag
+and log entry in Python to cascade to them, which takes minutes and a
+lot of memory for large libraries. `schedule` instead deactivates the
+user, so they can no longer sign in or write, and queues `delete_user`.
+Each run of that job deletes up to `chunk_size` rows of the user's data
+with set-based DELETE statements, in DELETED_MODELS order, in one
+transaction on the user's shard, then queues the next run. Recipe image
+files are removed once a transaction deleting their recipes commits.
+The user row goes last, when nothing but a few rows in 'default' (the
+shard directory entry, tokens) is left to cascade to.
+'''
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from rest_framework.authtoken.models import Token
+
+from core import jobs, sharding
+from core.models import (
+    Change,
+    ChangeCompaction,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeStats,
+    RecipeStatsSource,
+    RecipeStatsUsage,
+    RecipeSummary,
+    RecipeTag,
+    Tag,
+    User,
+)
+
+CHUNK_SIZE = 10000
+# Models holding user data, before the models they reference. Links and
+# summaries have no database foreign keys to recipes, see
+# core.partitioning, but go first so none outlives its recipe.
+DELETED_MODELS = [
+    RecipeTag,
+    RecipeIngredient,
+    RecipeSummary,
+    Recipe,
+    Tag,
+    Ingredient,
+    Change,
+    ChangeCompaction,
+    RecipeStatsUsage,
+    RecipeStatsSource,
+    RecipeStats,
+]
+
+
+def _delete_files(names):
+    storage = Recipe._meta.get_field('image').storage
+    for name in names:
+        storage.delete(name)
+
+
+def delete_chunk(alias, user_id, chunk_size):
+    '''Delete up to chunk_size rows of the user's data in alias.
+
+    Returns True when no rows are left. Must run in a transaction on
+    alias; image files are deleted when it commits.
+    '''
+    connection = connections[alias]
+    quote = connection.ops.quote_name
+    image = quote(Recipe._meta.get_field('image').column)
+    images = []
+    with connection.cursor() as cursor:
+        for model in DELETED_MODELS:
+            table = quote(model._meta.db_table)
+            pk = quote(model._meta.pk.column)
+            user = quote(model._meta.get_field('user').column)
+            returning = f' RETURNING {image}' if model is Recipe else ''
+            # The user filter on both sides lets partitioned tables be
+            # pruned to the user's partition.
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {user} = %s AND {pk} IN '
+                f'(SELECT {pk} FROM {table} WHERE {user} = %s LIMIT %s)'
+                f'{returning}',
+                [user_id, user_id, chunk_size],
+            )
+            if returning:
+                images.extend(name for name, in cursor.fetchall() if name)
+            chunk_size -= cursor.rowcount
+            if chunk_size <= 0:
+                break
+    if images:
+        transaction.on_commit(lambda: _delete_files(images), using=alias)
+    return chunk_size > 0
+
+
+@jobs.task
+def delete_user(user_id, chunk_size=CHUNK_SIZE):
+    '''Delete a chunk of a user's data, the user once none is left.'''
+    with sharding.for_user(user_id) as alias, sharding.atomic():
+        done = delete_chunk(alias, user_id, chunk_size)
+    if not done:
+        jobs.enqueue(delete_user, user_id=user_id, chunk_size=chunk_size)
+        return
+    if alias != DEFAULT_DB_ALIAS:
+        User.objects.using(alias).filter(id=user_id).delete()
+    User.objects.filter(id=user_id).delete()
+
+
+def schedule(user):
+    '''Deactivate the user and queue the deletion of their data.'''
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        Token.objects.filter(user=user).delete()
+        jobs.enqueue(delete_user, user_id=user.id)
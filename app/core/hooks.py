@@ -0,0 +1,58 @@
+'''
+Hooks called by the recipe write paths inside their transaction.
+
+Every hook first takes the user's change log lock, then only writes
+derived tables, so concurrent writes of one user cannot deadlock here.
+'''
+from core import (
+    changes,
+    stats,
+    summary,
+)
+from core.models import (
+    Change,
+    Recipe,
+)
+
+
+def recipes_saved(user_id, recipe_ids):
+    '''Run after recipes were created or their data changed.'''
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    changes.lock_user(user_id)
+    summary.refresh_recipe_summaries(recipe_ids)
+    stats.apply(user_id, recipe_ids)
+    changes.record(user_id, Recipe, recipe_ids, Change.UPSERT)
+
+
+def recipes_deleted(user_id, recipe_ids):
+    '''Run after recipes were deleted.'''
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    changes.lock_user(user_id)
+    stats.apply(user_id, recipe_ids)
+    changes.record(user_id, Recipe, recipe_ids, Change.DELETE)
+
+
+def attrs_saved(user_id, model, obj_ids, recipe_ids=()):
+    '''Run after tags or ingredients were created or renamed.
+
+    `recipe_ids` are the recipes whose nested data changed as a result.
+    '''
+    if obj_ids:
+        changes.lock_user(user_id)
+        changes.record(user_id, model, obj_ids, Change.UPSERT)
+    recipes_saved(user_id, recipe_ids)
+
+
+def attrs_deleted(user_id, model, obj_ids, recipe_ids=()):
+    '''Run after tags or ingredients were deleted.
+
+    `recipe_ids` are the recipes that were linked to the deleted items.
+    '''
+    if obj_ids:
+        changes.lock_user(user_id)
+        changes.record(user_id, model, obj_ids, Change.DELETE)
+    recipes_saved(user_id, recipe_ids)
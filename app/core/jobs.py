@@ -0,0 +1,112 @@
+'''
+Durable job queue in Postgres.
+
+`enqueue` inserts a Job row in the caller's transaction on the shard
+selected for the running code (see `core.sharding`, 'default' outside
+of any), so a job only becomes visible when the work on that shard that
+created it commits. Workers (the `run_workers` command) poll each shard
+and claim its most urgent ready job with `SELECT ... FOR UPDATE SKIP
+LOCKED`, running it inside that transaction with queries routed to the
+job's shard: the row lock keeps other workers off the job, a crashed
+worker releases it automatically, and the task's writes to that shard
+commit together with the job's removal. Writes to other shards commit
+on their own, so a task making them must be safe to run again. Failed
+jobs are retried with exponential backoff until `max_attempts`, then
+kept as failed.
+'''
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core import sharding
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_DELAY = 10
+RETRY_MAX_DELAY = 3600
+
+
+def task(func):
+    '''Mark a function as runnable by the job queue.'''
+    func.is_task = True
+    func.job_name = f'{func.__module__}.{func.__qualname__}'
+    return func
+
+
+def enqueue(func, priority=0, delay=0, max_attempts=5, **kwargs):
+    '''Create a job calling func(**kwargs); higher priority runs first.
+
+    Kwargs must be JSON serializable. The job is stored on the shard
+    selected for the running code.
+    '''
+    if not getattr(func, 'is_task', False):
+        raise ValueError(f'{func!r} is not a task.')
+    return Job.objects.create(
+        name=func.job_name,
+        kwargs=kwargs,
+        priority=priority,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def retry_delay(attempts):
+    '''Return the delay in seconds before retrying after attempts.'''
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def resolve(name):
+    '''Return the task function registered under name.'''
+    func = import_string(name)
+    if not getattr(func, 'is_task', False):
+        raise ImportError(f'{name} is not a task.')
+    return func
+
+
+def run_next():
+    '''Run the most urgent ready job, return it or None if none is ready.
+
+    Shards are tried in turn, so priorities only order the jobs of one
+    shard.
+    '''
+    for alias in sharding.shards():
+        job = _run_next_in(alias)
+        if job is not None:
+            return job
+    return None
+
+
+def _run_next_in(alias):
+    '''Run the most urgent ready job of a shard, return it or None.'''
+    with sharding.using_shard(alias), transaction.atomic(using=alias):
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.PENDING,
+            run_at__lte=timezone.now(),
+        ).order_by('-priority', 'run_at').first()
+        if job is None:
+            return None
+
+        job.attempts += 1
+        try:
+            with transaction.atomic(using=alias):
+                resolve(job.name)(**job.kwargs)
+        except Exception:
+            job.last_error = traceback.format_exc()
+            if job.attempts >= job.max_attempts:
+                job.status = Job.FAILED
+                logger.error('Job %s %s failed', job.id, job.name)
+            else:
+                job.run_at = timezone.now() + timedelta(
+                    seconds=retry_delay(job.attempts))
+            job.save(update_fields=[
+                'attempts', 'status', 'run_at', 'last_error'])
+        else:
+            job.delete()
+    return job
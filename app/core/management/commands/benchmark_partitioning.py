@@ -0,0 +1,184 @@
+'''
+Django command to benchmark hash partitioning the recipe tables.
+'''
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+# Tables shaped like core_recipe and core_recipe_tags before and after
+# partitioning (see core.partitioning); {table} is the name prefix.
+LAYOUTS = {
+    'flat': [
+        'CREATE UNLOGGED TABLE {table}_recipe ('
+        'id bigint PRIMARY KEY, user_id bigint NOT NULL, title text)',
+        'CREATE INDEX ON {table}_recipe (user_id)',
+        'CREATE UNLOGGED TABLE {table}_link (id bigint PRIMARY KEY, '
+        'recipe_id bigint NOT NULL, tag_id bigint NOT NULL, '
+        'UNIQUE (recipe_id, tag_id))',
+        'CREATE INDEX ON {table}_link (recipe_id)',
+        'CREATE INDEX ON {table}_link (tag_id)',
+    ],
+    'partitioned': [
+        'CREATE UNLOGGED TABLE {table}_recipe ('
+        'id bigint, user_id bigint NOT NULL, title text, '
+        'PRIMARY KEY (id, user_id)) PARTITION BY HASH (user_id)',
+        'CREATE INDEX ON {table}_recipe (user_id)',
+        'CREATE UNLOGGED TABLE {table}_link (id bigint, '
+        'user_id bigint NOT NULL, recipe_id bigint NOT NULL, '
+        'tag_id bigint NOT NULL, PRIMARY KEY (id, user_id), '
+        'UNIQUE (user_id, recipe_id, tag_id)) PARTITION BY HASH (user_id)',
+        'CREATE INDEX ON {table}_link (recipe_id)',
+        'CREATE INDEX ON {table}_link (tag_id)',
+    ],
+}
+PARTITION_SQL = (
+    'CREATE UNLOGGED TABLE {table}_{kind}_p{remainder} PARTITION OF '
+    '{table}_{kind} FOR VALUES WITH '
+    '(MODULUS {partitions}, REMAINDER {remainder})'
+)
+# Recipes of all users are interleaved, as ids are handed out over time.
+FILL_RECIPES_SQL = (
+    'INSERT INTO {table}_recipe (id, user_id, title) '
+    "SELECT i, i %% %s + 1, 'Recipe ' || i FROM generate_series(1, %s) i"
+)
+FILL_LINKS_SQL = (
+    'INSERT INTO {table}_link ({columns}) '
+    'SELECT row_number() OVER (), {values} '
+    'FROM {table}_recipe recipe, generate_series(1, %s) j'
+)
+# The list endpoint's page, then the page's tags as read by the API.
+QUERIES = {
+    'flat': [
+        ('recipe page', 'SELECT id, title FROM {table}_recipe '
+         'WHERE user_id = %(user)s ORDER BY id DESC LIMIT 50'),
+        ('page tags', 'SELECT recipe_id, tag_id FROM {table}_link '
+         'WHERE recipe_id = ANY(%(recipes)s)'),
+    ],
+    'partitioned': [
+        ('recipe page', 'SELECT id, title FROM {table}_recipe '
+         'WHERE user_id = %(user)s ORDER BY id DESC LIMIT 50'),
+        ('page tags', 'SELECT recipe_id, tag_id FROM {table}_link '
+         'WHERE user_id = %(user)s AND recipe_id = ANY(%(recipes)s)'),
+    ],
+}
+
+
+class Command(BaseCommand):
+    '''Django command to compare flat and partitioned recipe tables.'''
+    help = (
+        'Fill flat and hash partitioned copies of the recipe and recipe '
+        'tag tables with generated rows, then report their index sizes '
+        'and the time of the per-user queries of the recipe list. The '
+        'tables are created in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=5000,
+            help='Number of users owning the recipes.',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=1000000,
+            help='Number of recipes.',
+        )
+        parser.add_argument(
+            '--links', type=int, default=4,
+            help='Tags per recipe.',
+        )
+        parser.add_argument(
+            '--partitions', type=int, default=settings.RECIPE_PARTITIONS,
+            help='Number of partitions per table.',
+        )
+        parser.add_argument(
+            '--queries', type=int, default=2000,
+            help='Number of users whose pages are read per layout.',
+        )
+
+    def create(self, cursor, layout, table, options):
+        '''Create and fill the tables of a layout.'''
+        for sql in LAYOUTS[layout]:
+            cursor.execute(sql.format(table=table))
+        if layout == 'partitioned':
+            for kind in ['recipe', 'link']:
+                for remainder in range(options['partitions']):
+                    cursor.execute(PARTITION_SQL.format(
+                        table=table, kind=kind, remainder=remainder,
+                        partitions=options['partitions'],
+                    ))
+        cursor.execute(
+            FILL_RECIPES_SQL.format(table=table),
+            [options['users'], options['recipes']],
+        )
+        columns = 'id, recipe_id, tag_id'
+        values = 'recipe.id, (recipe.id * 7 + j) %% 1000'
+        if layout == 'partitioned':
+            columns = 'id, user_id, recipe_id, tag_id'
+            values = 'recipe.user_id, ' + values
+        cursor.execute(
+            FILL_LINKS_SQL.format(table=table, columns=columns, values=values),
+            [options['links']],
+        )
+        cursor.execute(f'ANALYZE {table}_recipe')
+        cursor.execute(f'ANALYZE {table}_link')
+
+    def index_sizes(self, cursor, table):
+        '''Return (total, largest single) index bytes of a table.'''
+        cursor.execute(
+            'SELECT coalesce(sum(pg_relation_size(indexrelid)), 0), '
+            'coalesce(max(pg_relation_size(indexrelid)), 0) '
+            'FROM pg_index JOIN pg_class ON pg_class.oid = indrelid '
+            "WHERE relkind = 'r' AND (indrelid = %s::regclass OR indrelid "
+            'IN (SELECT relid FROM pg_partition_tree(%s::regclass)))',
+            [table, table],
+        )
+        return cursor.fetchone()
+
+    def run_queries(self, cursor, layout, table, users):
+        '''Return {query name: [seconds]} over the users' pages.'''
+        timings = {name: [] for name, _ in QUERIES[layout]}
+        for user in users:
+            params = {'user': user, 'recipes': []}
+            for name, sql in QUERIES[layout]:
+                start = time.perf_counter()
+                cursor.execute(sql.format(table=table), params)
+                rows = cursor.fetchall()
+                timings[name].append(time.perf_counter() - start)
+                if name == 'recipe page':
+                    params['recipes'] = [row[0] for row in rows]
+        return timings
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        rng = random.Random(0)
+        users = [
+            rng.randint(1, options['users'])
+            for _ in range(options['queries'])
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            for layout in LAYOUTS:
+                table = f'benchmark_{layout}'
+                start = time.monotonic()
+                self.create(cursor, layout, table, options)
+                self.stdout.write(
+                    f'{layout}: filled in {time.monotonic() - start:.1f}s')
+                for kind in ['recipe', 'link']:
+                    total, largest = self.index_sizes(
+                        cursor, f'{table}_{kind}')
+                    self.stdout.write(
+                        f'  {kind} indexes: {total / 2 ** 20:.1f} MiB, '
+                        f'largest {largest / 2 ** 20:.1f} MiB')
+                # Once to warm the cache, then measured.
+                self.run_queries(cursor, layout, table, users)
+                timings = self.run_queries(cursor, layout, table, users)
+                for name, values in timings.items():
+                    values.sort()
+                    self.stdout.write(
+                        f'  {name}: mean '
+                        f'{statistics.mean(values) * 1000:.3f} ms, '
+                        f'p95 {values[int(len(values) * 0.95)] * 1000:.3f} '
+                        f'ms')
+            transaction.set_rollback(True)
@@ -0,0 +1,266 @@
+'''
+Django command to benchmark uWSGI settings on the recipe list workload.
+'''
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core import hooks, server, sharding
+from core.models import Recipe
+
+
+def read_stats(path):
+    '''Return the JSON document served by a uWSGI stats socket.'''
+    with socket.socket(socket.AF_UNIX) as stats:
+        stats.connect(path)
+        chunks = []
+        while True:
+            chunk = stats.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    # uWSGI does not escape control characters in some fields.
+    return json.loads(b''.join(chunks), strict=False)
+
+
+def process_memory(pid):
+    '''Return (rss, pss) of a process in bytes.
+
+    PSS splits pages shared copy-on-write between the processes sharing
+    them, so summing it over the master and workers gives real usage.
+    '''
+    values = {'Rss:': 0, 'Pss:': 0}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as smaps:
+            for line in smaps:
+                name, value = line.split()[:2]
+                if name in values:
+                    values[name] = int(value) * 1024
+    except OSError:
+        pass
+    return values['Rss:'], values['Pss:']
+
+
+class Command(BaseCommand):
+    '''Django command to compare uWSGI worker and thread counts.'''
+    help = (
+        'Start uWSGI with each WORKERSxTHREADS configuration, request the '
+        'recipe list from concurrent clients and report '
+        'throughput, latency and memory. Creates a temporary user with '
+        'recipes, so run it against a development database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--configs', default='1x1,2x1,4x1,2x4',
+            help='Comma separated WORKERSxTHREADS configurations.',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=50,
+            help='Recipes in the listed library.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Concurrent clients.',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Seconds to load each configuration.',
+        )
+        parser.add_argument(
+            '--port', type=int, default=9190,
+            help='Local port uWSGI listens on.',
+        )
+
+    def parse_configs(self, value):
+        '''Return [(workers, threads)] from "WxT,WxT".'''
+        try:
+            return [
+                tuple(int(part) for part in config.split('x', 1))
+                for config in value.split(',')
+            ]
+        except ValueError:
+            raise CommandError(f'Invalid --configs value: {value}')
+
+    def seed(self, count):
+        '''Create a user with recipes and return (user, token key).'''
+        user = get_user_model().objects.create_user(
+            f'benchmark-{uuid.uuid4().hex}@example.com',
+            uuid.uuid4().hex,
+        )
+        with sharding.for_user(user.id), sharding.atomic():
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    user=user,
+                    title=f'Benchmark recipe {i}',
+                    time_minutes=10,
+                    price=Decimal('5.00'),
+                )
+                for i in range(count)
+            )
+            hooks.recipes_saved(user.id, [recipe.id for recipe in recipes])
+        return user, Token.objects.create(user=user).key
+
+    def start(self, workers, threads, port, workdir):
+        '''Start uWSGI and return (process, stats socket path).'''
+        stats = os.path.join(workdir, 'stats.sock')
+        env = {
+            **os.environ,
+            'WSGI_WORKERS': str(workers),
+            'WSGI_THREADS': str(threads),
+            'WSGI_CHEAPER': '0',
+            'WSGI_STATS': stats,
+            'ALLOWED_HOSTS': '127.0.0.1',
+            # Measure the server, not the throttle.
+            'THROTTLE_RECIPE_LIST': '',
+        }
+        options = [
+            option for option in server.uwsgi_options(env)
+            if option[0] != 'socket'
+        ]
+        options.append(('http-socket', f'127.0.0.1:{port}'))
+        ini = os.path.join(workdir, 'uwsgi.ini')
+        with open(ini, 'w') as ini_file:
+            ini_file.write(server.render_ini(options))
+
+        log = open(os.path.join(workdir, 'uwsgi.log'), 'w')
+        process = subprocess.Popen(
+            ['uwsgi', '--ini', ini], env=env,
+            stdout=log, stderr=subprocess.STDOUT,
+        )
+        log.close()
+        return process, stats
+
+    def request(self, port, path, headers):
+        '''Send one request on a new connection, return True on a 200.
+
+        Like requests from nginx over the uwsgi protocol, every request
+        uses its own connection.
+        '''
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status == 200
+        except (OSError, http.client.HTTPException):
+            return False
+        finally:
+            connection.close()
+
+    def wait_ready(self, process, port, path, headers, workdir):
+        '''Wait until the server answers, raise CommandError otherwise.'''
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and process.poll() is None:
+            if self.request(port, path, headers):
+                return
+            time.sleep(0.2)
+        with open(os.path.join(workdir, 'uwsgi.log')) as log:
+            raise CommandError('uWSGI did not start:\n' + log.read()[-2000:])
+
+    def load(self, port, path, headers, concurrency, duration):
+        '''Request path until the deadline, return (latencies, errors).'''
+        deadline = time.monotonic() + duration
+        lock = threading.Lock()
+        latencies = []
+        errors = []
+
+        def client():
+            timings, failed = [], 0
+            while time.monotonic() < deadline:
+                start = time.monotonic()
+                if self.request(port, path, headers):
+                    timings.append(time.monotonic() - start)
+                else:
+                    failed += 1
+            with lock:
+                latencies.extend(timings)
+                errors.append(failed)
+
+        clients = [
+            threading.Thread(target=client) for _ in range(concurrency)
+        ]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return sorted(latencies), sum(errors)
+
+    def measure(self, workers, threads, options, path, headers):
+        '''Benchmark one configuration and return a result row.'''
+        with tempfile.TemporaryDirectory() as workdir:
+            process, stats = self.start(
+                workers, threads, options['port'], workdir)
+            try:
+                self.wait_ready(
+                    process, options['port'], path, headers, workdir)
+                self.load(options['port'], path, headers,
+                          options['concurrency'], 1)
+                latencies, errors = self.load(
+                    options['port'], path, headers,
+                    options['concurrency'], options['duration'])
+                document = read_stats(stats)
+                pids = [document['pid']] + [
+                    worker['pid'] for worker in document['workers']
+                    if worker['pid']
+                ]
+                rss, pss = (sum(values) for values in zip(
+                    *(process_memory(pid) for pid in pids)))
+            finally:
+                process.terminate()
+                try:
+                    process.wait(30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+
+        def percentile(fraction):
+            if not latencies:
+                return 0
+            return latencies[min(len(latencies) - 1,
+                                 int(len(latencies) * fraction))] * 1000
+
+        return (
+            workers, threads, len(latencies) / options['duration'],
+            percentile(0.5), percentile(0.99), errors,
+            rss / 2 ** 20, pss / 2 ** 20,
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        if shutil.which('uwsgi') is None:
+            raise CommandError('uwsgi is not installed.')
+        configs = self.parse_configs(options['configs'])
+
+        user, token = self.seed(options['recipes'])
+        path = reverse('recipe:recipe-list')
+        headers = {'Authorization': f'Token {token}'}
+        try:
+            self.stdout.write(
+                f'{options["recipes"]} recipes, {options["concurrency"]} '
+                f'clients, {options["duration"]:g}s per configuration, '
+                f'{server.cpu_count()} CPUs')
+            self.stdout.write(
+                'workers threads    req/s   p50 ms   p99 ms  errors'
+                '   RSS MB   PSS MB')
+            for workers, threads in configs:
+                row = self.measure(workers, threads, options, path, headers)
+                self.stdout.write(
+                    '{:7d} {:7d} {:8.1f} {:8.1f} {:8.1f} {:7d} '
+                    '{:8.1f} {:8.1f}'.format(*row))
+        finally:
+            user.delete()
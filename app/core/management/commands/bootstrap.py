@@ -0,0 +1,127 @@
+'''
+Django command to prepare a container before the app server starts.
+'''
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+
+from core import schema
+
+MIGRATE_LOCK_KEY = 2032
+STATIC_STAMP_NAME = '.collectstatic-hash'
+
+
+def static_sources_hash():
+    '''Return a hash of every static source file and the storage used.'''
+    digest = hashlib.sha256(settings.STATICFILES_STORAGE.encode())
+    entries = []
+    for finder in get_finders():
+        for path, storage in finder.list([]):
+            stat = os.stat(storage.path(path))
+            entries.append(f'{path}:{stat.st_size}:{stat.st_mtime_ns}')
+    for entry in sorted(entries):
+        digest.update(entry.encode())
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    '''Django command to wait for dependencies, collect static, migrate.'''
+    help = (
+        'Wait for the database, then collect static files and build the '
+        'API schema (both skipped when unchanged) and migrate (one '
+        'replica at a time) concurrently.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-collectstatic', action='store_true',
+            help='Do not collect static files.',
+        )
+        parser.add_argument(
+            '--force-collectstatic', action='store_true',
+            help='Collect static files even if sources are unchanged.',
+        )
+        parser.add_argument(
+            '--skip-migrate', action='store_true',
+            help='Do not apply migrations.',
+        )
+
+    def timed(self, name, func, *args):
+        '''Run func and return (name, seconds, result).'''
+        start = time.monotonic()
+        result = func(*args)
+        return name, time.monotonic() - start, result
+
+    def collectstatic(self, force):
+        '''Collect static files unless the sources hash is unchanged.'''
+        stamp = os.path.join(settings.STATIC_ROOT, STATIC_STAMP_NAME)
+        sources_hash = static_sources_hash()
+        if not force and os.path.exists(stamp):
+            with open(stamp) as stamp_file:
+                if stamp_file.read().strip() == sources_hash:
+                    return 'unchanged, skipped'
+
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(stamp, 'w') as stamp_file:
+            stamp_file.write(sources_hash)
+        return 'collected'
+
+    def build_schema(self):
+        '''Build the OpenAPI schema unless built for this code version.'''
+        if schema.is_built():
+            return 'unchanged, skipped'
+        schema.build()
+        return 'built'
+
+    def migrate(self):
+        '''Migrate every database while holding a cluster-wide lock.'''
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', [MIGRATE_LOCK_KEY])
+        try:
+            applied = 0
+            for alias in settings.DATABASES:
+                executor = MigrationExecutor(connections[alias])
+                plan = executor.migration_plan(
+                    executor.loader.graph.leaf_nodes())
+                if plan:
+                    call_command(
+                        'migrate', database=alias, interactive=False,
+                        verbosity=0)
+                    applied += len(plan)
+            if not applied:
+                return 'up to date, skipped'
+            return f'applied {applied} migrations'
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_advisory_unlock(%s)', [MIGRATE_LOCK_KEY])
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        phases = [self.timed('wait_for_db', call_command, 'wait_for_db')]
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            background = [
+                executor.submit(
+                    self.timed, 'build_schema', self.build_schema),
+            ]
+            if not options['skip_collectstatic']:
+                background.append(executor.submit(
+                    self.timed, 'collectstatic', self.collectstatic,
+                    options['force_collectstatic']))
+            if not options['skip_migrate']:
+                phases.append(self.timed('migrate', self.migrate))
+            phases.extend(future.result() for future in background)
+
+        for name, seconds, result in phases:
+            detail = f' ({result})' if result else ''
+            self.stdout.write(f'{name}: {seconds:.3f}s{detail}')
+        self.stdout.write(self.style.SUCCESS('Bootstrap complete!'))
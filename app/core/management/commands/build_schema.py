@@ -0,0 +1,28 @@
+'''
+Django command to precompute the OpenAPI schema for this code version.
+'''
+from django.core.management.base import BaseCommand
+
+from core import schema
+
+
+class Command(BaseCommand):
+    '''Django command to build the cached OpenAPI schema.'''
+    help = 'Write the OpenAPI schema for the current code version.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Rebuild even if files for this version exist.',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        version = schema.code_version()
+        if schema.is_built() and not options['force']:
+            self.stdout.write(f'Schema {version} already built.')
+            return
+
+        for path in schema.build():
+            self.stdout.write(f'Wrote {path}')
+        self.stdout.write(self.style.SUCCESS(f'Schema {version} built.'))
@@ -0,0 +1,37 @@
+'''
+Django command to report cache hit and miss counts.
+'''
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+from core.cache import TieredCache
+
+
+class Command(BaseCommand):
+    '''Django command to show hit ratios of the tiered caches.'''
+    help = 'Show hit and miss totals of all workers for tiered caches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Reset the totals after reporting them.',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        for alias in settings.CACHES:
+            cache = caches[alias]
+            if not isinstance(cache, TieredCache):
+                continue
+            stats = cache.stats()
+            hits = stats['local_hits'] + stats['shared_hits']
+            lookups = hits + stats['misses']
+            ratio = hits / lookups if lookups else 0
+            self.stdout.write(
+                f'{alias}: {lookups} lookups, hit ratio {ratio:.1%} '
+                f'(local {stats["local_hits"]}, shared '
+                f'{stats["shared_hits"]}, misses {stats["misses"]}, '
+                f'recomputes {stats["recomputes"]})')
+            if options['reset']:
+                cache.reset_stats()
@@ -0,0 +1,52 @@
+'''
+Django command to check recipe summaries against the recipe tables.
+'''
+from django.core.management.base import BaseCommand, CommandError
+
+from core import sharding, summary
+
+
+class Command(BaseCommand):
+    '''Django command to check recipe summaries.'''
+    help = 'Report recipe summaries that disagree with the recipe tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, dest='user_id',
+            help='Only check summaries of this user id.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of recipes compared per query.',
+        )
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Rebuild the summaries found inconsistent.',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        problems = []
+        for _ in sharding.each_shard(options['user_id']):
+            found = list(summary.find_inconsistencies(
+                user_id=options['user_id'],
+                batch_size=options['batch_size'],
+            ))
+            for recipe_id, problem in found:
+                self.stdout.write(f'Recipe {recipe_id}: {problem}')
+            if options['fix']:
+                summary.refresh_recipe_summaries(
+                    [recipe_id for recipe_id, _ in found], force=True)
+            problems += found
+
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('Recipe summaries OK.'))
+            return
+
+        if options['fix']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Fixed {len(problems)} recipe summaries.'))
+            return
+
+        raise CommandError(
+            f'{len(problems)} recipe summaries are inconsistent.')
@@ -0,0 +1,31 @@
+'''
+Django command to compact the recipe change log.
+'''
+from django.core.management.base import BaseCommand
+
+from core import changes, sharding
+
+
+class Command(BaseCommand):
+    '''Django command to compact the change log.'''
+    help = (
+        'Remove superseded change log entries and deletions older than '
+        '--days. Clients with cursors before dropped deletions must resync.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='Keep deletions newer than this many days.',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        superseded = tombstones = 0
+        for _ in sharding.each_shard():
+            removed = changes.compact(options['days'])
+            superseded += removed[0]
+            tombstones += removed[1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {superseded} superseded entries and '
+            f'{tombstones} deletions.'))
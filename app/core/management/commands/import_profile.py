@@ -0,0 +1,91 @@
+'''
+Django command to report the import cost of starting a worker.
+'''
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORTTIME_PREFIX = 'import time:'
+
+
+def parse_importtime(lines):
+    '''Yield (module, self_us, cumulative_us) from -X importtime output.'''
+    for line in lines:
+        if not line.startswith(IMPORTTIME_PREFIX):
+            continue
+        self_us, cumulative_us, module = line[len(IMPORTTIME_PREFIX):].split(
+            '|')
+        if not self_us.strip().isdigit():
+            continue
+        yield module.strip(), int(self_us), int(cumulative_us)
+
+
+class Command(BaseCommand):
+    '''Django command to profile imports of the WSGI application.'''
+    help = (
+        'Import the WSGI application in a fresh interpreter with '
+        '-X importtime and report the most expensive modules. Use '
+        '--settings to profile another settings profile.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=25,
+            help='Number of modules to list.',
+        )
+        parser.add_argument(
+            '--sort', choices=['cumulative', 'self'], default='cumulative',
+            help='Order modules by cumulative or own import time.',
+        )
+        parser.add_argument(
+            '--packages', action='store_true',
+            help='Sum own import time per top-level package instead.',
+        )
+
+    def profile(self):
+        '''Return -X importtime output lines for importing the app.'''
+        module = settings.WSGI_APPLICATION.rpartition('.')[0]
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            env=os.environ.copy(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        lines = result.stderr.splitlines()
+        if result.returncode:
+            raise CommandError(
+                f'Importing {module} failed:\n' + '\n'.join(
+                    line for line in lines
+                    if not line.startswith(IMPORTTIME_PREFIX)))
+        return lines
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        modules = list(parse_importtime(self.profile()))
+        total = sum(self_us for _, self_us, _ in modules)
+
+        if options['packages']:
+            costs = defaultdict(int)
+            for module, self_us, _ in modules:
+                costs[module.split('.')[0]] += self_us
+            rows = sorted(costs.items(), key=lambda item: -item[1])
+            self.stdout.write(f'{"self ms":>10}  package')
+            for package, self_us in rows[:options['limit']]:
+                self.stdout.write(f'{self_us / 1000:10.1f}  {package}')
+        else:
+            key = 2 if options['sort'] == 'cumulative' else 1
+            rows = sorted(modules, key=lambda row: -row[key])
+            self.stdout.write(f'{"self ms":>10}{"cumul. ms":>12}  module')
+            for module, self_us, cumulative_us in rows[:options['limit']]:
+                self.stdout.write(
+                    f'{self_us / 1000:10.1f}{cumulative_us / 1000:12.1f}'
+                    f'  {module}')
+
+        self.stdout.write(
+            f'{len(modules)} modules imported in {total / 1000:.1f}ms '
+            f'({settings.SETTINGS_MODULE}).')
@@ -0,0 +1,185 @@
+'''
+Django command to move a user's data to another shard.
+'''
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    IntegrityError,
+    connections,
+    transaction,
+)
+from django.db.models import Max
+
+from core import changes, sharding
+from core.models import (
+    Change,
+    ChangeCompaction,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeStats,
+    RecipeStatsSource,
+    RecipeStatsUsage,
+    RecipeSummary,
+    RecipeTag,
+    Tag,
+    User,
+)
+
+# Models copied with their ids, parents first, and how to find the
+# user's rows. The change log and its horizon are copied separately.
+COPIED_MODELS = [
+    (Tag, 'user_id'),
+    (Ingredient, 'user_id'),
+    (Recipe, 'user_id'),
+    (RecipeTag, 'user_id'),
+    (RecipeIngredient, 'user_id'),
+    (RecipeSummary, 'user_id'),
+    (RecipeStats, 'user_id'),
+    (RecipeStatsUsage, 'user_id'),
+    (RecipeStatsSource, 'user_id'),
+]
+DELETED_MODELS = [
+    Change, ChangeCompaction, RecipeStatsSource, RecipeStatsUsage,
+    RecipeStats, RecipeTag, RecipeIngredient, Recipe, Tag, Ingredient,
+]
+
+
+def _batches(queryset, batch_size):
+    '''Yield lists of the queryset's objects in primary key order.'''
+    queryset = queryset.order_by('pk')
+    batch = list(queryset[:batch_size])
+    while batch:
+        yield batch
+        batch = list(queryset.filter(pk__gt=batch[-1].pk)[:batch_size])
+
+
+def _advance_sequence(alias, model, value):
+    '''Make the next id of model in alias greater than value.'''
+    if not model._meta.pk.get_internal_type().endswith('AutoField'):
+        return
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            'SELECT setval(pg_get_serial_sequence(%s, %s), '
+            'GREATEST(nextval(pg_get_serial_sequence(%s, %s)), %s))',
+            [model._meta.db_table, model._meta.pk.column] * 2 + [value],
+        )
+
+
+def copy_data(user_id, source, target, batch_size):
+    '''Copy the user's rows from source to target, return the count.
+
+    Ids are kept, so they must not be in use in target. Change log
+    entries get new ids after any the user saw in source, so sync
+    cursors handed out by source still only move forward, and the
+    user's compaction horizon is kept so cursors it expired stay so.
+    '''
+    count = 0
+    for model, field in COPIED_MODELS:
+        rows = model.objects.using(source).filter(**{field: user_id})
+        last_id = None
+        for batch in _batches(rows, batch_size):
+            model.objects.using(target).bulk_create(batch)
+            count += len(batch)
+            last_id = batch[-1].pk
+        if last_id is not None:
+            _advance_sequence(target, model, last_id)
+
+    entries = Change.objects.using(source).filter(user_id=user_id)
+    last_cursor = entries.aggregate(cursor=Max('id'))['cursor']
+    if last_cursor is not None:
+        _advance_sequence(target, Change, last_cursor)
+    for batch in _batches(entries, batch_size):
+        Change.objects.using(target).bulk_create(
+            Change(user_id=user_id, kind=entry.kind,
+                   object_id=entry.object_id, action=entry.action)
+            for entry in batch
+        )
+        count += len(batch)
+
+    horizon = ChangeCompaction.objects.using(source).filter(
+        user_id=user_id).aggregate(cursor=Max('cursor'))['cursor']
+    if horizon is not None:
+        ChangeCompaction.objects.using(target).create(
+            user_id=user_id, cursor=horizon)
+        count += 1
+    return count
+
+
+def delete_data(user_id, alias):
+    '''Delete the user's rows from a shard.'''
+    for model in DELETED_MODELS:
+        model.objects.using(alias).filter(user_id=user_id).delete()
+
+
+class Command(BaseCommand):
+    '''Django command to move a user to another shard.'''
+    help = (
+        "Copy a user's recipes, tags, ingredients and derived tables to "
+        'another database alias and point the shard directory at it. '
+        'Reads keep being served meanwhile; writes of the user are '
+        'refused with 503 until the move completes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int)
+        parser.add_argument('shard', help='Target database alias.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows copied per query.',
+        )
+        parser.add_argument(
+            '--drain', type=float,
+            default=settings.CACHES['default']['OPTIONS']['LOCAL_TIMEOUT'],
+            help=(
+                'Seconds to keep the old copy after switching, while '
+                'workers still read the cached directory entry.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        user_id, target = options['user_id'], options['shard']
+        if target not in settings.DATABASES:
+            raise CommandError(f'Unknown database alias: {target}')
+        user = User.objects.filter(id=user_id).first()
+        if user is None:
+            raise CommandError(f'Unknown user id: {user_id}')
+        source = sharding.lookup_shard(user_id)
+        if source == target:
+            self.stdout.write(f'User {user_id} is already on {target}.')
+            return
+
+        sharding.set_shard(user_id, source, moving=True)
+        try:
+            with transaction.atomic(using=source):
+                # Waits for writes in progress; later ones see `moving`
+                # or, once switched, that the source is no longer theirs.
+                changes.lock_user_in(source, user_id)
+                try:
+                    with transaction.atomic(using=target):
+                        if target != DEFAULT_DB_ALIAS:
+                            sharding.copy_user(user, target)
+                        count = copy_data(
+                            user_id, source, target, options['batch_size'])
+                except IntegrityError as error:
+                    raise CommandError(
+                        f'Could not copy to {target}, ids may be in use '
+                        f'there: {error}')
+            sharding.set_shard(user_id, target)
+            time.sleep(options['drain'])
+            with transaction.atomic(using=source):
+                delete_data(user_id, source)
+                if source != DEFAULT_DB_ALIAS:
+                    User.objects.using(source).filter(id=user_id).delete()
+        except BaseException:
+            if sharding.lookup_shard(user_id) == source:
+                sharding.set_shard(user_id, source)
+            raise
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved user {user_id} from {source} to {target} '
+            f'({count} rows).'))
@@ -0,0 +1,43 @@
+'''
+Django command to hash partition the recipe tables by user.
+'''
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import partitioning, sharding
+
+
+class Command(BaseCommand):
+    '''Django command to partition the recipe tables.'''
+    help = (
+        'Convert the recipe and recipe link tables of every shard that are '
+        'not partitioned yet into tables hash partitioned by user. Each '
+        'table is locked while its rows are copied, so run it in a '
+        'maintenance window.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--partitions', type=int, default=settings.RECIPE_PARTITIONS,
+            help='Number of partitions per table.',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        for alias in sharding.shards():
+            for table in partitioning.PARTITIONED_TABLES:
+                if partitioning.is_partitioned(alias, table):
+                    self.stdout.write(
+                        f'{alias}: {table} is already partitioned.')
+                    continue
+                start = time.monotonic()
+                with transaction.atomic(using=alias):
+                    partitioning.partition_table(
+                        alias, table, options['partitions'])
+                self.stdout.write(
+                    f'{alias}: partitioned {table} in '
+                    f'{time.monotonic() - start:.1f}s.')
+        self.stdout.write(self.style.SUCCESS('Recipe tables partitioned.'))
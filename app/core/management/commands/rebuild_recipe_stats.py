@@ -0,0 +1,32 @@
+'''
+Django command to rebuild the recipe stats rollups.
+'''
+from django.core.management.base import BaseCommand
+
+from core import sharding, stats
+
+
+class Command(BaseCommand):
+    '''Django command to rebuild recipe stats.'''
+    help = 'Rebuild the recipe stats rollups from the recipe tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, dest='user_id',
+            help='Only rebuild stats of this user id.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of recipes read per query.',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        count = 0
+        for _ in sharding.each_shard(options['user_id']):
+            count += stats.rebuild(
+                user_id=options['user_id'],
+                batch_size=options['batch_size'],
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt recipe stats of {count} users.'))
@@ -0,0 +1,32 @@
+'''
+Django command to rebuild the denormalized recipe summary table.
+'''
+from django.core.management.base import BaseCommand
+
+from core import sharding, summary
+
+
+class Command(BaseCommand):
+    '''Django command to rebuild recipe summaries.'''
+    help = 'Rebuild recipe summaries from the recipe tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, dest='user_id',
+            help='Only rebuild summaries of this user id.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of recipes rebuilt per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        count = 0
+        for _ in sharding.each_shard(options['user_id']):
+            count += summary.rebuild(
+                user_id=options['user_id'],
+                batch_size=options['batch_size'],
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {count} recipe summaries.'))
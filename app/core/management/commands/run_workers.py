@@ -0,0 +1,93 @@
+'''
+Django command to run background jobs.
+'''
+import logging
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections
+
+from core import jobs
+from core.server import cpu_count
+
+logger = logging.getLogger(__name__)
+
+
+def work(stop, poll_interval):
+    '''Run jobs until stop is set, sleeping while none is ready.'''
+    # The parent handles interrupts and sets stop; finish the current job.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    while not stop.is_set():
+        try:
+            job = jobs.run_next()
+        except DatabaseError:
+            logger.exception('Claiming a job failed')
+            connections.close_all()
+            job = None
+        if job is None:
+            stop.wait(poll_interval)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    '''Django command to run queued jobs in a pool of processes.'''
+    help = (
+        'Run queued jobs in worker processes until interrupted, or run '
+        'the jobs that are ready and exit with --once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=cpu_count(),
+            help='Number of worker processes.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1,
+            help='Seconds a worker sleeps when no job is ready.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run ready jobs in this process, then exit.',
+        )
+
+    def spawn(self, stop, poll_interval):
+        '''Start and return a worker process.'''
+        process = multiprocessing.Process(
+            target=work, args=(stop, poll_interval), daemon=True)
+        process.start()
+        return process
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        if options['once']:
+            count = 0
+            while jobs.run_next() is not None:
+                count += 1
+            self.stdout.write(f'Ran {count} jobs.')
+            return
+
+        # Forked workers must not share the parent's connections.
+        connections.close_all()
+        stop = multiprocessing.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        poll_interval = options['poll_interval']
+        processes = [
+            self.spawn(stop, poll_interval)
+            for _ in range(options['processes'])
+        ]
+        self.stdout.write(f'Started {len(processes)} workers.')
+        while not stop.wait(1):
+            for index, process in enumerate(processes):
+                if not process.is_alive():
+                    logger.warning(
+                        'Worker %s exited with %s, restarting',
+                        process.pid, process.exitcode)
+                    processes[index] = self.spawn(stop, poll_interval)
+
+        for process in processes:
+            process.join()
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
@@ -0,0 +1,31 @@
+'''
+Django command to write the uWSGI configuration.
+'''
+from django.core.management.base import BaseCommand
+
+from core import server
+
+
+class Command(BaseCommand):
+    '''Django command to generate a uWSGI ini file from the environment.'''
+    help = (
+        'Write a uWSGI ini sized to the available CPUs, overridable with '
+        'WSGI_WORKERS, WSGI_THREADS, WSGI_CHEAPER, WSGI_LISTEN, '
+        'WSGI_BUFFER_SIZE, WSGI_HARAKIRI, WSGI_MAX_REQUESTS, '
+        'WSGI_RELOAD_ON_RSS (MB), WSGI_SOCKET and WSGI_STATS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help='File to write, standard output when omitted.',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command.'''
+        content = server.render_ini(server.uwsgi_options())
+        if not options['output']:
+            self.stdout.write(content, ending='')
+            return
+        with open(options['output'], 'w') as ini_file:
+            ini_file.write(content)
@@ -1,27 +1,107 @@
 '''
 Django command to wait for the database to be available.
 '''
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-from psycopg2 import OperationalError as Psycompg2Error
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 
-from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from core import probes
 
 
 class Command(BaseCommand):
     ''' Django command to wait for database.'''
+    help = (
+        'Wait until databases (and optionally caches and storage) accept '
+        'connections, retrying with exponential backoff and jitter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Database alias to wait for (default: all configured).',
+        )
+        parser.add_argument(
+            '--caches', action='store_true',
+            help='Also wait for all configured caches.',
+        )
+        parser.add_argument(
+            '--storage', action='store_true',
+            help='Also wait for the default file storage.',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Give up after this many seconds, 0 waits forever.',
+        )
+        parser.add_argument(
+            '--initial-delay', type=float, default=0.005,
+            help='First retry delay in seconds.',
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=1,
+            help='Upper bound for retry delays in seconds.',
+        )
+
+    def get_probes(self, options):
+        '''Return {name: callable} of the probes to run.'''
+        aliases = options['databases'] or list(settings.DATABASES)
+        checks = {
+            f'database {alias}': partial(probes.probe_database, alias)
+            for alias in aliases
+        }
+        if options['caches']:
+            checks.update({
+                f'cache {alias}': partial(probes.probe_cache, alias)
+                for alias in settings.CACHES
+            })
+        if options['storage']:
+            checks['storage'] = probes.probe_storage
+        return checks
+
+    def run_probes(self, executor, checks):
+        '''Run probes concurrently and return {name: error} of failures.'''
+        futures = {
+            name: executor.submit(check) for name, check in checks.items()
+        }
+        failures = {}
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as error:
+                failures[name] = error
+        return failures
 
     def handle(self, *args, **options):
         '''Enterypoint for command.'''
         self.stdout.write('Waiting for database...')
-        db_up = False
-        while db_up is False:
-            try:
-                self.check(databases=['default'])
-                db_up = True
-            except (Psycompg2Error, OperationalError):
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+        pending = self.get_probes(options)
+        timeout = options['timeout']
+        deadline = time.monotonic() + timeout if timeout else None
+        delay = options['initial_delay']
+
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            while True:
+                failures = self.run_probes(executor, pending)
+                if not failures:
+                    break
+                pending = {name: pending[name] for name in failures}
+
+                sleep = delay / 2 + random.uniform(0, delay / 2)
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise CommandError(
+                            'Timed out waiting for: ' + ', '.join(
+                                f'{name} ({error.__class__.__name__})'
+                                for name, error in failures.items()))
+                    sleep = min(sleep, remaining)
+                self.stdout.write(
+                    f'{", ".join(failures)} unavailable, '
+                    f'waiting {sleep:.3f} seconds...')
+                time.sleep(sleep)
+                delay = min(delay * 2, options['max_delay'])
 
         self.stdout.write(self.style.SUCCESS('Database available!'))
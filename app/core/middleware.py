@@ -0,0 +1,97 @@
+'''
+Custom middleware.
+'''
+import threading
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.middleware.gzip import GZipMiddleware
+
+from core import probes
+
+
+class HealthCheckMiddleware:
+    '''Answer liveness and readiness probes before any other middleware.
+
+    Must be first in MIDDLEWARE so probes skip sessions, auth, CSRF and
+    URL resolution. `/healthz` only reports the process is serving.
+    `/readyz` checks databases and storage, caching the result for
+    READINESS_CACHE_SECONDS so frequent probes cost no I/O.
+    '''
+    liveness_paths = {'/healthz', '/healthz/'}
+    readiness_paths = {'/readyz', '/readyz/'}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lock = threading.Lock()
+        self.checked_at = None
+        self.failures = []
+
+    def __call__(self, request):
+        if request.path in self.liveness_paths:
+            return JsonResponse({'status': 'ok'})
+        if request.path in self.readiness_paths:
+            return self.readiness()
+        return self.get_response(request)
+
+    def check(self):
+        '''Return names of the dependencies that are unavailable.'''
+        checks = [
+            (f'database {alias}', probes.probe_database, [alias])
+            for alias in settings.DATABASES
+        ]
+        checks.append(('storage', probes.probe_storage, []))
+        failures = []
+        for name, probe, args in checks:
+            try:
+                probe(*args)
+            except Exception:
+                failures.append(name)
+        return failures
+
+    def readiness(self):
+        '''Return the cached readiness status, refreshing it when stale.'''
+        now = time.monotonic()
+        stale = (
+            self.checked_at is None or
+            now - self.checked_at >= settings.READINESS_CACHE_SECONDS
+        )
+        # Only one thread refreshes; others serve the previous result.
+        if stale and self.lock.acquire(blocking=self.checked_at is None):
+            try:
+                self.failures = self.check()
+                self.checked_at = time.monotonic()
+            finally:
+                self.lock.release()
+
+        if self.failures:
+            return JsonResponse(
+                {'status': 'unavailable', 'failures': self.failures},
+                status=503,
+            )
+        return JsonResponse({'status': 'ok'})
+
+
+class CompressionMiddleware(GZipMiddleware):
+    '''Gzip text responses of at least GZIP_MIN_LENGTH bytes.
+
+    Unlike GZipMiddleware, small bodies and media types that are already
+    compressed (images) are left alone, so workers only spend CPU where
+    it pays off.
+    '''
+    compressible_types = (
+        'application/json',
+        'application/javascript',
+        'application/xml',
+        'text/',
+    )
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(self.compressible_types):
+            return response
+        if (not response.streaming and
+                len(response.content) < settings.GZIP_MIN_LENGTH):
+            return response
+        return super().process_response(request, response)
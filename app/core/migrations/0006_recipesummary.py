@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:33
+
+from django.conf import settings
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSummary',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='core.recipe')),
+                ('title', models.CharField(max_length=255)),
+                ('time_minutes', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('link', models.CharField(blank=True, max_length=255)),
+                ('tags', models.JSONField(default=list)),
+                ('ingredients', models.JSONField(default=list)),
+                ('tag_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('ingredient_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipesummary',
+            index=models.Index(fields=['user', '-recipe'], name='core_summary_user_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipesummary',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tag_ids'], name='core_summary_tag_ids_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipesummary',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ingredient_ids'], name='core_summary_ingredient_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-19 11:10
+
+from django.conf import settings
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recipe_stats', serialize=False, to='core.user')),
+                ('recipe_count', models.IntegerField(default=0)),
+                ('total_time_minutes', models.BigIntegerField(default=0)),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('price_buckets', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeStatsUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=32)),
+                ('object_id', models.BigIntegerField()),
+                ('recipe_count', models.IntegerField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeStatsSource',
+            fields=[
+                ('recipe_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('time_minutes', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('tag_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('ingredient_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipestatsusage',
+            index=models.Index(fields=['user', 'kind', '-recipe_count'], name='core_stats_usage_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipestatsusage',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'object_id'), name='core_stats_usage_unique'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+def fill_keys(apps, schema_editor):
+    '''Set the normalized key of existing ingredients.'''
+    Ingredient = apps.get_model('core', 'Ingredient')
+    batch = []
+    for ingredient in Ingredient.objects.only('id', 'name').iterator():
+        ingredient.key = ' '.join(ingredient.name.casefold().split())
+        batch.append(ingredient)
+        if len(batch) == 1000:
+            Ingredient.objects.bulk_update(batch, ['key'])
+            batch = []
+    Ingredient.objects.bulk_update(batch, ['key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='key',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(
+                fields=['user', 'key'], name='core_ingredient_key_idx'),
+        ),
+    ]
@@ -0,0 +1,115 @@
+from django.db import migrations, models
+
+# Kept in sync with core.models.normalize_name when this was written.
+
+
+def normalize_name(name):
+    key = ' '.join(name.casefold().split())
+    if len(key) <= 3 or not key.endswith('s'):
+        return key
+    if key.endswith('ies'):
+        return key[:-3] + 'y'
+    if key.endswith('oes'):
+        return key[:-2]
+    if key.endswith(('ss', 'us', 'is')):
+        return key
+    return key[:-1]
+
+
+def fill_keys(apps, schema_editor):
+    '''Set the normalized key of existing tags and ingredients.'''
+    for model_name in ['Tag', 'Ingredient']:
+        model = apps.get_model('core', model_name)
+        batch = []
+        for obj in model.objects.only('id', 'name').iterator():
+            obj.key = normalize_name(obj.name)
+            batch.append(obj)
+            if len(batch) == 1000:
+                model.objects.bulk_update(batch, ['key'])
+                batch = []
+        model.objects.bulk_update(batch, ['key'])
+
+
+MERGE_SQL = '''
+CREATE TEMPORARY TABLE merge ON COMMIT DROP AS
+SELECT id, user_id, target FROM (
+    SELECT id, user_id,
+           min(id) OVER (PARTITION BY user_id, key) AS target
+    FROM {table}
+) ranked WHERE id <> target;
+
+INSERT INTO core_change (user_id, kind, object_id, action, created)
+SELECT DISTINCT merge.user_id, 'recipe', link.recipe_id, 'upsert', now()
+FROM {through} link JOIN merge ON link.{column} = merge.id;
+
+INSERT INTO core_change (user_id, kind, object_id, action, created)
+SELECT user_id, '{kind}', id, 'delete', now() FROM merge;
+
+INSERT INTO {through} (recipe_id, {column})
+SELECT link.recipe_id, merge.target
+FROM {through} link JOIN merge ON link.{column} = merge.id
+ON CONFLICT DO NOTHING;
+
+DELETE FROM {through} link USING merge WHERE link.{column} = merge.id;
+DELETE FROM {table} obj USING merge WHERE obj.id = merge.id;
+DROP TABLE merge;
+'''
+
+
+def merge_duplicates(apps, schema_editor):
+    '''Merge tags and ingredients of a user with the same key.
+
+    The oldest one is kept, recipes are linked to it instead and the
+    change log records the merged items as deleted.
+    '''
+    for kind, relation in [('tag', 'tags'), ('ingredient', 'ingredients')]:
+        model = apps.get_model('core', kind)
+        through = apps.get_model('core', 'Recipe')._meta.get_field(
+            relation).remote_field.through
+        schema_editor.execute(MERGE_SQL.format(
+            table=model._meta.db_table,
+            through=through._meta.db_table,
+            column=f'{kind}_id',
+            kind=kind,
+        ))
+    # Run the deferred foreign key checks now, Postgres refuses to alter
+    # tables with pending ones.
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_ingredient_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='key',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='core_ingredient_key_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'key'),
+                name='core_tag_user_key_unique',
+                opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'key'),
+                name='core_ingredient_user_key_unique',
+                opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+        ),
+    ]
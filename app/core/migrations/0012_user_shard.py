@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-19 11:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_normalized_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserShard',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shard', serialize=False, to='core.user')),
+                ('shard', models.CharField(max_length=63)),
+                ('moving', models.BooleanField(default=False)),
+            ],
+        ),
+    ]
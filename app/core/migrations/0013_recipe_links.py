@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+FILL_USERS_SQL = '''
+UPDATE {through} link SET user_id = recipe.user_id
+FROM core_recipe recipe WHERE recipe.id = link.recipe_id;
+'''
+
+
+def fill_users(apps, schema_editor):
+    '''Copy the user of each recipe to its links.'''
+    for model_name in ['RecipeTag', 'RecipeIngredient']:
+        through = apps.get_model('core', model_name)
+        schema_editor.execute(FILL_USERS_SQL.format(
+            through=schema_editor.quote_name(through._meta.db_table),
+        ))
+    # Run the deferred foreign key checks now, Postgres refuses to alter
+    # tables with pending ones.
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def link_fields(target):
+    return [
+        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+        ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.recipe')),
+        (target, models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=f'core.{target}')),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0012_user_shard'),
+    ]
+
+    operations = [
+        # Declare the tables Django created for the many to many fields.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='RecipeTag',
+                    fields=link_fields('tag'),
+                    options={
+                        'db_table': 'core_recipe_tags',
+                        'unique_together': {('recipe', 'tag')},
+                    },
+                ),
+                migrations.CreateModel(
+                    name='RecipeIngredient',
+                    fields=link_fields('ingredient'),
+                    options={
+                        'db_table': 'core_recipe_ingredients',
+                        'unique_together': {('recipe', 'ingredient')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='recipe',
+                    name='tags',
+                    field=models.ManyToManyField(through='core.RecipeTag', to='core.Tag'),
+                ),
+                migrations.AlterField(
+                    model_name='recipe',
+                    name='ingredients',
+                    field=models.ManyToManyField(through='core.RecipeIngredient', to='core.Ingredient'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipetag',
+            name='user',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='user',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_users, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='recipetag',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recipetag',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recipeingredient',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='recipetag',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe', 'tag'), name='core_recipe_tag_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe', 'ingredient'), name='core_recipe_ingredient_unique'),
+        ),
+        # Recipes get partitioned by user, see core.partitioning.
+        migrations.AlterField(
+            model_name='recipetag',
+            name='recipe',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='core.recipe'),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='recipe',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='core.recipe'),
+        ),
+        migrations.AlterField(
+            model_name='recipesummary',
+            name='recipe',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='core.recipe'),
+        ),
+    ]
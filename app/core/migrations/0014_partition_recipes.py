@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations
+
+from core import partitioning
+
+
+def partition_empty_tables(apps, schema_editor):
+    '''Partition the recipe tables of new databases.
+
+    Tables holding rows are left to the `partition_recipe_tables`
+    command, which locks them while copying.
+    '''
+    alias = schema_editor.connection.alias
+    for table in partitioning.PARTITIONED_TABLES:
+        if partitioning.is_partitioned(alias, table):
+            continue
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM '
+                f'{schema_editor.quote_name(table)})')
+            if cursor.fetchone()[0]:
+                continue
+        partitioning.partition_table(
+            alias, table, settings.RECIPE_PARTITIONS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_links'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            partition_empty_tables, migrations.RunPython.noop),
+    ]
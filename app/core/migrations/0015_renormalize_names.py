@@ -0,0 +1,120 @@
+from django.db import migrations
+
+# Kept in sync with core.models.normalize_name when this was written.
+
+
+def normalize_name(name):
+    key = ' '.join(name.casefold().split())
+    if len(key) <= 3:
+        return key
+    if key.endswith('ies'):
+        key = key[:-1]
+    elif key.endswith(('oes', 'ches', 'shes', 'sses', 'xes')):
+        key = key[:-2]
+    elif key.endswith('s') and not key.endswith(('ss', 'us', 'is')):
+        key = key[:-1]
+    if key.endswith('y') and key[-2] not in 'aeiou ':
+        return key[:-1] + 'ie'
+    if key.endswith(('che', 'she')):
+        return key[:-1]
+    return key
+
+
+# Like the merge of 0011_normalized_names, but against the new keys in
+# rekey, with the user column of the links, and moving changed keys
+# through unique placeholders as (user, key) is constrained unique.
+REKEY_SQL = '''
+CREATE TEMPORARY TABLE merge ON COMMIT DROP AS
+SELECT id, user_id, target FROM (
+    SELECT obj.id, obj.user_id,
+           min(obj.id) OVER (
+               PARTITION BY obj.user_id, coalesce(rekey.key, obj.key)
+           ) AS target
+    FROM {table} obj LEFT JOIN rekey ON rekey.id = obj.id
+) ranked WHERE id <> target;
+
+INSERT INTO core_change (user_id, kind, object_id, action, created)
+SELECT DISTINCT merge.user_id, 'recipe', link.recipe_id, 'upsert', now()
+FROM {through} link
+JOIN merge ON link.user_id = merge.user_id AND link.{column} = merge.id;
+
+INSERT INTO core_change (user_id, kind, object_id, action, created)
+SELECT user_id, '{kind}', id, 'delete', now() FROM merge;
+
+INSERT INTO {through} (user_id, recipe_id, {column})
+SELECT link.user_id, link.recipe_id, merge.target
+FROM {through} link
+JOIN merge ON link.user_id = merge.user_id AND link.{column} = merge.id
+ON CONFLICT DO NOTHING;
+
+DELETE FROM {through} link USING merge
+WHERE link.user_id = merge.user_id AND link.{column} = merge.id;
+DELETE FROM {table} obj USING merge WHERE obj.id = merge.id;
+
+UPDATE {table} obj SET key = chr(1) || obj.id
+FROM rekey WHERE rekey.id = obj.id;
+UPDATE {table} obj SET key = rekey.key
+FROM rekey WHERE rekey.id = obj.id;
+
+-- Retires autocomplete vocabularies cached with the old keys.
+INSERT INTO core_change (user_id, kind, object_id, action, created)
+SELECT obj.user_id, '{kind}', obj.id, 'upsert', now()
+FROM {table} obj JOIN rekey ON rekey.id = obj.id;
+
+DROP TABLE merge;
+DROP TABLE rekey;
+'''
+
+
+def renormalize_keys(apps, schema_editor):
+    '''Recompute the keys of tags and ingredients and merge duplicates.
+
+    Plurals in -ies used to lose their e ("cookies" -> "cooky"), so they
+    missed their singular. As in 0011_normalized_names, the oldest item
+    of a key is kept and recipes are linked to it instead.
+    '''
+    alias = schema_editor.connection.alias
+    for kind, relation in [('tag', 'tags'), ('ingredient', 'ingredients')]:
+        model = apps.get_model('core', kind)
+        through = apps.get_model('core', 'Recipe')._meta.get_field(
+            relation).remote_field.through
+        schema_editor.execute(
+            'CREATE TEMPORARY TABLE rekey '
+            '(id bigint PRIMARY KEY, key varchar(255)) ON COMMIT DROP')
+        changed = 0
+        with schema_editor.connection.cursor() as cursor:
+            batch = []
+            rows = model.objects.using(alias).values_list(
+                'id', 'name', 'key').iterator()
+            for pk, name, key in rows:
+                new_key = normalize_name(name)
+                if new_key != key:
+                    batch.append((pk, new_key))
+                if len(batch) == 1000:
+                    cursor.executemany(
+                        'INSERT INTO rekey (id, key) VALUES (%s, %s)', batch)
+                    changed += len(batch)
+                    batch = []
+            cursor.executemany(
+                'INSERT INTO rekey (id, key) VALUES (%s, %s)', batch)
+            changed += len(batch)
+        if not changed:
+            schema_editor.execute('DROP TABLE rekey')
+            continue
+        schema_editor.execute(REKEY_SQL.format(
+            table=model._meta.db_table,
+            through=through._meta.db_table,
+            column=f'{kind}_id',
+            kind=kind,
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_partition_recipes'),
+    ]
+
+    operations = [
+        migrations.RunPython(renormalize_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The horizon used to be shared by all users, so it becomes the horizon
+# of every user of the database.
+SPLIT_HORIZON_SQL = '''
+INSERT INTO core_changecompaction (user_id, cursor, created)
+SELECT core_user.id, horizon.cursor, now()
+FROM core_user, (
+    SELECT max(cursor) AS cursor FROM core_changecompaction
+    WHERE user_id IS NULL
+) horizon
+WHERE horizon.cursor IS NOT NULL;
+DELETE FROM core_changecompaction WHERE user_id IS NULL;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_renormalize_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changecompaction',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.user'),
+        ),
+        migrations.RunSQL(SPLIT_HORIZON_SQL, migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name='changecompaction',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.user'),
+        ),
+    ]
@@ -5,6 +5,9 @@ import os
 from django.conf import settings
 from unittest.util import _MAX_LENGTH  # noqa
 from django.db import models
+from django.utils import timezone
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -20,6 +23,48 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads', 'recipe', filename)
 
 
+def fold_name(name):
+    '''Return name case folded with runs of whitespace collapsed.'''
+    return ' '.join(name.casefold().split())
+
+
+def normalize_name(name):
+    '''Return the key names are matched by.
+
+    Case and spacing are ignored and the singular and plural of the last
+    word share a key by a few English rules ("Cherry Tomatoes" -> "cherry
+    tomato"). Where the singular is ambiguous the key is a stem rather
+    than a word: "berry" and "berries" -> "berrie", while "cookie" and
+    "cookies" -> "cookie".
+    '''
+    key = fold_name(name)
+    if len(key) <= 3:
+        return key
+    if key.endswith('ies'):
+        key = key[:-1]
+    elif key.endswith(('oes', 'ches', 'shes', 'sses', 'xes')):
+        key = key[:-2]
+    elif key.endswith('s') and not key.endswith(('ss', 'us', 'is')):
+        key = key[:-1]
+    if key.endswith('y') and key[-2] not in 'aeiou ':
+        return key[:-1] + 'ie'
+    if key.endswith(('che', 'she')):
+        return key[:-1]
+    return key
+
+
+class NormalizedNameMixin:
+    '''Keep the `key` field equal to normalize_name(name) on save.'''
+
+    def save(self, *args, **kwargs):
+        '''Save the object, updating its key from its name.'''
+        self.key = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'key'}
+        super().save(*args, **kwargs)
+
+
 class UserManager(BaseUserManager):
     '''Manager for users.'''
 
@@ -55,13 +100,25 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
-class Tag(models.Model):
+class Tag(NormalizedNameMixin, models.Model):
     '''Tag for filtering recipe.'''
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # normalize_name(name), kept in sync on save and by core.bulk.
+    key = models.CharField(max_length=255, editable=False)
+
+    class Meta:
+        constraints = [
+            # The pattern opclass also serves prefix (LIKE 'a%') lookups.
+            models.UniqueConstraint(
+                fields=['user', 'key'],
+                name='core_tag_user_key_unique',
+                opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -78,21 +135,326 @@ class Recipe(models.Model):
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
     link = models.CharField(max_length=255, blank=True)
-    tags = models.ManyToManyField('Tag')
-    ingredients = models.ManyToManyField('Ingredient')
+    tags = models.ManyToManyField('Tag', through='RecipeTag')
+    ingredients = models.ManyToManyField(
+        'Ingredient', through='RecipeIngredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
 
     def __str__(self):
         return self.title
 
 
-class Ingredient(models.Model):
+class RecipeLinkQuerySet(models.QuerySet):
+    '''QuerySet of recipe links filling in the user of new links.'''
+
+    def bulk_create(self, objs, *args, **kwargs):
+        '''Create links, taking missing users from their recipes.
+
+        Related managers (`recipe.tags.add()` and the like) only set the
+        recipe and the tag or ingredient unless given `through_defaults`.
+        '''
+        objs = list(objs)
+        missing = {obj.recipe_id for obj in objs if obj.user_id is None}
+        if missing:
+            users = dict(Recipe.objects.using(self.db).filter(
+                id__in=missing).values_list('id', 'user_id'))
+            for obj in objs:
+                if obj.user_id is None:
+                    obj.user_id = users.get(obj.recipe_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class RecipeLink(models.Model):
+    '''Link of a recipe to a tag or ingredient.
+
+    Links carry the recipe's user, like the recipes, as the tables are
+    hash partitioned by user (see core.partitioning). Partitioned
+    tables have no unique index on `id` alone, so foreign keys to
+    recipes are not enforced by the database.
+    '''
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+    )
+    # Indexed by the unique constraint of subclasses, which leads with it.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+
+    objects = RecipeLinkQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        '''Save the link, taking a missing user from the recipe.'''
+        if self.user_id is None:
+            self.user_id = self.recipe.user_id
+        super().save(*args, **kwargs)
+
+
+class RecipeTag(RecipeLink):
+    '''Tag of a recipe.'''
+    tag = models.ForeignKey('Tag', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'core_recipe_tags'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe', 'tag'],
+                name='core_recipe_tag_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Recipe {self.recipe_id} tag {self.tag_id}'
+
+
+class RecipeIngredient(RecipeLink):
+    '''Ingredient of a recipe.'''
+    ingredient = models.ForeignKey('Ingredient', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'core_recipe_ingredients'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe', 'ingredient'],
+                name='core_recipe_ingredient_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Recipe {self.recipe_id} ingredient {self.ingredient_id}'
+
+
+class Ingredient(NormalizedNameMixin, models.Model):
     '''Ingredient object.'''
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
     name = models.CharField(max_length=255)
+    # normalize_name(name), kept in sync on save and by core.bulk.
+    key = models.CharField(max_length=255, editable=False)
+
+    class Meta:
+        constraints = [
+            # The pattern opclass also serves prefix (LIKE 'a%') lookups.
+            models.UniqueConstraint(
+                fields=['user', 'key'],
+                name='core_ingredient_user_key_unique',
+                opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class RecipeSummary(models.Model):
+    '''Denormalized read model of a recipe used by list endpoints.'''
+    # Not enforced by the database, recipes are partitioned by user.
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='summary',
+        db_constraint=False,
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    title = models.CharField(max_length=255)
+    time_minutes = models.IntegerField()
+    price = models.DecimalField(max_digits=5, decimal_places=2)
+    link = models.CharField(max_length=255, blank=True)
+    tags = models.JSONField(default=list)
+    ingredients = models.JSONField(default=list)
+    tag_ids = ArrayField(models.BigIntegerField(), default=list)
+    ingredient_ids = ArrayField(models.BigIntegerField(), default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-recipe'],
+                name='core_summary_user_recipe_idx',
+            ),
+            GinIndex(fields=['tag_ids'], name='core_summary_tag_ids_idx'),
+            GinIndex(
+                fields=['ingredient_ids'],
+                name='core_summary_ingredient_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class Change(models.Model):
+    '''Append-only log entry of a change to a user's recipe data.'''
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTION_CHOICES = [
+        (UPSERT, 'Upsert'),
+        (DELETE, 'Delete'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    kind = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=8, choices=ACTION_CHOICES)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'id'],
+                name='core_change_user_id_idx',
+            ),
+            models.Index(
+                fields=['user', 'kind', 'object_id'],
+                name='core_change_object_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.action} {self.kind} {self.object_id}'
+
+
+class ChangeCompaction(models.Model):
+    '''Record of a compaction dropping old deletions of a user's log.'''
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    cursor = models.BigIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Compacted user {self.user_id} up to {self.cursor}'
+
+
+class Job(models.Model):
+    '''Deferred call of a `core.jobs.task` function.'''
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=255)
+    kwargs = models.JSONField(default=dict)
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(
+        max_length=8,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-priority', 'run_at'],
+                name='core_job_ready_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+class RecipeStats(models.Model):
+    '''Rollup of a user's recipes served by the stats endpoint.'''
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='recipe_stats',
+    )
+    recipe_count = models.IntegerField(default=0)
+    total_time_minutes = models.BigIntegerField(default=0)
+    total_price = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0)
+    price_buckets = ArrayField(models.IntegerField(), default=list)
+
+    def __str__(self):
+        return f'{self.recipe_count} recipes'
+
+
+class RecipeStatsUsage(models.Model):
+    '''Rollup of the number of a user's recipes using a tag or ingredient.'''
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    kind = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    recipe_count = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'kind', 'object_id'],
+                name='core_stats_usage_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'kind', '-recipe_count'],
+                name='core_stats_usage_top_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}: {self.recipe_count}'
+
+
+class RecipeStatsSource(models.Model):
+    '''Values a recipe last added to its user's rollups.
+
+    Kept without a foreign key so they outlive the recipe and can be
+    subtracted after it was changed or deleted.
+    '''
+    recipe_id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    time_minutes = models.IntegerField()
+    price = models.DecimalField(max_digits=5, decimal_places=2)
+    tag_ids = ArrayField(models.BigIntegerField(), default=list)
+    ingredient_ids = ArrayField(models.BigIntegerField(), default=list)
+
+    def __str__(self):
+        return f'Recipe {self.recipe_id}'
+
+
+class UserShard(models.Model):
+    '''Directory entry naming the database that holds a user's data.'''
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='shard',
+    )
+    # Alias in settings.DATABASES.
+    shard = models.CharField(max_length=63)
+    # Set by `move_user` while the data is copied; writes are refused.
+    moving = models.BooleanField(default=False)
+
+    def __str__(self):
+        return self.shard
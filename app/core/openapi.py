@@ -0,0 +1,34 @@
+'''
+OpenAPI annotations for views and serializers.
+
+The API worker pool (`app.settings_api`) leaves drf_spectacular out of
+INSTALLED_APPS so workers never import the schema tooling. Modules take
+the annotations from here rather than from `drf_spectacular.utils`:
+with the app installed they are drf_spectacular's, without it the
+decorators return what they decorate and parameters and types are
+inert placeholders.
+'''
+from django.conf import settings
+
+if 'drf_spectacular' in settings.INSTALLED_APPS:
+    from drf_spectacular.utils import (  # noqa: F401
+        OpenApiParameter,
+        OpenApiTypes,
+        extend_schema,
+        extend_schema_field,
+        extend_schema_view,
+    )
+else:
+    def _annotation(*args, **kwargs):
+        return lambda target: target
+
+    extend_schema = extend_schema_field = extend_schema_view = _annotation
+
+    def OpenApiParameter(*args, **kwargs):
+        return None
+
+    class _Types:
+        def __getattr__(self, name):
+            return name
+
+    OpenApiTypes = _Types()
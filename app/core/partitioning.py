@@ -0,0 +1,101 @@
+'''
+Hash partitioning of the recipe tables by user.
+
+Recipes and their links to tags and ingredients are the largest tables
+and are only ever read for one user at a time. PARTITIONED_TABLES are
+split into settings.RECIPE_PARTITIONS tables by a hash of `user_id`, so
+each index covers a fraction of the rows and queries filtering on the
+user only touch one partition. Queries must filter on `user_id` for
+Postgres to skip the other partitions; lookups by id alone still work,
+searching every partition.
+
+Unique indexes of a partitioned table must include `user_id`, so the
+primary keys become (id, user_id) and foreign keys to recipes are not
+enforced by the database. Django keeps treating `id` as the primary
+key, which the id sequence keeps unique.
+
+The `0014_partition_recipes` migration partitions the tables while they
+are empty; existing databases are converted with the
+`partition_recipe_tables` command, which rewrites each table holding an
+exclusive lock.
+'''
+from django.db import connections
+
+PARTITIONED_TABLES = [
+    'core_recipe',
+    'core_recipe_tags',
+    'core_recipe_ingredients',
+]
+PARTITION_KEY = 'user_id'
+
+
+def is_partitioned(alias, table):
+    '''Return True if table is partitioned in a database.'''
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            'SELECT relkind FROM pg_class WHERE oid = %s::regclass',
+            [table],
+        )
+        return cursor.fetchone()[0] == 'p'
+
+
+def partition_table(alias, table, partitions):
+    '''Convert table into one hash partitioned by user.
+
+    The rows are copied into a new table and the old one is dropped, so
+    this must run in a transaction. Indexes and constraints are created
+    again under their names, the primary key with the partition key.
+    '''
+    connection = connections[alias]
+    quote = connection.ops.quote_name
+    old = f'{table}_unpartitioned'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT conname, contype, pg_get_constraintdef(oid) '
+            'FROM pg_constraint WHERE conrelid = %s::regclass',
+            [table],
+        )
+        constraints = cursor.fetchall()
+        constraint_names = {name for name, _, _ in constraints}
+        cursor.execute(
+            'SELECT indexname, indexdef FROM pg_indexes '
+            'WHERE schemaname = current_schema() AND tablename = %s',
+            [table],
+        )
+        indexes = [
+            definition for name, definition in cursor.fetchall()
+            if name not in constraint_names
+        ]
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+        sequence = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} '
+            f'(LIKE {quote(old)} INCLUDING DEFAULTS) '
+            f'PARTITION BY HASH ({PARTITION_KEY})'
+        )
+        for remainder in range(partitions):
+            cursor.execute(
+                f'CREATE TABLE {quote(f"{table}_p{remainder}")} '
+                f'PARTITION OF {quote(table)} FOR VALUES '
+                f'WITH (MODULUS {partitions}, REMAINDER {remainder})'
+            )
+        cursor.execute(
+            f'INSERT INTO {quote(table)} SELECT * FROM {quote(old)}')
+        if sequence is not None:
+            # Dropping the old table would drop the sequence it owns.
+            cursor.execute(
+                f'ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.id')
+        cursor.execute(f'DROP TABLE {quote(old)}')
+
+        for name, kind, definition in constraints:
+            if kind == 'p':
+                definition = f'PRIMARY KEY (id, {PARTITION_KEY})'
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} '
+                f'ADD CONSTRAINT {quote(name)} {definition}'
+            )
+        for definition in indexes:
+            cursor.execute(definition)
+        cursor.execute(f'ANALYZE {quote(table)}')
@@ -0,0 +1,34 @@
+'''
+Lightweight readiness probes for databases, caches and storage.
+
+Each probe returns on success and raises on failure. They open their
+own connections instead of running Django system checks, so they are
+cheap enough to call in a tight loop.
+'''
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.db import connections
+
+PROBE_KEY = 'core:probe'
+
+
+def probe_database(alias, timeout=2):
+    '''Open and close a raw connection to a configured database.'''
+    connection = connections[alias]
+    params = connection.get_connection_params()
+    if connection.vendor == 'postgresql':
+        params['connect_timeout'] = max(1, int(timeout))
+    connection.get_new_connection(params).close()
+
+
+def probe_cache(alias):
+    '''Round-trip a key through a configured cache.'''
+    cache = caches[alias]
+    cache.set(PROBE_KEY, 1, 10)
+    cache.get(PROBE_KEY)
+
+
+def probe_storage():
+    '''Check the default file storage root is reachable.'''
+    if not default_storage.exists(''):
+        raise OSError('Storage root is not available.')
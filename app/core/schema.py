@@ -0,0 +1,159 @@
+'''
+Precomputed OpenAPI schema served from memory.
+
+The schema is generated once per code version by the `build_schema`
+command (run by `bootstrap`) and written to SCHEMA_CACHE_DIR. Workers
+load the file for their version on first request and keep the rendered
+and gzipped bytes in memory.
+'''
+import gzip
+import hashlib
+import os
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+from drf_spectacular.renderers import (
+    OpenApiJsonRenderer,
+    OpenApiYamlRenderer,
+)
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularAPIView
+
+RENDERERS = {
+    'yaml': OpenApiYamlRenderer,
+    'json': OpenApiJsonRenderer,
+}
+
+_lock = threading.Lock()
+_schemas = {}
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    '''Return APP_VERSION, or a hash of the project's Python sources.'''
+    if settings.APP_VERSION:
+        return settings.APP_VERSION
+    digest = hashlib.sha256()
+    for root, dirs, files in sorted(os.walk(settings.BASE_DIR)):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = os.path.join(root, name)
+                digest.update(
+                    os.path.relpath(path, settings.BASE_DIR).encode())
+                with open(path, 'rb') as source:
+                    digest.update(source.read())
+    return digest.hexdigest()[:16]
+
+
+def schema_path(fmt, version=None):
+    '''Return the file the schema for a format and version is kept in.'''
+    version = version or code_version()
+    return os.path.join(
+        settings.SCHEMA_CACHE_DIR, f'schema-{version}.{fmt}')
+
+
+def is_built():
+    '''Return True if schema files exist for the current version.'''
+    return all(os.path.exists(schema_path(fmt)) for fmt in RENDERERS)
+
+
+def generate():
+    '''Return the rendered schema for every format.'''
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+    return {
+        fmt: renderer().render(schema, renderer_context={})
+        for fmt, renderer in RENDERERS.items()
+    }
+
+
+def build():
+    '''Generate and write the schema files for the current version.'''
+    os.makedirs(settings.SCHEMA_CACHE_DIR, exist_ok=True)
+    paths = []
+    for fmt, content in generate().items():
+        path = schema_path(fmt)
+        with open(f'{path}.tmp', 'wb') as schema_file:
+            schema_file.write(content)
+        os.replace(f'{path}.tmp', path)
+        paths.append(path)
+    return paths
+
+
+def load(fmt):
+    '''Return (content, gzipped content, etag) for a format.'''
+    cached = _schemas.get(fmt)
+    if cached is not None:
+        return cached
+
+    with _lock:
+        if fmt not in _schemas:
+            try:
+                with open(schema_path(fmt), 'rb') as schema_file:
+                    content = schema_file.read()
+            except FileNotFoundError:
+                content = generate()[fmt]
+            _schemas[fmt] = (
+                content,
+                gzip.compress(content),
+                f'"{code_version()}-{fmt}"',
+            )
+    return _schemas[fmt]
+
+
+def clear_cache():
+    '''Forget loaded schemas, e.g. after the cache dir changed.'''
+    with _lock:
+        _schemas.clear()
+    code_version.cache_clear()
+
+
+def accepts_gzip(accept_encoding):
+    '''Return whether an Accept-Encoding header value allows gzip.
+
+    Codings are weighed by their q-value, gzip;q=0 refusing it. Without
+    a gzip entry, `*` decides.
+    '''
+    qvalues = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        qvalue = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[coding.lower()] = qvalue
+    return qvalues.get('gzip', qvalues.get('*', 0.0)) > 0
+
+
+class CachedSchemaView(SpectacularAPIView):
+    '''Serve the precomputed schema with ETag and gzip support.'''
+
+    def _get_schema_response(self, request):
+        fmt = request.accepted_renderer.format
+        content, compressed, etag = load(fmt)
+
+        use_gzip = accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if use_gzip:
+            etag = f'{etag[:-1]}-gzip"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                compressed if use_gzip else content,
+                content_type=request.accepted_renderer.media_type,
+            )
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+        return response
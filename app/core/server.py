@@ -0,0 +1,99 @@
+'''
+uWSGI configuration generated from the environment.
+
+Sizes default to the CPUs this container may use (affinity and cgroup
+quota, not the host's CPU count) and can be overridden with WSGI_*
+variables. The UWSGI_ prefix is avoided on purpose: uWSGI reads those
+variables as options itself.
+'''
+import math
+import os
+
+SOMAXCONN_PATH = '/proc/sys/net/core/somaxconn'
+
+
+def cpu_count():
+    '''Return the number of CPUs available to this process.'''
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quotas = [
+        ('/sys/fs/cgroup/cpu.max', None),
+        ('/sys/fs/cgroup/cpu/cpu.cfs_quota_us',
+         '/sys/fs/cgroup/cpu/cpu.cfs_period_us'),
+    ]
+    for quota_path, period_path in quotas:
+        try:
+            with open(quota_path) as quota_file:
+                values = quota_file.read().split()
+            if period_path:
+                with open(period_path) as period_file:
+                    values.append(period_file.read().strip())
+            quota, period = int(values[0]), int(values[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if quota > 0:
+            return max(1, min(cpus, math.ceil(quota / period)))
+    return cpus
+
+
+def max_listen_queue():
+    '''Return the kernel's limit for socket listen queues.'''
+    try:
+        with open(SOMAXCONN_PATH) as somaxconn:
+            return int(somaxconn.read())
+    except (OSError, ValueError):
+        return 128
+
+
+def uwsgi_options(environ=None):
+    '''Return [(option, value)] for uWSGI from WSGI_* variables.'''
+    env = os.environ if environ is None else environ
+    workers = int(env.get('WSGI_WORKERS') or 2 * cpu_count())
+    threads = int(env.get('WSGI_THREADS') or 1)
+    cheaper = int(env.get('WSGI_CHEAPER') or workers // 2)
+    listen = int(env.get('WSGI_LISTEN') or min(1024, max_listen_queue()))
+
+    options = [
+        ('master', 'true'),
+        ('strict', 'true'),
+        ('need-app', 'true'),
+        ('module', 'app.wsgi'),
+        ('socket', env.get('WSGI_SOCKET', ':9000')),
+        ('die-on-term', 'true'),
+        ('vacuum', 'true'),
+        ('single-interpreter', 'true'),
+        ('enable-threads', 'true'),
+        ('thunder-lock', 'true'),
+        ('workers', workers),
+    ]
+    if threads > 1:
+        options.append(('threads', threads))
+    if 0 < cheaper < workers:
+        # Keep `cheaper` workers running, spawn more while none is idle.
+        options.extend([
+            ('cheaper-algo', 'spare'),
+            ('cheaper', cheaper),
+            ('cheaper-initial', cheaper),
+            ('cheaper-step', 1),
+        ])
+    options.extend([
+        ('listen', listen),
+        ('buffer-size', int(env.get('WSGI_BUFFER_SIZE') or 32768)),
+        ('harakiri', int(env.get('WSGI_HARAKIRI') or 30)),
+        ('max-requests', int(env.get('WSGI_MAX_REQUESTS') or 5000)),
+        ('reload-on-rss', int(env.get('WSGI_RELOAD_ON_RSS') or 300)),
+        ('worker-reload-mercy', 30),
+        ('stats', env.get('WSGI_STATS', '/tmp/uwsgi-stats.sock')),
+        ('memory-report', 'true'),
+    ])
+    return options
+
+
+def render_ini(options):
+    '''Return uWSGI ini file content for options.'''
+    lines = ['[uwsgi]']
+    lines.extend(f'{name} = {value}' for name, value in options)
+    return '\n'.join(lines) + '\n'
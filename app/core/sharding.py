@@ -0,0 +1,252 @@
+'''
+Placement of user data across databases ("shards").
+
+Everything a user owns hangs off the user, so each user's recipes, tags,
+ingredients and the tables derived from them (SHARDED_MODELS) live in
+one database alias of settings.DATABASES. Users, tokens and the
+directory stay in 'default'. Jobs are stored on the shard selected when
+they are queued, so they commit with the write queuing them.
+
+The directory (UserShard) names the shard of every user. New users are
+placed by a consistent hash ring over settings.SHARDS, so adding a shard
+only changes where new users go: existing ones stay where the directory
+says until moved with the `move_user` command. Users without an entry
+predate sharding and live in 'default'. Every shard holds the full
+schema and a copy of the row of each user it serves, so the foreign
+keys to users hold there.
+
+Directory lookups are cached; `check_writable` reads the directory
+itself, so a stale entry can only send reads to the old shard for the
+cache's in-process LOCAL_TIMEOUT after a move.
+
+`ShardRouter` sends queries of sharded models to the shard of the user
+given by the hints (a model instance with a user, or `user_id`) or else
+to the shard selected for the block of code running, see `for_user`,
+`using_shard` and `UserShardMixin` (which API views use for the
+requesting user). Transactions over user data must be opened on that
+shard too, with `atomic`.
+'''
+import bisect
+import contextvars
+import hashlib
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from rest_framework import exceptions, status
+
+from core.models import User, UserShard
+
+# Virtual nodes per shard; more spread users more evenly.
+RING_REPLICAS = 64
+DIRECTORY_TIMEOUT = 60 * 60
+SHARDED_MODELS = {
+    'core.tag',
+    'core.ingredient',
+    'core.recipe',
+    'core.recipetag',
+    'core.recipeingredient',
+    'core.recipesummary',
+    'core.change',
+    'core.changecompaction',
+    'core.recipestats',
+    'core.recipestatsusage',
+    'core.recipestatssource',
+    # Not user data, but routed to the selected shard, see core.jobs.
+    'core.job',
+}
+
+# (user id or None, alias) of the shard code is running against.
+_current = contextvars.ContextVar('shard', default=None)
+
+
+class UserMoving(exceptions.APIException):
+    '''The user's data is being moved to another shard.'''
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your data is being moved, retry shortly.'
+    default_code = 'user_moving'
+    wait = 5
+
+
+def _hash(value):
+    '''Return a stable 64 bit hash of a string.'''
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    '''Consistent hash ring mapping keys to shard aliases.'''
+
+    def __init__(self, shards, replicas=RING_REPLICAS):
+        self.points = sorted(
+            (_hash(f'{shard}:{replica}'), shard)
+            for shard in shards
+            for replica in range(replicas)
+        )
+        self.hashes = [point for point, _ in self.points]
+
+    def shard_for(self, key):
+        '''Return the shard of the first point at or after the key.'''
+        index = bisect.bisect_left(self.hashes, _hash(str(key)))
+        return self.points[index % len(self.points)][1]
+
+
+@lru_cache(maxsize=4)
+def _ring(shards):
+    return HashRing(shards)
+
+
+def ring():
+    '''Return the ring over settings.SHARDS.'''
+    return _ring(tuple(settings.SHARDS))
+
+
+def shards():
+    '''Return the aliases of all shards holding or receiving users.'''
+    placed = UserShard.objects.values_list('shard', flat=True).distinct()
+    return sorted({DEFAULT_DB_ALIAS, *settings.SHARDS, *placed})
+
+
+def _directory_key(user_id):
+    return f'sharding:user:{user_id}'
+
+
+def lookup_shard(user_id):
+    '''Return the user's shard from the directory, bypassing the cache.'''
+    shard = UserShard.objects.filter(
+        user_id=user_id).values_list('shard', flat=True).first()
+    return shard or DEFAULT_DB_ALIAS
+
+
+def db_for_user(user_id):
+    '''Return the alias of the shard holding the user's data.'''
+    current = _current.get()
+    if current is not None and current[0] == user_id:
+        return current[1]
+    return cache.get_or_set(
+        _directory_key(user_id),
+        lambda: lookup_shard(user_id),
+        DIRECTORY_TIMEOUT,
+    )
+
+
+def set_shard(user_id, shard, moving=False):
+    '''Point the user's directory entry at a shard.'''
+    UserShard.objects.update_or_create(
+        user_id=user_id, defaults={'shard': shard, 'moving': moving})
+    cache.set(_directory_key(user_id), shard, DIRECTORY_TIMEOUT)
+
+
+def current_db():
+    '''Return the alias of the shard selected for the running code.'''
+    current = _current.get()
+    return DEFAULT_DB_ALIAS if current is None else current[1]
+
+
+@contextmanager
+def using_shard(alias, user_id=None):
+    '''Route queries of user data without user hints to alias.'''
+    token = _current.set((user_id, alias))
+    try:
+        yield alias
+    finally:
+        _current.reset(token)
+
+
+def for_user(user_id):
+    '''Route queries of user data to the user's shard in the block.'''
+    return using_shard(db_for_user(user_id), user_id)
+
+
+def each_shard(user_id=None):
+    '''Yield each shard, or the user's, with queries routed to it.'''
+    if user_id is not None:
+        with for_user(user_id) as alias:
+            yield alias
+        return
+    for alias in shards():
+        with using_shard(alias):
+            yield alias
+
+
+@contextmanager
+def atomic():
+    '''Run the block, or decorated function, in a transaction on the
+    shard selected when it starts.'''
+    with transaction.atomic(using=current_db()):
+        yield
+
+
+def check_writable(user_id, alias):
+    '''Raise UserMoving unless the user's data may be written in alias.'''
+    shard, moving = UserShard.objects.filter(
+        user_id=user_id,
+    ).values_list('shard', 'moving').first() or (DEFAULT_DB_ALIAS, False)
+    if moving or shard != alias:
+        raise UserMoving()
+
+
+def copy_user(user, alias):
+    '''Copy a user row to another database unless it is there already.'''
+    row = User(**{
+        field.attname: getattr(user, field.attname)
+        for field in User._meta.concrete_fields
+    })
+    User.objects.using(alias).bulk_create([row], ignore_conflicts=True)
+
+
+def place_user(sender, instance, created, raw=False, **kwargs):
+    '''Record the shard of a new user, connected to User post_save.'''
+    if not created or raw:
+        return
+    shard = ring().shard_for(instance.pk)
+    UserShard.objects.create(user=instance, shard=shard)
+    cache.set(_directory_key(instance.pk), shard, DIRECTORY_TIMEOUT)
+    if shard != DEFAULT_DB_ALIAS:
+        copy_user(instance, shard)
+
+
+class ShardRouter:
+    '''Database router sending user data to the user's shard.'''
+
+    def _db(self, model, **hints):
+        if model._meta.label_lower not in SHARDED_MODELS:
+            return None
+        user_id = hints.get('user_id')
+        instance = hints.get('instance')
+        if user_id is None and isinstance(instance, User):
+            user_id = instance.pk
+        elif user_id is None and instance is not None:
+            user_id = getattr(instance, 'user_id', None)
+        if user_id is not None:
+            return db_for_user(user_id)
+        return current_db()
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        '''Allow relations to users, which every shard has a copy of.'''
+        if isinstance(obj1, User) or isinstance(obj2, User):
+            return True
+        return None
+
+
+class UserShardMixin:
+    '''Route the queries of an API view to the requesting user's shard.'''
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            self._shard_token = _current.set(
+                (request.user.id, db_for_user(request.user.id)))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_shard_token', None)
+        if token is not None:
+            _current.reset(token)
+            self._shard_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
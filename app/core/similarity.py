@@ -0,0 +1,203 @@
+'''
+In-memory index of a user's recipes by tag and ingredient.
+
+Every recipe is a sparse binary vector over the user's tags and
+ingredients. The index stores the matrix both ways: the features of each
+recipe and, per feature, the set of recipes having it (the columns of
+the matrix). Multiplying the matrix with a sparse vector, e.g. the
+features of one recipe or the ingredients someone has at home, then only
+touches the recipes sharing a feature with it, so a query costs in
+proportion to the overlapping recipes rather than the library size.
+This serves the similar recipes ranking (Jaccard similarity of the
+feature sets) and the "what can I cook" search.
+
+Indexes are kept per process for the most recently used users, together
+with the change log cursor they reflect. Writes only append to the
+change log (see `core.hooks`; tag and ingredient changes also log the
+recipes using them), and the next query catches the index up by
+re-reading just the recipes changed since its cursor. It is rebuilt from
+scratch when the log was compacted past the cursor or too much changed.
+Similar recipe rankings are also cached per recipe and cursor in the
+shared cache, so any write of the user retires them.
+'''
+import heapq
+import threading
+from collections import Counter, OrderedDict
+
+from django.core.cache import cache
+
+from core import changes
+from core.models import Recipe
+
+RANKING_TIMEOUT = 60 * 60
+INCREMENTAL_LIMIT = 1000
+INDEX_CACHE_SIZE = 16
+FEATURES = {
+    'tags': 'tag',
+    'ingredients': 'ingredient',
+}
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+class RecipeIndex:
+    '''Recipes of a user by tag and ingredient, and the reverse.'''
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.cursor = None
+        self.lock = threading.Lock()
+        self.features = {}
+        self.postings = {}
+        self.ingredient_counts = {}
+        self.by_ingredient_count = {}
+
+    def _add(self, recipe_id, features):
+        '''Index a recipe with its set of (kind, id) features.'''
+        self.features[recipe_id] = features
+        for feature in features:
+            self.postings.setdefault(feature, set()).add(recipe_id)
+        count = sum(1 for kind, _ in features if kind == 'ingredient')
+        self.ingredient_counts[recipe_id] = count
+        self.by_ingredient_count.setdefault(count, set()).add(recipe_id)
+
+    def _remove(self, recipe_id):
+        '''Drop a recipe from the index if present.'''
+        features = self.features.pop(recipe_id, None)
+        if features is None:
+            return
+        for feature in features:
+            recipes = self.postings[feature]
+            recipes.discard(recipe_id)
+            if not recipes:
+                del self.postings[feature]
+        count = self.ingredient_counts.pop(recipe_id)
+        recipes = self.by_ingredient_count[count]
+        recipes.discard(recipe_id)
+        if not recipes:
+            del self.by_ingredient_count[count]
+
+    def load(self, recipe_ids=None):
+        '''Re-read recipes from the database, or all of them when None.'''
+        recipes = Recipe.objects.filter(user_id=self.user_id)
+        if recipe_ids is None:
+            self.features, self.postings = {}, {}
+            self.ingredient_counts, self.by_ingredient_count = {}, {}
+        else:
+            recipes = recipes.filter(id__in=recipe_ids)
+            for recipe_id in recipe_ids:
+                self._remove(recipe_id)
+
+        features = {
+            recipe_id: set()
+            for recipe_id in recipes.values_list('id', flat=True)
+        }
+        for relation, target in FEATURES.items():
+            through = Recipe._meta.get_field(relation).remote_field.through
+            rows = through.objects.filter(
+                user_id=self.user_id, recipe__in=recipes,
+            ).values_list('recipe_id', f'{target}_id')
+            for recipe_id, obj_id in rows.iterator():
+                if recipe_id in features:
+                    features[recipe_id].add((target, obj_id))
+        for recipe_id, recipe_features in features.items():
+            self._add(recipe_id, frozenset(recipe_features))
+
+    def refresh(self, cursor):
+        '''Bring the index up to cursor, return True if it changed.'''
+        if self.cursor is not None and cursor <= self.cursor:
+            return False
+        if (self.cursor is None
+                or self.cursor < changes.horizon(self.user_id)):
+            self.load()
+        else:
+            _, has_more, actions = changes.latest(
+                self.user_id, self.cursor, INCREMENTAL_LIMIT)
+            if has_more:
+                self.load()
+            else:
+                self.load(list(actions.get(Recipe._meta.model_name, {})))
+        # Rows committed after the cursor was read are re-read next time.
+        self.cursor = cursor
+        return True
+
+    def similar(self, recipe_id, limit):
+        '''Return [(score, recipe_id)] of the recipes most like one.'''
+        features = self.features.get(recipe_id, ())
+        shared = Counter()
+        for feature in features:
+            shared.update(self.postings[feature])
+        shared.pop(recipe_id, None)
+        return heapq.nlargest(limit, (
+            (count / (len(features) + len(self.features[other]) - count),
+             other)
+            for other, count in shared.items()
+        ))
+
+    def cookable(self, ingredient_ids, max_missing, limit):
+        '''Return [(missing, matched, recipe_id)] fewest missing first.
+
+        Ties are broken by most matched, then newest recipe.
+        '''
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(
+                self.postings.get(('ingredient', ingredient_id), ()))
+        ranked = []
+        for recipe_id, count in matched.items():
+            missing = self.ingredient_counts[recipe_id] - count
+            if max_missing is None or missing <= max_missing:
+                ranked.append((missing, -count, -recipe_id))
+
+        # Recipes matching nothing miss all their ingredients. Smaller
+        # ones rank first, so stop after `limit` of them.
+        unmatched = 0
+        for count in sorted(self.by_ingredient_count):
+            if unmatched >= limit or (
+                    max_missing is not None and count > max_missing):
+                break
+            for recipe_id in self.by_ingredient_count[count]:
+                if recipe_id not in matched:
+                    ranked.append((count, 0, -recipe_id))
+                    unmatched += 1
+        return [
+            (missing, -count, -recipe_id)
+            for missing, count, recipe_id in heapq.nsmallest(limit, ranked)
+        ]
+
+
+def search(user_id, query, cursor=None):
+    '''Return query(index) run on the user's index caught up to cursor.'''
+    if cursor is None:
+        cursor = changes.current_cursor(user_id)
+    with _indexes_lock:
+        index = _indexes.pop(user_id, None) or RecipeIndex(user_id)
+        _indexes[user_id] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    with index.lock:
+        index.refresh(cursor)
+        return query(index)
+
+
+def is_indexed(user_id):
+    '''Return True if this process holds an index of the user.'''
+    return user_id in _indexes
+
+
+def clear_indexes():
+    '''Drop the indexes held by this process.'''
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def similar_recipes(user_id, recipe_id, limit):
+    '''Return [(score, recipe_id)] of the user's recipes most like one.'''
+    cursor = changes.current_cursor(user_id)
+    return cache.get_or_set(
+        f'similarity:ranking:{user_id}:{recipe_id}:{limit}:{cursor}',
+        lambda: search(
+            user_id, lambda index: index.similar(recipe_id, limit), cursor),
+        RANKING_TIMEOUT,
+    )
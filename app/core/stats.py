@@ -0,0 +1,222 @@
+'''
+Rollups of each user's recipes served by the stats endpoint.
+
+Totals, a price histogram and per tag and ingredient recipe counts are
+maintained incrementally: `core.hooks` calls `apply` with the recipes a
+write changed, under the user's lock. What every recipe last added to
+the rollups is kept in RecipeStatsSource, so the delta of a change is
+the recipe's new values minus its stored ones, and a deleted recipe
+subtracts its stored values. Reading stats never scans the library.
+
+Writes that bypass the hooks (e.g. raw SQL or data migrations) leave
+the rollups stale until `rebuild` (the `rebuild_recipe_stats` command) runs.
+'''
+import bisect
+from collections import Counter
+from decimal import Decimal
+
+from core import changes, sharding
+from core.models import (
+    Ingredient,
+    Recipe,
+    RecipeStats,
+    RecipeStatsSource,
+    RecipeStatsUsage,
+    Tag,
+)
+
+# Upper bounds (exclusive) of the price histogram buckets; the last
+# bucket holds everything above.
+PRICE_BUCKETS = [Decimal(5), Decimal(10), Decimal(20), Decimal(50)]
+TOP_LIMIT = 10
+USAGE_FIELDS = [
+    ('tag_ids', 'tags', Tag),
+    ('ingredient_ids', 'ingredients', Ingredient),
+]
+
+
+def price_bucket(price):
+    '''Return the histogram bucket index of a price.'''
+    return bisect.bisect_right(PRICE_BUCKETS, price)
+
+
+def build_sources(user_id, recipe_ids):
+    '''Return unsaved sources of the user's recipes among recipe_ids.'''
+    sources = {
+        row['id']: RecipeStatsSource(
+            recipe_id=row['id'],
+            user_id=user_id,
+            time_minutes=row['time_minutes'],
+            price=row['price'],
+        )
+        for row in Recipe.objects.filter(
+            user_id=user_id, id__in=recipe_ids,
+        ).values('id', 'time_minutes', 'price')
+    }
+    for field, relation, model in USAGE_FIELDS:
+        through = Recipe._meta.get_field(relation).remote_field.through
+        rows = through.objects.filter(
+            user_id=user_id,
+            recipe_id__in=list(sources),
+        ).order_by('pk').values_list(
+            'recipe_id', f'{model._meta.model_name}_id')
+        for recipe_id, obj_id in rows:
+            getattr(sources[recipe_id], field).append(obj_id)
+    return list(sources.values())
+
+
+class Delta:
+    '''Change to a user's rollups.'''
+
+    def __init__(self):
+        self.recipe_count = 0
+        self.total_time_minutes = 0
+        self.total_price = Decimal(0)
+        self.price_buckets = Counter()
+        self.usage = Counter()
+
+    def add(self, source, sign):
+        '''Add (sign 1) or subtract (sign -1) a recipe's values.'''
+        self.recipe_count += sign
+        self.total_time_minutes += sign * source.time_minutes
+        self.total_price += sign * source.price
+        self.price_buckets[price_bucket(source.price)] += sign
+        for field, _, model in USAGE_FIELDS:
+            kind = model._meta.model_name
+            for obj_id in getattr(source, field):
+                self.usage[kind, obj_id] += sign
+
+
+def _apply_usage(user_id, usage):
+    '''Add recipe counts per (kind, object id), dropping unused ones.'''
+    usage = {key: count for key, count in usage.items() if count}
+    if not usage:
+        return
+    rows = {
+        (row.kind, row.object_id): row
+        for row in RecipeStatsUsage.objects.filter(
+            user_id=user_id,
+            object_id__in={obj_id for _, obj_id in usage},
+        )
+    }
+    updated, created, emptied = [], [], []
+    for (kind, obj_id), count in usage.items():
+        row = rows.get((kind, obj_id))
+        if row is None:
+            if count > 0:
+                created.append(RecipeStatsUsage(
+                    user_id=user_id, kind=kind, object_id=obj_id,
+                    recipe_count=count,
+                ))
+            continue
+        row.recipe_count += count
+        if row.recipe_count > 0:
+            updated.append(row)
+        else:
+            emptied.append(row.id)
+    RecipeStatsUsage.objects.bulk_update(updated, ['recipe_count'])
+    RecipeStatsUsage.objects.bulk_create(created)
+    RecipeStatsUsage.objects.filter(id__in=emptied).delete()
+
+
+def apply(user_id, recipe_ids):
+    '''Update the user's rollups for recipes changed or deleted.
+
+    Must run under the user's lock (see `core.changes.lock_user`).
+    '''
+    recipe_ids = list(recipe_ids)
+    old = RecipeStatsSource.objects.filter(recipe_id__in=recipe_ids)
+    new = build_sources(user_id, recipe_ids)
+    delta = Delta()
+    for source in old:
+        delta.add(source, -1)
+    for source in new:
+        delta.add(source, 1)
+    old.delete()
+    RecipeStatsSource.objects.bulk_create(new)
+
+    stats, _ = RecipeStats.objects.get_or_create(user_id=user_id)
+    stats.recipe_count += delta.recipe_count
+    stats.total_time_minutes += delta.total_time_minutes
+    stats.total_price += delta.total_price
+    buckets = stats.price_buckets + [0] * (
+        len(PRICE_BUCKETS) + 1 - len(stats.price_buckets))
+    for bucket, count in delta.price_buckets.items():
+        buckets[bucket] += count
+    stats.price_buckets = buckets
+    stats.save()
+    _apply_usage(user_id, delta.usage)
+
+
+def _recipe_id_batches(user_id, batch_size):
+    '''Yield lists of a user's recipe ids in primary key order.'''
+    last_id = 0
+    while True:
+        batch = list(Recipe.objects.filter(
+            user_id=user_id, id__gt=last_id,
+        ).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def rebuild(user_id=None, batch_size=1000):
+    '''Rebuild the rollups of the current shard's users, or one user.
+
+    Returns the number of users rebuilt.
+    '''
+    if user_id is None:
+        user_ids = set(Recipe.objects.values_list('user_id', flat=True))
+        user_ids |= set(RecipeStats.objects.values_list('user_id', flat=True))
+    else:
+        user_ids = {user_id}
+
+    for user_id in sorted(user_ids):
+        with sharding.atomic():
+            changes.lock_user(user_id)
+            RecipeStats.objects.filter(user_id=user_id).delete()
+            RecipeStatsUsage.objects.filter(user_id=user_id).delete()
+            RecipeStatsSource.objects.filter(user_id=user_id).delete()
+            for batch in _recipe_id_batches(user_id, batch_size):
+                apply(user_id, batch)
+    return len(user_ids)
+
+
+def _top(user_id, model):
+    '''Return the tags or ingredients used by most recipes.'''
+    usage = list(RecipeStatsUsage.objects.filter(
+        user_id=user_id, kind=model._meta.model_name,
+    ).order_by('-recipe_count', 'object_id').values_list(
+        'object_id', 'recipe_count')[:TOP_LIMIT])
+    names = dict(model.objects.filter(
+        id__in=[obj_id for obj_id, _ in usage]).values_list('id', 'name'))
+    return [
+        {'id': obj_id, 'name': names[obj_id], 'recipe_count': count}
+        for obj_id, count in usage if obj_id in names
+    ]
+
+
+def get_stats(user_id):
+    '''Return the stats of a user's recipes from the rollups.'''
+    stats = RecipeStats.objects.filter(user_id=user_id).first()
+    if stats is None:
+        stats = RecipeStats(user_id=user_id)
+    count = stats.recipe_count
+    buckets = stats.price_buckets + [0] * (
+        len(PRICE_BUCKETS) + 1 - len(stats.price_buckets))
+    bounds = [None] + PRICE_BUCKETS + [None]
+    return {
+        'recipe_count': count,
+        'average_time_minutes': (
+            round(stats.total_time_minutes / count, 1) if count else None),
+        'average_price': (
+            (stats.total_price / count).quantize(Decimal('.01'))
+            if count else None),
+        'price_distribution': [
+            {'min': bounds[i], 'max': bounds[i + 1], 'count': buckets[i]}
+            for i in range(len(buckets))
+        ],
+        'top_tags': _top(user_id, Tag),
+        'top_ingredients': _top(user_id, Ingredient),
+    }
@@ -0,0 +1,88 @@
+'''
+Static and media files storage.
+'''
+import gzip
+import os
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core import signing
+from django.core.files.storage import FileSystemStorage
+from django.utils.crypto import constant_time_compare
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.map', '.json', '.svg', '.html', '.txt', '.xml',
+    '.eot', '.otf', '.ttf',
+}
+COMPRESS_MIN_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    '''Fingerprinted static files with gzipped copies for the proxy.
+
+    `collectstatic` stores each file under a name containing a hash of
+    its content, so the proxy can cache them forever, and writes a `.gz`
+    next to text files for nginx's gzip_static. Until collectstatic has
+    written a manifest (development, tests), unhashed names are used.
+    '''
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get('dry_run'):
+            return
+        for name in set(self.hashed_files.values()):
+            if os.path.splitext(name)[1] in COMPRESSIBLE_EXTENSIONS:
+                self.compress(name)
+
+    def compress(self, name):
+        '''Write a gzipped copy of a file if that makes it smaller.'''
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            content = source.read()
+        if len(content) < COMPRESS_MIN_SIZE:
+            return
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content):
+            with open(f'{path}.gz', 'wb') as target:
+                target.write(compressed)
+
+
+class SignedMediaStorage(FileSystemStorage):
+    '''Media files whose URLs carry an expiring signature.
+
+    Recipe images are only served to their owner (see RecipeImageView),
+    which a browser loading an `<img src>` cannot prove with a token.
+    URLs handed out by the API are signed instead, letting anyone with
+    one fetch the file until it expires. Expiry is rounded up to a
+    multiple of MEDIA_URL_MAX_AGE, at least that far ahead, so a file's
+    URL, and the browser's cached copy, stay the same for a while.
+    '''
+    salt = 'core.storage.SignedMediaStorage'
+
+    def _signature(self, name, expires):
+        return signing.Signer(salt=self.salt).signature(f'{name}:{expires}')
+
+    def url(self, name):
+        max_age = settings.MEDIA_URL_MAX_AGE
+        expires = (int(time.time()) // max_age + 2) * max_age
+        query = urlencode({
+            'expires': expires,
+            'signature': self._signature(name, expires),
+        })
+        return f'{super().url(name)}?{query}'
+
+    def is_signed(self, name, params):
+        '''Return whether params hold an unexpired signature of name.'''
+        try:
+            expires = int(params.get('expires', ''))
+        except ValueError:
+            return False
+        return expires > time.time() and constant_time_compare(
+            params.get('signature', ''), self._signature(name, expires))
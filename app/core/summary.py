@@ -0,0 +1,151 @@
+'''
+Maintenance of the denormalized recipe summary read model.
+'''
+from collections import defaultdict
+
+from django.conf import settings
+
+from core import sharding
+from core.models import (
+    Recipe,
+    RecipeSummary,
+)
+
+SUMMARY_COLUMNS = ['id', 'user_id', 'title', 'time_minutes', 'price', 'link']
+SUMMARY_RELATIONS = {
+    'tags': 'tag',
+    'ingredients': 'ingredient',
+}
+SUMMARY_COMPARE_FIELDS = [
+    'user_id', 'title', 'time_minutes', 'price', 'link',
+    'tags', 'ingredients', 'tag_ids', 'ingredient_ids',
+]
+
+
+def is_enabled():
+    '''Return True when write paths should maintain summaries.'''
+    return settings.RECIPE_SUMMARY_ENABLED
+
+
+def _related(relation, recipe_ids, user_ids):
+    '''Return {recipe_id: [{id, name}, ...]} for a recipe relation.'''
+    through = Recipe._meta.get_field(relation).remote_field.through
+    target = SUMMARY_RELATIONS[relation]
+    # The user filter lets Postgres skip other users' partitions.
+    rows = through.objects.filter(
+        user_id__in=user_ids,
+        recipe_id__in=recipe_ids,
+    ).order_by('pk').values_list(
+        'recipe_id', f'{target}_id', f'{target}__name',
+    )
+    related = defaultdict(list)
+    for recipe_id, obj_id, name in rows:
+        related[recipe_id].append({'id': obj_id, 'name': name})
+    return related
+
+
+def build_summaries(recipe_ids):
+    '''Return unsaved summaries computed from the source tables.'''
+    recipe_ids = list(recipe_ids)
+    rows = list(Recipe.objects.filter(
+        id__in=recipe_ids,
+    ).values(*SUMMARY_COLUMNS))
+    user_ids = {row['user_id'] for row in rows}
+    tags = _related('tags', recipe_ids, user_ids)
+    ingredients = _related('ingredients', recipe_ids, user_ids)
+
+    summaries = []
+    for row in rows:
+        recipe_id = row.pop('id')
+        recipe_tags = tags.get(recipe_id, [])
+        recipe_ingredients = ingredients.get(recipe_id, [])
+        summaries.append(RecipeSummary(
+            recipe_id=recipe_id,
+            tags=recipe_tags,
+            ingredients=recipe_ingredients,
+            tag_ids=[tag['id'] for tag in recipe_tags],
+            ingredient_ids=[item['id'] for item in recipe_ingredients],
+            **row,
+        ))
+    return summaries
+
+
+def refresh_recipe_summaries(recipe_ids, force=False):
+    '''Recompute summaries for recipes, dropping those of deleted ones.'''
+    if not (force or is_enabled()):
+        return
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    with sharding.atomic():
+        RecipeSummary.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSummary.objects.bulk_create(build_summaries(recipe_ids))
+
+
+def recipe_ids_for(relation, user, obj_ids):
+    '''Return ids of the user's recipes linked to tags or ingredients.'''
+    through = Recipe._meta.get_field(relation).remote_field.through
+    target = SUMMARY_RELATIONS[relation]
+    return set(through.objects.filter(
+        user=user,
+        **{f'{target}_id__in': obj_ids},
+    ).values_list('recipe_id', flat=True))
+
+
+def _recipe_id_batches(queryset, batch_size):
+    '''Yield lists of recipe ids in primary key order.'''
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(
+            id__gt=last_id,
+        ).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def rebuild(user_id=None, batch_size=1000):
+    '''Rebuild the current shard's summaries, or those of one user.
+
+    Returns the number of summaries rebuilt.
+    '''
+    recipes = Recipe.objects.all()
+    summaries = RecipeSummary.objects.all()
+    if user_id is not None:
+        recipes = recipes.filter(user_id=user_id)
+        summaries = summaries.filter(user_id=user_id)
+
+    summaries.exclude(recipe__in=recipes).delete()
+    count = 0
+    for batch in _recipe_id_batches(recipes, batch_size):
+        refresh_recipe_summaries(batch, force=True)
+        count += len(batch)
+    return count
+
+
+def find_inconsistencies(user_id=None, batch_size=1000):
+    '''Yield (recipe_id, problem) pairs where summaries disagree.'''
+    recipes = Recipe.objects.all()
+    summaries = RecipeSummary.objects.all()
+    if user_id is not None:
+        recipes = recipes.filter(user_id=user_id)
+        summaries = summaries.filter(user_id=user_id)
+
+    orphans = summaries.exclude(
+        recipe__in=recipes,
+    ).values_list('recipe_id', flat=True)
+    for recipe_id in orphans:
+        yield recipe_id, 'orphaned'
+
+    for batch in _recipe_id_batches(recipes, batch_size):
+        stored = RecipeSummary.objects.in_bulk(batch)
+        for expected in build_summaries(batch):
+            actual = stored.get(expected.recipe_id)
+            if actual is None:
+                yield expected.recipe_id, 'missing'
+                continue
+            for field in SUMMARY_COMPARE_FIELDS:
+                if getattr(actual, field) != getattr(expected, field):
+                    yield expected.recipe_id, f'stale {field}'
+                    break
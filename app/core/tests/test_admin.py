@@ -1,10 +1,30 @@
 '''Test for Django admin modifications.'''
+from decimal import Decimal
+from unittest.mock import patch
 
-from django.test import TestCase
+from django.contrib import admin
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import Client
 
+from core import deletion, hooks
+from core.admin import (
+    RecipeAdmin,
+    RecipeIngredientInline,
+    RecipeTagInline,
+    estimate_count,
+)
+from core.models import (
+    Job,
+    Recipe,
+    RecipeStats,
+    RecipeStatsUsage,
+    RecipeSummary,
+    Tag,
+)
+
 
 class AdminSiteTests(TestCase):
     '''Tests for Django admin'''
@@ -31,3 +51,176 @@ class AdminSiteTests(TestCase):
 
         self.assertContains(res, self.user.name)
         self.assertContains(res, self.user.email)
+
+    def test_delete_users_in_background(self):
+        '''Test the admin action queues the deletion of users.'''
+        url = reverse('admin:core_user_changelist')
+        res = self.client.post(url, {
+            'action': 'delete_in_background',
+            '_selected_action': [self.user.id],
+        })
+
+        self.assertEqual(res.status_code, 302)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(Job.objects.filter(
+            name=deletion.delete_user.job_name,
+            kwargs={'user_id': self.user.id},
+        ).exists())
+
+    def create_recipes(self, count):
+        '''Create recipes of the user, oldest first.'''
+        return [
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5,
+                price=Decimal('1.00'),
+            )
+            for i in range(count)
+        ]
+
+    def test_recipes_paged_by_id(self):
+        '''Test the recipe list pages forward from the newest recipe.'''
+        recipes = self.create_recipes(3)
+        url = reverse('admin:core_recipe_changelist')
+
+        with patch.object(RecipeAdmin, 'list_per_page', 2):
+            res = self.client.get(url)
+            self.assertContains(res, 'Recipe 2')
+            self.assertContains(res, 'Recipe 1')
+            self.assertNotContains(res, 'Recipe 0')
+            self.assertContains(res, f'?after={recipes[1].id}')
+
+            res = self.client.get(url, {'after': recipes[1].id})
+            self.assertContains(res, 'Recipe 0')
+            self.assertNotContains(res, 'Recipe 1')
+            self.assertNotContains(res, '?after=')
+
+    def test_estimate_count(self):
+        '''Test counts are estimated from table statistics.'''
+        self.create_recipes(3)
+        recipes = Recipe.objects.all()
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_recipe')
+
+        self.assertEqual(estimate_count(recipes), 3)
+        self.assertIsInstance(
+            estimate_count(recipes.filter(title='Recipe 1')), int)
+
+    def test_recipe_change_page(self):
+        '''Test a recipe is edited with its tags inline.'''
+        recipe = self.create_recipes(1)[0]
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Dinner'))
+        url = reverse('admin:core_recipe_change', args=[recipe.id])
+
+        res = self.client.get(url)
+
+        self.assertContains(res, 'Dinner')
+        self.assertContains(res, 'vForeignKeyRawIdAdminField')
+
+    def test_recipe_tags_of_recipe_user_only(self):
+        '''Test a recipe can't be given a tag of another user inline.'''
+        recipe = self.create_recipes(1)[0]
+        other_user = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123')
+        request = RequestFactory().get('/')
+        request.user = self.admin_user
+        formset_class = RecipeTagInline(Recipe, admin.site).get_formset(
+            request, recipe)
+        prefix = formset_class.get_default_prefix()
+
+        for user, valid in [(self.user, True), (other_user, False)]:
+            tag = Tag.objects.create(user=user, name='Dinner')
+            formset = formset_class({
+                f'{prefix}-TOTAL_FORMS': '1',
+                f'{prefix}-INITIAL_FORMS': '0',
+                f'{prefix}-0-tag': tag.id,
+            }, instance=recipe, prefix=prefix)
+            with self.subTest(user=user.email):
+                self.assertEqual(formset.is_valid(), valid)
+
+    @override_settings(RECIPE_SUMMARY_ENABLED=True)
+    def test_recipe_edits_run_hooks(self):
+        '''Test editing and deleting a recipe refreshes derived data.'''
+        recipe = self.create_recipes(1)[0]
+        # The admin form requires an image, keeping the current one.
+        recipe.image = 'uploads/recipe/example.jpg'
+        recipe.save()
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        hooks.recipes_saved(self.user.id, [recipe.id])
+        request = RequestFactory().get('/')
+        request.user = self.admin_user
+        data = {
+            'user': self.user.id,
+            'title': recipe.title,
+            'time_minutes': 10,
+            'price': '2.00',
+            'link': '',
+            'description': '',
+        }
+        for inline, field, value in [
+            (RecipeTagInline, 'tag', tag.id),
+            (RecipeIngredientInline, 'ingredient', ''),
+        ]:
+            prefix = inline(Recipe, admin.site).get_formset(
+                request, recipe).get_default_prefix()
+            data.update({
+                f'{prefix}-TOTAL_FORMS': '1',
+                f'{prefix}-INITIAL_FORMS': '0',
+                f'{prefix}-0-{field}': value,
+            })
+
+        res = self.client.post(
+            reverse('admin:core_recipe_change', args=[recipe.id]), data)
+
+        self.assertEqual(res.status_code, 302)
+        summary = RecipeSummary.objects.get(recipe=recipe)
+        self.assertEqual(summary.tag_ids, [tag.id])
+        self.assertEqual(summary.time_minutes, 10)
+        stats = RecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.total_time_minutes, 10)
+        self.assertEqual(RecipeStatsUsage.objects.get(
+            user=self.user, kind='tag').object_id, tag.id)
+
+        res = self.client.post(reverse('admin:core_recipe_changelist'), {
+            'action': 'delete_selected',
+            '_selected_action': [recipe.id],
+            'post': 'yes',
+        })
+
+        self.assertEqual(res.status_code, 302)
+        self.assertFalse(Recipe.objects.exists())
+        stats.refresh_from_db()
+        self.assertEqual(stats.recipe_count, 0)
+        self.assertFalse(RecipeStatsUsage.objects.filter(
+            user=self.user, recipe_count__gt=0).exists())
+
+    @override_settings(RECIPE_SUMMARY_ENABLED=True)
+    def test_tag_edits_run_hooks(self):
+        '''Test renaming and deleting a tag refreshes derived data.'''
+        recipe = self.create_recipes(1)[0]
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        recipe.tags.add(tag)
+        hooks.recipes_saved(self.user.id, [recipe.id])
+
+        res = self.client.post(
+            reverse('admin:core_tag_change', args=[tag.id]),
+            {'name': 'Supper', 'user': self.user.id},
+        )
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(
+            RecipeSummary.objects.get(recipe=recipe).tags,
+            [{'id': tag.id, 'name': 'Supper'}],
+        )
+
+        res = self.client.post(reverse('admin:core_tag_changelist'), {
+            'action': 'delete_selected',
+            '_selected_action': [tag.id],
+            'post': 'yes',
+        })
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(RecipeSummary.objects.get(recipe=recipe).tags, [])
+        self.assertFalse(RecipeStatsUsage.objects.filter(
+            user=self.user, kind='tag', recipe_count__gt=0).exists())
@@ -0,0 +1,130 @@
+'''
+Tests for the cache backends.
+'''
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from core.cache import Entry, SharedFileCache
+
+
+class SharedFileCacheTests(SimpleTestCase):
+    '''Test the file-based shared cache.'''
+
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = SharedFileCache(self.dir.name, {})
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_concurrent_incr_is_atomic(self):
+        '''Test increments from concurrent callers are not lost.'''
+        self.cache.add('counter', 0, None)
+
+        def increment():
+            for _ in range(25):
+                SharedFileCache(self.dir.name, {}).incr('counter')
+
+        threads = [threading.Thread(target=increment) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.cache.get('counter'), 100)
+
+    def test_incr_keeps_expiry(self):
+        '''Test incrementing a key does not extend its lifetime.'''
+        self.cache.set('counter', 1, 60)
+        self.cache.incr('counter', 2)
+
+        _, expiry = self.cache._get_with_expiry('counter', None)
+
+        self.assertEqual(self.cache.get('counter'), 3)
+        self.assertLessEqual(expiry, time.time() + 60)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+
+class TieredCacheTests(SimpleTestCase):
+    '''Test the in-process cache in front of the shared cache.'''
+
+    def setUp(self) -> None:
+        self.cache = caches['default']
+        self.cache.clear()
+        self.cache.reset_stats()
+
+    def test_local_hit_skips_shared_cache(self):
+        '''Test a recently set value is served from the process.'''
+        self.cache.set('key', {'a': 1})
+
+        with patch.object(self.cache.shared, 'get') as patched_get:
+            value = self.cache.get('key')
+
+        self.assertEqual(value, {'a': 1})
+        patched_get.assert_not_called()
+
+    def test_shared_value_seen_after_local_expiry(self):
+        '''Test values set by other workers are read from shared.'''
+        self.cache.set('key', 'old')
+        self.cache.shared.set('key', 'new')
+
+        with patch('core.cache.time.monotonic',
+                   return_value=time.monotonic() + 60):
+            value = self.cache.get('key')
+
+        self.assertEqual(value, 'new')
+
+    def test_get_or_set_coalesces_concurrent_misses(self):
+        '''Test concurrent misses compute the value once.'''
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return 42
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    self.cache.get_or_set('answer', compute, 60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [42] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_get_or_set_recomputes_early(self):
+        '''Test values close to expiry, relative to cost, are refreshed.'''
+        self.cache.set('slow', Entry('stale', time.time() + 1, 100), 60)
+        self.cache.set('cheap', Entry('fresh', time.time() + 60, 0), 60)
+
+        self.assertEqual(self.cache.get_or_set('slow', 'new', 60), 'new')
+        self.assertEqual(self.cache.get_or_set('cheap', 'new', 60), 'fresh')
+
+    def test_stats_command(self):
+        '''Test hits and misses are counted and reported.'''
+        self.cache.get('missing')
+        self.cache.set('key', 1)
+        self.cache.get('key')
+        out = StringIO()
+
+        call_command('cache_stats', stdout=out)
+
+        self.assertIn(
+            'default: 2 lookups, hit ratio 50.0% (local 1, shared 0, '
+            'misses 1, recomputes 0)',
+            out.getvalue(),
+        )
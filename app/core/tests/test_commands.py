@@ -3,34 +3,209 @@ Test custom Django management commands.
 
 '''
 
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
+from django.conf import settings
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 
+from core.management.commands.import_profile import parse_importtime
 
-@patch('core.management.commands.wait_for_db.Command.check')
+
+@patch('core.probes.probe_database')
 class CommandTests(SimpleTestCase):
     ''' Tests commands.'''
 
-    def test_wait_for_db_ready(self, patched_check):
+    def test_wait_for_db_ready(self, patched_probe):
         ''' Test waiting for database to be ready to connect.'''
-        patched_check.return_value = True
+        patched_probe.return_value = None
 
         call_command('wait_for_db')
 
-        patched_check.assert_called_once_with(databases=['default'])
+        patched_probe.assert_called_once_with('default')
 
     @patch('time.sleep')
-    def test_wait_for_db_delay(self, patched_sleep, patched_check):
+    def test_wait_for_db_delay(self, patched_sleep, patched_probe):
         ''' Test waiting for database when getting OperationalError.'''
-        patched_check.side_effect = [Psycopg2Error] * 2 + \
-            [OperationalError] * 3 + [True]
+        patched_probe.side_effect = [Psycopg2Error] * 2 + \
+            [OperationalError] * 3 + [None]
 
         call_command('wait_for_db')
 
-        self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
+        self.assertEqual(patched_probe.call_count, 6)
+        patched_probe.assert_called_with('default')
+        delays = [call.args[0] for call in patched_sleep.call_args_list]
+        self.assertLess(delays[0], 0.01)
+        self.assertGreater(delays[-1], delays[0])
+
+    @patch('time.monotonic')
+    @patch('time.sleep')
+    def test_wait_for_db_timeout(
+            self, patched_sleep, patched_monotonic, patched_probe):
+        ''' Test giving up when the database stays unavailable.'''
+        patched_probe.side_effect = OperationalError
+        patched_monotonic.side_effect = [0, 1, 2, 3, 4, 5]
+
+        with self.assertRaises(CommandError):
+            call_command('wait_for_db', timeout=3)
+
+        self.assertEqual(patched_probe.call_count, 3)
+
+    @patch('core.probes.probe_storage')
+    @patch('core.probes.probe_cache')
+    def test_wait_for_caches_and_storage(
+            self, patched_cache, patched_storage, patched_probe):
+        ''' Test caches and storage are probed when requested.'''
+        patched_cache.side_effect = [OSError] + [None] * len(settings.CACHES)
+
+        with patch('time.sleep'):
+            call_command('wait_for_db', caches=True, storage=True)
+
+        patched_probe.assert_called_once_with('default')
+        self.assertEqual(patched_cache.call_count, len(settings.CACHES) + 1)
+        patched_storage.assert_called_once_with()
+
+
+@patch('core.management.commands.bootstrap.call_command')
+class BootstrapCommandTests(TestCase):
+    ''' Tests the bootstrap command.'''
+    databases = '__all__'
+
+    def setUp(self) -> None:
+        self.static_root = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            STATIC_ROOT=self.static_root.name,
+            SCHEMA_CACHE_DIR=self.static_root.name,
+        )
+        self.settings.enable()
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.static_root.cleanup()
+
+    def called_commands(self, patched_call):
+        '''Return the names of the commands called.'''
+        return [call.args[0] for call in patched_call.call_args_list]
+
+    def test_bootstrap_runs_phases(self, patched_call):
+        ''' Test bootstrap waits, collects static and reports timing.'''
+        out = StringIO()
+
+        call_command('bootstrap', stdout=out)
+
+        self.assertEqual(
+            sorted(self.called_commands(patched_call)),
+            ['collectstatic', 'wait_for_db'],
+        )
+        self.assertIn('migrate: ', out.getvalue())
+        self.assertIn('up to date, skipped', out.getvalue())
+
+    @patch('core.management.commands.bootstrap.MigrationExecutor')
+    def test_bootstrap_migrates_every_database(
+            self, patched_executor, patched_call):
+        ''' Test pending migrations are applied to every database.'''
+        patched_executor.return_value.migration_plan.return_value = ['0001']
+        out = StringIO()
+
+        call_command('bootstrap', skip_collectstatic=True, stdout=out)
+
+        self.assertEqual(
+            [call.kwargs['database'] for call in patched_call.call_args_list
+             if call.args[0] == 'migrate'],
+            list(settings.DATABASES),
+        )
+        self.assertIn(
+            f'applied {len(settings.DATABASES)} migrations', out.getvalue())
+
+    def test_bootstrap_skips_unchanged_static(self, patched_call):
+        ''' Test collectstatic is skipped when sources are unchanged.'''
+        call_command('bootstrap', skip_migrate=True, stdout=StringIO())
+        call_command('bootstrap', skip_migrate=True, stdout=StringIO())
+        call_command(
+            'bootstrap', skip_migrate=True, force_collectstatic=True,
+            stdout=StringIO())
+
+        self.assertEqual(
+            self.called_commands(patched_call).count('collectstatic'), 2)
+
+
+class ImportProfileCommandTests(SimpleTestCase):
+    ''' Tests the import_profile command.'''
+
+    def test_parse_importtime(self):
+        ''' Test -X importtime lines are parsed, headers skipped.'''
+        lines = [
+            'import time: self [us] | cumulative | imported package',
+            'import time:       120 |        120 |   django.utils',
+            'import time:       300 |        420 | django',
+            'unrelated stderr output',
+        ]
+
+        self.assertEqual(list(parse_importtime(lines)), [
+            ('django.utils', 120, 120),
+            ('django', 300, 420),
+        ])
+
+    def test_import_profile_reports_modules(self):
+        ''' Test the WSGI module's imports are profiled and reported.'''
+        out = StringIO()
+
+        call_command('import_profile', limit=3, stdout=out)
+
+        self.assertIn('app.wsgi', out.getvalue())
+        self.assertIn('modules imported in', out.getvalue())
+
+
+@patch('core.server.cpu_count', return_value=4)
+class UwsgiConfigCommandTests(SimpleTestCase):
+    ''' Tests the uwsgi_config command.'''
+
+    def options(self, out):
+        '''Return {option: value} from a generated ini.'''
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], '[uwsgi]')
+        return dict(line.split(' = ', 1) for line in lines[1:])
+
+    def test_sized_from_cpus(self, patched_cpus):
+        ''' Test workers and cheaper spawning follow the CPU count.'''
+        out = StringIO()
+
+        with patch.dict('os.environ', {'WSGI_WORKERS': ''}):
+            call_command('uwsgi_config', stdout=out)
+
+        options = self.options(out)
+        self.assertEqual(options['workers'], '8')
+        self.assertEqual(options['cheaper'], '4')
+        self.assertNotIn('threads', options)
+        self.assertEqual(options['module'], 'app.wsgi')
+
+    def test_environment_overrides(self, patched_cpus):
+        ''' Test WSGI_* variables override the defaults.'''
+        out = StringIO()
+        env = {
+            'WSGI_WORKERS': '3',
+            'WSGI_THREADS': '4',
+            'WSGI_CHEAPER': '0',
+            'WSGI_RELOAD_ON_RSS': '200',
+        }
+
+        with patch.dict('os.environ', env):
+            call_command('uwsgi_config', stdout=out)
+
+        options = self.options(out)
+        self.assertEqual(options['workers'], '3')
+        self.assertEqual(options['threads'], '4')
+        self.assertEqual(options['reload-on-rss'], '200')
+        self.assertNotIn('cheaper', options)
+
+    def test_benchmark_requires_uwsgi(self, patched_cpus):
+        ''' Test the benchmark fails clearly without uwsgi.'''
+        with patch('shutil.which', return_value=None):
+            with self.assertRaises(CommandError):
+                call_command('benchmark_server')
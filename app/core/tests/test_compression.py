@@ -0,0 +1,78 @@
+'''
+Tests for response compression and static files storage.
+'''
+import gzip
+import os
+import tempfile
+
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.middleware import CompressionMiddleware
+from core.storage import CompressedManifestStaticFilesStorage
+
+
+@override_settings(GZIP_MIN_LENGTH=1000)
+class CompressionMiddlewareTests(SimpleTestCase):
+    '''Test text responses are compressed above a threshold.'''
+
+    def process(self, response):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_large_json_compressed(self):
+        '''Test JSON responses over the threshold are gzipped.'''
+        data = [{'id': i, 'title': 'Sample recipe'} for i in range(100)]
+
+        res = self.process(JsonResponse(data, safe=False))
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content),
+                         JsonResponse(data, safe=False).content)
+
+    def test_small_json_not_compressed(self):
+        '''Test responses under the threshold are sent as is.'''
+        res = self.process(JsonResponse({'id': 1}))
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_images_not_compressed(self):
+        '''Test already compressed media types are left alone.'''
+        res = self.process(
+            HttpResponse(b'\xff' * 2000, content_type='image/jpeg'))
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+
+class StaticStorageTests(SimpleTestCase):
+    '''Test fingerprinted and precompressed static files.'''
+
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(STATIC_ROOT=self.dir.name)
+        self.settings.enable()
+        with open(os.path.join(self.dir.name, 'site.css'), 'w') as css:
+            css.write('body { color: black; }\n' * 50)
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.dir.cleanup()
+
+    def test_unhashed_names_without_manifest(self):
+        '''Test URLs fall back to plain names before collectstatic.'''
+        storage = CompressedManifestStaticFilesStorage()
+
+        self.assertEqual(storage.url('site.css'), '/static/static/site.css')
+
+    def test_post_process_hashes_and_compresses(self):
+        '''Test collected files get hashed names and gzipped copies.'''
+        storage = CompressedManifestStaticFilesStorage()
+        list(storage.post_process({'site.css': (storage, 'site.css')}))
+
+        hashed = CompressedManifestStaticFilesStorage().url('site.css')
+        name = os.path.basename(hashed)
+        path = os.path.join(self.dir.name, name)
+
+        self.assertRegex(name, r'^site\.[0-9a-f]{12}\.css$')
+        with open(path, 'rb') as source, open(f'{path}.gz', 'rb') as packed:
+            self.assertEqual(gzip.decompress(packed.read()), source.read())
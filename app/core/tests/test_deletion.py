@@ -0,0 +1,95 @@
+'''
+Tests for deleting users in the background.
+'''
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+
+from core import deletion, hooks, jobs
+from core.models import (
+    Change,
+    Ingredient,
+    Job,
+    Recipe,
+    RecipeSummary,
+    RecipeTag,
+    Tag,
+)
+
+
+def create_user(email='user@example.com'):
+    '''Create and return a new user.'''
+    return get_user_model().objects.create_user(email, 'password123')
+
+
+class DeletionTests(TestCase):
+    '''Test scheduling and running user deletion.'''
+
+    def setUp(self) -> None:
+        self.media = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings.enable()
+        self.user = create_user()
+        self.other = create_user('other@example.com')
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.media.cleanup()
+
+    def create_recipe(self, user, image=''):
+        '''Create a tagged recipe and log it like the API does.'''
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=10,
+            price=Decimal('2.00'), image=image,
+        )
+        recipe.tags.add(Tag.objects.get_or_create(user=user, name='Dinner')[0])
+        recipe.ingredients.add(
+            Ingredient.objects.get_or_create(user=user, name='Salt')[0])
+        hooks.recipes_saved(user.id, [recipe.id])
+        return recipe
+
+    def test_schedule_deactivates_user(self):
+        '''Test scheduling signs the user out and queues the job.'''
+        Token.objects.create(user=self.user)
+
+        deletion.schedule(self.user)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        job = Job.objects.get()
+        self.assertEqual(job.name, deletion.delete_user.job_name)
+        self.assertEqual(job.kwargs, {'user_id': self.user.id})
+
+    def test_delete_user_in_chunks(self):
+        '''Test the job deletes all data over several runs.'''
+        storage = Recipe._meta.get_field('image').storage
+        image = storage.save('uploads/recipe/soup.jpg', ContentFile(b'x'))
+        self.create_recipe(self.user, image=image)
+        for _ in range(3):
+            self.create_recipe(self.user)
+        kept = self.create_recipe(self.other)
+
+        jobs.enqueue(deletion.delete_user, user_id=self.user.id, chunk_size=3)
+        runs = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            while jobs.run_next() is not None:
+                runs += 1
+
+        self.assertGreater(runs, 3)
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists())
+        for model in [Recipe, RecipeTag, RecipeSummary, Tag, Change]:
+            with self.subTest(model=model):
+                self.assertFalse(
+                    model.objects.filter(user_id=self.user.id).exists())
+        self.assertFalse(storage.exists(image))
+        self.assertEqual(list(Recipe.objects.all()), [kept])
+        self.assertEqual(
+            RecipeTag.objects.filter(recipe=kept).count(), 1)
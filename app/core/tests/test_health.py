@@ -0,0 +1,39 @@
+'''
+Tests for the health check endpoints.
+'''
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+
+@patch('core.probes.probe_storage')
+@patch('core.probes.probe_database')
+class HealthCheckTests(SimpleTestCase):
+    '''Test liveness and readiness endpoints.'''
+
+    def test_liveness_skips_dependencies(self, patched_db, patched_storage):
+        '''Test /healthz responds without probing dependencies.'''
+        res = self.client.get('/healthz', HTTP_HOST='internal.invalid')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+        patched_db.assert_not_called()
+
+    def test_readiness_result_is_cached(self, patched_db, patched_storage):
+        '''Test /readyz reuses its result within the cache window.'''
+        self.client.get('/readyz')
+        res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 200)
+        patched_db.assert_called_once_with('default')
+        patched_storage.assert_called_once_with()
+
+    @override_settings(READINESS_CACHE_SECONDS=0)
+    def test_readiness_reports_failures(self, patched_db, patched_storage):
+        '''Test /readyz returns 503 naming unavailable dependencies.'''
+        patched_storage.side_effect = OSError
+
+        res = self.client.get('/readyz/')
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['failures'], ['storage'])
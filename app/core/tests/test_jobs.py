@@ -0,0 +1,132 @@
+'''
+Tests for the Postgres job queue.
+'''
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from core import jobs
+from core.management.commands.run_workers import work
+from core.models import Job, Tag
+
+calls = []
+claimed = threading.Event()
+release = threading.Event()
+stop = threading.Event()
+
+
+@jobs.task
+def record(value):
+    calls.append(value)
+
+
+@jobs.task
+def fail_after_write(user_id):
+    Tag.objects.create(user_id=user_id, name='Partial')
+    raise RuntimeError('Boom')
+
+
+@jobs.task
+def block():
+    claimed.set()
+    release.wait(5)
+
+
+@jobs.task
+def stop_worker():
+    stop.set()
+
+
+class JobQueueTests(TestCase):
+    '''Test enqueueing and running jobs.'''
+
+    def setUp(self) -> None:
+        calls.clear()
+
+    def test_enqueue_requires_task(self):
+        '''Test only functions marked as tasks can be enqueued.'''
+        with self.assertRaises(ValueError):
+            jobs.enqueue(print, value=1)
+
+    def test_jobs_run_by_priority(self):
+        '''Test higher priorities run first and done jobs are removed.'''
+        jobs.enqueue(record, value='low')
+        jobs.enqueue(record, priority=10, value='high')
+        jobs.enqueue(record, delay=60, value='later')
+
+        out = StringIO()
+        call_command('run_workers', once=True, stdout=out)
+
+        self.assertEqual(calls, ['high', 'low'])
+        self.assertIn('Ran 2 jobs.', out.getvalue())
+        self.assertEqual(Job.objects.get().kwargs, {'value': 'later'})
+
+    def test_failed_job_retried_then_kept(self):
+        '''Test failures roll back, back off and give up eventually.'''
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        job = jobs.enqueue(fail_after_write, max_attempts=2, user_id=user.id)
+
+        jobs.run_next()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=4))
+        self.assertIn('RuntimeError: Boom', job.last_error)
+        self.assertFalse(Tag.objects.exists())
+
+        Job.objects.update(run_at=timezone.now())
+        jobs.run_next()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNone(jobs.run_next())
+
+    @patch('signal.signal')
+    def test_worker_runs_until_stopped(self, patched_signal):
+        '''Test a worker process loop runs jobs until told to stop.'''
+        stop.clear()
+        jobs.enqueue(record, priority=1, value='first')
+        jobs.enqueue(stop_worker)
+
+        with patch('core.management.commands.run_workers.connections'):
+            work(stop, 0.01)
+
+        self.assertEqual(calls, ['first'])
+
+
+class SkipLockedTests(TransactionTestCase):
+    '''Test concurrent workers do not claim the same job.'''
+
+    def test_locked_job_skipped(self):
+        '''Test a job being run is skipped by other workers.'''
+        claimed.clear()
+        release.clear()
+        calls.clear()
+        jobs.enqueue(block, priority=1)
+        jobs.enqueue(record, value='other')
+
+        def first_worker():
+            jobs.run_next()
+            connection.close()
+
+        thread = threading.Thread(target=first_worker)
+        thread.start()
+        self.assertTrue(claimed.wait(5))
+        try:
+            job = jobs.run_next()
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(job.name, record.job_name)
+        self.assertEqual(calls, ['other'])
+        self.assertFalse(Job.objects.exists())
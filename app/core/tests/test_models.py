@@ -2,6 +2,7 @@
 from unittest.mock import patch
 from decimal import Decimal
 
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -93,6 +94,53 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_ingredient_key_normalized(self):
+        '''Test ingredients keep a case and space insensitive key.'''
+        user = create_user()
+        ingredient = models.Ingredient.objects.create(
+            user=user,
+            name='  Olive   OIL ',
+        )
+        self.assertEqual(ingredient.key, 'olive oil')
+
+        ingredient.name = 'Sea Salt'
+        ingredient.save(update_fields=['name'])
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.key, 'sea salt')
+
+    def test_normalize_name(self):
+        '''Test names are folded and plurals share the singular's key.'''
+        cases = [
+            ('Tomatoes', 'tomato'),
+            ('Berries', 'berrie'),
+            ('Berry', 'berrie'),
+            ('Cookies', 'cookie'),
+            ('Cookie', 'cookie'),
+            ('Pies', 'pie'),
+            ('Brownies', 'brownie'),
+            ('Peaches', 'peach'),
+            ('Quiches', 'quich'),
+            ('Quiche', 'quich'),
+            ('Glasses', 'glass'),
+            ('Turkey', 'turkey'),
+            ('  Green   BEANS ', 'green bean'),
+            ('Hummus', 'hummus'),
+            ('Swiss', 'swiss'),
+            ('Peas', 'pea'),
+            ('Gas', 'gas'),
+        ]
+        for name, key in cases:
+            with self.subTest(name=name):
+                self.assertEqual(models.normalize_name(name), key)
+
+    def test_tag_names_unique_per_user_after_normalizing(self):
+        '''Test a user cannot have two tags with the same key.'''
+        user = create_user()
+        models.Tag.objects.create(user=user, name='Desserts')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='dessert')
+
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_name_uuid(self, mock_uuid):
         '''Test generating image path.'''
@@ -0,0 +1,82 @@
+'''
+Tests for hash partitioning the recipe tables.
+'''
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, transaction
+from django.test import TestCase
+
+from core import partitioning
+from core.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+
+
+class PartitioningTests(TestCase):
+    '''Test partitioned tables and converting tables.'''
+
+    def test_recipe_tables_partitioned(self):
+        '''Test migrating an empty database partitions the tables.'''
+        for table in partitioning.PARTITIONED_TABLES:
+            with self.subTest(table=table):
+                self.assertTrue(
+                    partitioning.is_partitioned(DEFAULT_DB_ALIAS, table))
+
+        out = StringIO()
+        call_command('partition_recipe_tables', stdout=out)
+        self.assertIn('core_recipe is already partitioned', out.getvalue())
+
+    def test_links_take_user_of_recipe(self):
+        '''Test links added without a user get the recipe's.'''
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'password123')
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=10, price=Decimal('2.00'))
+        tag = Tag.objects.create(user=user, name='Dinner')
+        ingredient = Ingredient.objects.create(user=user, name='Salt')
+
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        self.assertEqual(RecipeTag.objects.get().user_id, user.id)
+        self.assertEqual(RecipeIngredient.objects.get().user_id, user.id)
+        self.assertEqual(list(recipe.tags.all()), [tag])
+
+    def test_partition_table_keeps_rows(self):
+        '''Test converting a table keeps rows, ids and constraints.'''
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE partition_test (id bigserial PRIMARY KEY, '
+                'user_id bigint NOT NULL, value int NOT NULL, '
+                'CONSTRAINT partition_test_unique UNIQUE (user_id, value))')
+            cursor.execute(
+                'CREATE INDEX partition_test_value ON partition_test (value)')
+            cursor.execute(
+                'INSERT INTO partition_test (user_id, value) '
+                'SELECT i % 7, i FROM generate_series(1, 100) i')
+
+            partitioning.partition_table(
+                DEFAULT_DB_ALIAS, 'partition_test', 4)
+
+            self.assertTrue(partitioning.is_partitioned(
+                DEFAULT_DB_ALIAS, 'partition_test'))
+            cursor.execute('SELECT count(*), max(id) FROM partition_test')
+            self.assertEqual(cursor.fetchone(), (100, 100))
+            cursor.execute(
+                'INSERT INTO partition_test (user_id, value) '
+                'VALUES (1, 1000) RETURNING id')
+            self.assertEqual(cursor.fetchone(), (101,))
+            cursor.execute(
+                'SELECT pg_get_constraintdef(oid) FROM pg_constraint '
+                "WHERE conname = 'partition_test_pkey'")
+            self.assertEqual(
+                cursor.fetchone(), ('PRIMARY KEY (id, user_id)',))
+            cursor.execute(
+                'SELECT indexdef FROM pg_indexes '
+                "WHERE indexname = 'partition_test_value'")
+            self.assertIn('(value)', cursor.fetchone()[0])
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                cursor.execute(
+                    'INSERT INTO partition_test (user_id, value) '
+                    'VALUES (1, 1000)')
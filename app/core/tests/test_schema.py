@@ -0,0 +1,113 @@
+'''
+Tests for the precomputed OpenAPI schema.
+'''
+import gzip
+import os
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core import schema
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class CachedSchemaTests(SimpleTestCase):
+    '''Test the cached schema command and view.'''
+
+    def setUp(self) -> None:
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            SCHEMA_CACHE_DIR=self.cache_dir.name,
+            APP_VERSION='test-version',
+        )
+        self.settings.enable()
+        schema.clear_cache()
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.cache_dir.cleanup()
+        schema.clear_cache()
+
+    def test_build_schema_writes_versioned_files(self):
+        '''Test build_schema writes a file per format once per version.'''
+        call_command('build_schema', stdout=StringIO())
+
+        self.assertTrue(schema.is_built())
+        self.assertTrue(
+            schema.schema_path('json').endswith('schema-test-version.json'))
+        with patch('core.schema.build') as patched_build:
+            call_command('build_schema', stdout=StringIO())
+        patched_build.assert_not_called()
+
+    def test_schema_generated_once(self):
+        '''Test the view serves the built file without regenerating.'''
+        call_command('build_schema', stdout=StringIO())
+
+        with patch('core.schema.generate') as patched_generate:
+            res = self.client.get(SCHEMA_URL, {'format': 'json'})
+            self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        patched_generate.assert_not_called()
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'"openapi"', res.content)
+        self.assertEqual(res['ETag'], '"test-version-json"')
+
+    def test_accepts_gzip(self):
+        '''Test Accept-Encoding q-values decide whether gzip is used.'''
+        cases = [
+            ('gzip', True),
+            ('deflate, GZIP;q=0.5', True),
+            ('*', True),
+            ('', False),
+            ('br', False),
+            ('gzip;q=0', False),
+            ('gzip; q=0.0, br', False),
+            ('*, gzip;q=0', False),
+            ('gzip;q=x', False),
+        ]
+        for header, accepted in cases:
+            with self.subTest(header=header):
+                self.assertEqual(schema.accepts_gzip(header), accepted)
+
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', res)
+
+    def test_etag_and_gzip(self):
+        '''Test conditional requests and gzip encoding.'''
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn(b'openapi:', gzip.decompress(res.content))
+
+        res = self.client.get(
+            SCHEMA_URL,
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=res['ETag'],
+        )
+        self.assertEqual(res.status_code, 304)
+
+
+class ApiWorkerImportTests(SimpleTestCase):
+    '''Test the API worker settings keep the schema tooling out.'''
+
+    def test_api_urls_skip_drf_spectacular(self):
+        '''Test loading the API URLconf never imports drf_spectacular.'''
+        code = (
+            'import sys, django; django.setup(); import app.urls_api; '
+            "print(sorted(m for m in sys.modules if m.startswith('drf_')))"
+        )
+
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'app.settings_api'},
+            capture_output=True, text=True, check=True,
+        )
+
+        self.assertEqual(result.stdout.strip(), '[]')
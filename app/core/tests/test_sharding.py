@@ -0,0 +1,235 @@
+'''
+Tests for routing user data across shards.
+'''
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import changes, deletion, jobs, sharding
+from core.models import (
+    Change,
+    ChangeCompaction,
+    Job,
+    Recipe,
+    Tag,
+    UserShard,
+)
+from recipe import tasks
+
+RECIPE_URL = reverse('recipe:recipe-list')
+CHANGES_URL = reverse('recipe:changes')
+# Extra database used by the tests below, e.g. run them with
+# DB_SHARDS=shard1=devdb_shard1.
+SHARD = 'shard1'
+
+
+def create_user(email='user@example.com'):
+    '''Create and return a new user.'''
+    return get_user_model().objects.create_user(email, 'password123')
+
+
+class HashRingTests(SimpleTestCase):
+    '''Test placing keys on the consistent hash ring.'''
+
+    def test_keys_spread_over_shards(self):
+        '''Test every shard gets a fair share of keys.'''
+        ring = sharding.HashRing(['a', 'b', 'c'])
+
+        counts = {'a': 0, 'b': 0, 'c': 0}
+        for key in range(3000):
+            counts[ring.shard_for(key)] += 1
+
+        for shard, count in counts.items():
+            with self.subTest(shard=shard):
+                self.assertGreater(count, 600)
+
+    def test_adding_shard_moves_few_keys(self):
+        '''Test a new shard only takes keys, and about its share.'''
+        before = sharding.HashRing(['a', 'b', 'c'])
+        after = sharding.HashRing(['a', 'b', 'c', 'd'])
+
+        moved = [
+            key for key in range(3000)
+            if before.shard_for(key) != after.shard_for(key)
+        ]
+
+        self.assertLess(len(moved), 1200)
+        self.assertEqual({after.shard_for(key) for key in moved}, {'d'})
+
+
+class DirectoryTests(TestCase):
+    '''Test the shard directory with the default database only.'''
+
+    def setUp(self) -> None:
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_new_user_placed(self):
+        '''Test new users get a directory entry from the ring.'''
+        entry = UserShard.objects.get(user=self.user)
+
+        self.assertEqual(entry.shard, 'default')
+        self.assertFalse(entry.moving)
+        self.assertEqual(sharding.db_for_user(self.user.id), 'default')
+
+    def test_writes_refused_while_moving(self):
+        '''Test writes of a user being moved fail without changes.'''
+        sharding.set_shard(self.user.id, 'default', moving=True)
+        payload = {
+            'title': 'Soup',
+            'time_minutes': 10,
+            'price': Decimal('2.00'),
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', res)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @patch('core.changes.lock_user_in')
+    def test_lock_refused_while_moving(self, mock_lock):
+        '''Test writers of a user being moved do not wait for its lock.'''
+        sharding.set_shard(self.user.id, 'default', moving=True)
+
+        with self.assertRaises(sharding.UserMoving):
+            changes.lock_user(self.user.id)
+
+        mock_lock.assert_not_called()
+
+    def test_move_user_unknown_alias(self):
+        '''Test moving to an unconfigured database fails.'''
+        with self.assertRaisesMessage(CommandError, 'Unknown database'):
+            call_command('move_user', self.user.id, 'missing', drain=0)
+        self.assertEqual(sharding.lookup_shard(self.user.id), 'default')
+
+
+@skipUnless(SHARD in settings.DATABASES, f'needs a {SHARD} database')
+class ShardTests(TestCase):
+    '''Test users living in and moving between databases.'''
+    databases = {'default', SHARD} & set(settings.DATABASES)
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    def create_recipe(self, title='Soup'):
+        '''Create a recipe with a tag and an ingredient through the API.'''
+        payload = {
+            'title': title,
+            'time_minutes': 10,
+            'price': Decimal('2.00'),
+            'tags': [{'name': 'Dinner'}],
+            'ingredients': [{'name': 'Salt'}],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['id']
+
+    def test_new_user_data_on_ring_shard(self):
+        '''Test the data of a user placed on a shard is stored there.'''
+        with override_settings(SHARDS=[SHARD]):
+            user = create_user()
+        self.client.force_authenticate(user)
+
+        recipe_id = self.create_recipe()
+
+        self.assertTrue(get_user_model().objects.using(SHARD).filter(
+            id=user.id).exists())
+        self.assertTrue(Recipe.objects.using(SHARD).filter(
+            id=recipe_id).exists())
+        self.assertFalse(Recipe.objects.filter(id=recipe_id).exists())
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual([recipe['id'] for recipe in res.data], [recipe_id])
+
+    def test_move_user(self):
+        '''Test moving a user keeps ids, data and sync cursors.'''
+        user = create_user()
+        other = create_user('other@example.com')
+        self.client.force_authenticate(user)
+        recipe_id = self.create_recipe()
+        cursor = self.client.get(CHANGES_URL).data['cursor']
+        ChangeCompaction.objects.create(user=user, cursor=cursor)
+        Tag.objects.create(user=other, name='Stays')
+        out = StringIO()
+
+        call_command('move_user', user.id, SHARD, drain=0, stdout=out)
+
+        self.assertIn(f'Moved user {user.id} from default to {SHARD}',
+                      out.getvalue())
+        self.assertEqual(sharding.lookup_shard(user.id), SHARD)
+        for model in [Recipe, Tag, Change, ChangeCompaction]:
+            with self.subTest(model=model):
+                self.assertFalse(
+                    model.objects.filter(user=user).exists())
+                self.assertTrue(
+                    model.objects.using(SHARD).filter(user=user).exists())
+        self.assertTrue(Tag.objects.filter(user=other).exists())
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual([recipe['id'] for recipe in res.data], [recipe_id])
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Dinner')
+
+        self.assertEqual(
+            self.client.get(CHANGES_URL, {'since': cursor - 1}).status_code,
+            status.HTTP_410_GONE,
+        )
+        new_id = self.create_recipe('Stew')
+        res = self.client.get(CHANGES_URL, {'since': cursor})
+        self.assertGreater(res.data['cursor'], cursor)
+        upserted = res.data['recipes']['upserted']
+        self.assertIn(new_id, [recipe['id'] for recipe in upserted])
+
+    def test_jobs_commit_with_shard_writes(self):
+        '''Test jobs are queued and run in the transaction of the shard.'''
+        with override_settings(SHARDS=[SHARD]):
+            user = create_user()
+
+        with sharding.for_user(user.id):
+            with self.assertRaises(RuntimeError), sharding.atomic():
+                jobs.enqueue(tasks.delete_images, names=['gone.jpg'])
+                raise RuntimeError('rolled back')
+            self.assertFalse(Job.objects.exists())
+
+            with sharding.atomic():
+                jobs.enqueue(tasks.delete_images, names=['gone.jpg'])
+        self.assertFalse(Job.objects.using('default').exists())
+        self.assertEqual(Job.objects.using(SHARD).count(), 1)
+
+        job = jobs.run_next()
+
+        self.assertEqual(job.name, tasks.delete_images.job_name)
+        self.assertFalse(Job.objects.using(SHARD).exists())
+
+    def test_delete_user_on_shard(self):
+        '''Test deleting a user removes their data and copies.'''
+        with override_settings(SHARDS=[SHARD]):
+            user = create_user()
+        self.client.force_authenticate(user)
+        self.create_recipe()
+
+        deletion.schedule(user)
+        while jobs.run_next() is not None:
+            pass
+
+        User = get_user_model()
+        for alias in ['default', SHARD]:
+            with self.subTest(alias=alias):
+                self.assertFalse(
+                    User.objects.using(alias).filter(id=user.id).exists())
+        self.assertFalse(Recipe.objects.using(SHARD).exists())
+        self.assertFalse(Tag.objects.using(SHARD).exists())
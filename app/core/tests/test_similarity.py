@@ -0,0 +1,97 @@
+'''
+Tests for the in-memory recipe index.
+'''
+import random
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from core import changes, cookable, hooks, similarity
+from core.models import Ingredient, Recipe, Tag
+
+
+class RecipeIndexTests(TestCase):
+    '''Test building, refreshing and querying the index.'''
+
+    def setUp(self) -> None:
+        similarity.clear_indexes()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Dinner')
+
+    def create_recipe(self, tagged=True, ingredients=()):
+        '''Create a recipe and log it like the API does.'''
+        recipe = Recipe.objects.create(
+            user=self.user, title='Recipe', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        if tagged:
+            recipe.tags.add(self.tag)
+        recipe.ingredients.add(*ingredients)
+        hooks.recipes_saved(self.user.id, [recipe.id])
+        return recipe
+
+    def test_refresh_reloads_changed_recipes_only(self):
+        '''Test the index catches up from the change log.'''
+        first = self.create_recipe()
+        index = similarity.RecipeIndex(self.user.id)
+        index.refresh(changes.current_cursor(self.user.id))
+        second = self.create_recipe()
+
+        with patch.object(index, 'load', wraps=index.load) as load:
+            self.assertTrue(index.refresh(
+                changes.current_cursor(self.user.id)))
+        load.assert_called_once_with([second.id])
+        self.assertEqual(index.similar(first.id, 5), [(1.0, second.id)])
+
+        second.tags.clear()
+        hooks.recipes_saved(self.user.id, [second.id])
+        index.refresh(changes.current_cursor(self.user.id))
+        self.assertEqual(index.similar(first.id, 5), [])
+        self.assertEqual(index.postings[('tag', self.tag.id)], {first.id})
+
+    def test_refresh_rebuilds_after_many_changes(self):
+        '''Test the index is rebuilt when too much changed.'''
+        index = similarity.RecipeIndex(self.user.id)
+        index.refresh(changes.current_cursor(self.user.id))
+        self.create_recipe(tagged=False)
+        self.create_recipe(tagged=False)
+
+        with patch('core.similarity.INCREMENTAL_LIMIT', 1), \
+                patch.object(index, 'load', wraps=index.load) as load:
+            index.refresh(changes.current_cursor(self.user.id))
+        load.assert_called_once_with()
+        self.assertEqual(len(index.features), 2)
+
+    def test_cookable_index_matches_query(self):
+        '''Test the index ranks recipes like the grouped query.'''
+        rng = random.Random(42)
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'Item {i}')
+            for i in range(12)
+        ]
+        for _ in range(60):
+            self.create_recipe(
+                tagged=False,
+                ingredients=rng.sample(ingredients, rng.randint(0, 6)),
+            )
+
+        for attempt in range(12):
+            # Nothing at hand at first: every ingredient is missing.
+            have = [
+                item.id for item in rng.sample(
+                    ingredients, 0 if attempt < 2 else 5)
+            ]
+            max_missing = rng.choice([None, 0, 1, 3])
+            with self.subTest(have=have, max_missing=max_missing):
+                expected = cookable.rank_with_query(
+                    self.user.id, have, max_missing, 15)
+                with override_settings(COOKABLE_INDEX_MIN_RECIPES=1):
+                    ranked = cookable.rank(
+                        self.user.id, have, max_missing, 15)
+                self.assertEqual(ranked, expected)
+                self.assertTrue(similarity.is_indexed(self.user.id))
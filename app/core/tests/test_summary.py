@@ -0,0 +1,138 @@
+'''
+Tests for the denormalized recipe summary read model.
+'''
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import summary
+from core.models import (
+    Recipe,
+    RecipeSummary,
+    Tag,
+)
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def tag_detail_url(tag_id):
+    '''Create and return a tag detail url.'''
+    return reverse('recipe:tag-detail', args=[tag_id])
+
+
+@override_settings(RECIPE_SUMMARY_ENABLED=True)
+class RecipeSummaryTests(TestCase):
+    '''Test summaries are maintained by the recipe write paths.'''
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, **params):
+        '''Create a recipe through the API and return it.'''
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 10,
+            'price': Decimal('2.50'),
+            'tags': [{'name': 'Vegan'}],
+            'ingredients': [{'name': 'Salt'}],
+        }
+        payload.update(params)
+        res = self.client.post(RECIPE_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return Recipe.objects.get(id=res.data['id'])
+
+    def test_create_writes_summary(self):
+        '''Test creating a recipe stores its summary.'''
+        recipe = self.create_recipe()
+
+        row = RecipeSummary.objects.get(recipe=recipe)
+        tag = recipe.tags.get()
+        self.assertEqual(row.title, recipe.title)
+        self.assertEqual(row.tags, [{'id': tag.id, 'name': 'Vegan'}])
+        self.assertEqual(row.tag_ids, [tag.id])
+
+    def test_list_served_from_summary(self):
+        '''Test list output matches the output of the source tables.'''
+        self.create_recipe(title='First')
+        self.create_recipe(title='Second', tags=[])
+
+        res = self.client.get(RECIPE_URL)
+        with override_settings(RECIPE_SUMMARY_ENABLED=False):
+            expected = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, expected.content)
+
+    def test_list_filter_by_tags(self):
+        '''Test tag filtering against summary tag ids.'''
+        recipe = self.create_recipe(title='Tagged')
+        self.create_recipe(title='Untagged', tags=[])
+
+        tag = recipe.tags.get()
+        res = self.client.get(RECIPE_URL, {'tags': str(tag.id)})
+
+        self.assertEqual([item['id'] for item in res.data], [recipe.id])
+
+    def test_tag_rename_and_delete_refresh_summary(self):
+        '''Test renaming and deleting tags updates summaries.'''
+        recipe = self.create_recipe()
+        tag = recipe.tags.get()
+
+        self.client.patch(tag_detail_url(tag.id), {'name': 'Vegetarian'})
+        row = RecipeSummary.objects.get(recipe=recipe)
+        self.assertEqual(row.tags, [{'id': tag.id, 'name': 'Vegetarian'}])
+
+        self.client.delete(tag_detail_url(tag.id))
+        row.refresh_from_db()
+        self.assertEqual(row.tags, [])
+        self.assertEqual(row.tag_ids, [])
+
+    def test_check_and_rebuild_commands(self):
+        '''Test the checker reports drift and the rebuild fixes it.'''
+        recipe = self.create_recipe()
+        Tag.objects.filter(user=self.user).update(name='Changed')
+
+        self.assertEqual(
+            list(summary.find_inconsistencies()),
+            [(recipe.id, 'stale tags')],
+        )
+        with self.assertRaises(CommandError):
+            call_command('check_recipe_summaries', stdout=StringIO())
+
+        call_command('rebuild_recipe_summaries', stdout=StringIO())
+
+        self.assertEqual(list(summary.find_inconsistencies()), [])
+
+
+class RecipeSummaryDisabledTests(TestCase):
+    '''Test summaries are not maintained unless enabled.'''
+
+    def test_write_skipped_when_disabled(self):
+        '''Test refreshing is a no-op when the read model is disabled.'''
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=Decimal('2.50'),
+        )
+
+        summary.refresh_recipe_summaries([recipe.id])
+
+        self.assertFalse(RecipeSummary.objects.exists())
@@ -0,0 +1,116 @@
+'''
+Tests for token bucket throttling.
+'''
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import throttling
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_BULK_CREATE_URL = reverse('recipe:tag-bulk-create')
+
+
+def throttle_rates(**rates):
+    '''Return REST_FRAMEWORK settings with the given throttle rates.'''
+    return {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}
+
+
+class ThrottlingTests(TestCase):
+    '''Test per user, per scope token buckets.'''
+
+    def setUp(self) -> None:
+        cache.clear()
+        throttling.clear_leases()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(recipe_list='2/m'))
+    def test_list_throttled_with_retry_after(self):
+        '''Test requests beyond the bucket get 429 and Retry-After.'''
+        for _ in range(2):
+            res = self.client.get(RECIPES_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(int(res['Retry-After']), (29, 30))
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(recipe_list='1/m'))
+    def test_scopes_and_users_are_separate(self):
+        '''Test buckets are kept per scope and per user.'''
+        self.client.get(RECIPES_URL)
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user(
+            'other@example.com',
+            'password123',
+        ))
+
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+        self.assertEqual(
+            self.client.post(TAGS_BULK_CREATE_URL, {'names': ['A']},
+                             format='json').status_code,
+            status.HTTP_201_CREATED,
+        )
+        self.assertEqual(other.get(RECIPES_URL).status_code,
+                         status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(recipe_write='2/m'))
+    def test_tokens_refill(self):
+        '''Test tokens are refilled at the configured rate.'''
+        payload = {'title': 'Soup', 'time_minutes': 5, 'price': '1.00'}
+        timer = 'core.throttling.ScopedTokenBucketThrottle.timer'
+
+        with patch(timer, return_value=1000.0):
+            self.client.post(RECIPES_URL, payload)
+            self.client.post(RECIPES_URL, payload)
+            res = self.client.post(RECIPES_URL, payload)
+            self.assertEqual(res.status_code,
+                             status.HTTP_429_TOO_MANY_REQUESTS)
+        with patch(timer, return_value=1030.0):
+            res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(recipe_list='6000/m'))
+    def test_leased_tokens_skip_cache(self):
+        '''Test clients far below their limit mostly skip the cache.'''
+        with patch.object(cache, 'incr', wraps=cache.incr) as patched_incr:
+            for _ in range(10):
+                res = self.client.get(RECIPES_URL)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertLess(patched_incr.call_count, 3)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(recipe_list='2/m'))
+    def test_buckets_expire(self):
+        '''Test buckets are dropped once they would be full again.'''
+        shared = caches[settings.THROTTLE_CACHE]
+        timer = 'core.throttling.ScopedTokenBucketThrottle.timer'
+        with patch.object(shared, 'add', wraps=shared.add) as patched_add, \
+                patch.object(shared, 'touch', wraps=shared.touch) \
+                as patched_touch:
+            with patch(timer, return_value=1000.0):
+                for _ in range(3):
+                    self.client.get(RECIPES_URL)
+
+        self.assertEqual(patched_add.call_args.args[2], 120)
+        # The third request moved the TAT past 1080 s, a multiple of the
+        # 60 s period.
+        patched_touch.assert_called_once()
+        self.assertEqual(patched_touch.call_args.args[1], 120)
@@ -0,0 +1,155 @@
+'''
+Token bucket throttling backed by the shared cache.
+
+Each bucket is stored as a single integer, its theoretical arrival time
+(TAT, in milliseconds): the moment the bucket will be full again. Taking
+n tokens atomically adds n emission intervals with `cache.incr`; the
+request is allowed while the TAT stays within one rate period of now.
+Rejected requests give their tokens back, and the excess is the wait
+reported in `Retry-After`.
+
+A process that finds a bucket far below its limit leases a share of the
+remaining tokens in the same increment and hands them out locally, so a
+busy client well within its limit mostly skips the cache round trip.
+Leases are short-lived and already counted in the shared bucket, so they
+can only make the limit stricter, never looser.
+
+A missing bucket is a full one, so buckets expire two rate periods after
+they are written, and whenever their TAT crosses a multiple of the
+period: an increment doesn't extend the expiry, but the TAT then stays
+below the next multiple until the key expires, and so in the past.
+'''
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+LEASE_FRACTION = 0.1
+LEASE_MAX_TOKENS = 20
+LEASE_MILLISECONDS = 1000
+MAX_LEASES = 10000
+
+_lock = threading.Lock()
+# {bucket key: (leased tokens left, lease expiry ms, tokens left in bucket)}
+_leases = {}
+
+
+def clear_leases():
+    '''Forget tokens leased by this process.'''
+    with _lock:
+        _leases.clear()
+
+
+class ScopedTokenBucketThrottle(SimpleRateThrottle):
+    '''Limit each user (or client IP) per scope with a token bucket.
+
+    Views map action names to scopes in `throttle_scopes`; the `write`
+    entry applies to any other unsafe method. Rates for the scopes come
+    from DEFAULT_THROTTLE_RATES; requests without a scope or rate are not
+    limited.
+    '''
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self):
+        # The scope depends on the request, see allow_request.
+        self.wait_seconds = None
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE]
+
+    def get_scope(self, request, view):
+        '''Return the throttle scope of the view's current action.'''
+        scopes = getattr(view, 'throttle_scopes', {})
+        action = getattr(view, 'action', None)
+        if action in scopes:
+            return scopes[action]
+        if request.method not in SAFE_METHODS:
+            return scopes.get('write')
+        return None
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        self.rate = self.get_rate() if self.scope else None
+        if self.rate is None:
+            return True
+
+        num_requests, duration = self.parse_rate(self.rate)
+        self.period = duration * 1000
+        self.interval = max(1, self.period // num_requests)
+        self.timeout = -(-2 * self.period // 1000)
+        self.key = self.get_cache_key(request, view)
+        return self.take(int(self.timer() * 1000))
+
+    def take(self, now):
+        '''Take a token, from a local lease if possible.'''
+        with _lock:
+            leased, expires, remaining = _leases.pop(self.key, (0, 0, 0))
+            if leased and now < expires:
+                _leases[self.key] = (leased - 1, expires, remaining)
+                return True
+
+        lease = max(1, min(LEASE_MAX_TOKENS, int(remaining * LEASE_FRACTION)))
+        excess = self.increment(now, lease)
+        if excess > 0 and lease > 1:
+            self.give_back(lease)
+            lease = 1
+            excess = self.increment(now, lease)
+        if excess > 0:
+            self.give_back(lease)
+            self.wait_seconds = excess / 1000
+            return False
+
+        with _lock:
+            if len(_leases) >= MAX_LEASES:
+                _leases.clear()
+            _leases[self.key] = (
+                lease - 1,
+                now + LEASE_MILLISECONDS,
+                -excess // self.interval,
+            )
+        return True
+
+    def increment(self, now, tokens):
+        '''Add tokens to the bucket's TAT, return ms beyond the limit.'''
+        delta = tokens * self.interval
+        try:
+            tat = self.cache.incr(self.key, delta)
+        except ValueError:
+            if self.cache.add(self.key, now + delta, self.timeout):
+                return delta - self.period
+            tat = self.cache.incr(self.key, delta)
+
+        if tat - delta < now:
+            # The bucket had refilled completely. Concurrent requests may
+            # both reset it here, which can grant a token more than the
+            # rate only when the client was idle.
+            tat = now + delta
+            self.cache.set(self.key, tat, self.timeout)
+        elif tat // self.period != (tat - delta) // self.period:
+            self.cache.touch(self.key, self.timeout)
+        return tat - now - self.period
+
+    def give_back(self, tokens):
+        '''Return tokens taken by a rejected request.'''
+        try:
+            self.cache.decr(self.key, tokens * self.interval)
+        except ValueError:
+            pass
+
+    def wait(self):
+        return self.wait_seconds
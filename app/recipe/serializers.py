@@ -1,12 +1,23 @@
 '''Serializers for recipe API'''
+from collections import defaultdict
+from decimal import Decimal
 
 from rest_framework import serializers
 
+from core import (
+    hooks,
+    sharding,
+    summary,
+)
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
+    normalize_name,
 )
+from core.openapi import extend_schema_field
+
+BULK_MAX_ITEMS = 1000
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -26,6 +37,62 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class RecipeAttrSerializer(serializers.Serializer):
+    '''Serializer for tags or ingredients returned by bulk endpoints.'''
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(read_only=True)
+
+
+class BulkCreateSerializer(serializers.Serializer):
+    '''Serializer for creating tags or ingredients in bulk.'''
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+    )
+
+
+class BulkRenameItemSerializer(serializers.Serializer):
+    '''Serializer for a single rename in a bulk rename.'''
+    id = serializers.IntegerField()
+    name = serializers.CharField(max_length=255)
+
+
+class BulkRenameSerializer(serializers.Serializer):
+    '''Serializer for renaming tags or ingredients in bulk.'''
+    items = BulkRenameItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        '''Limit batch size and reject renaming the same item twice.'''
+        if len(items) > BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {BULK_MAX_ITEMS} '
+                f'elements.')
+        ids = [item['id'] for item in items]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError('Duplicate ids in renames.')
+        return items
+
+
+class BulkRenameResultSerializer(serializers.Serializer):
+    '''Serializer for the result of a bulk rename.'''
+    results = RecipeAttrSerializer(many=True, read_only=True)
+    merged = serializers.DictField(
+        child=serializers.IntegerField(),
+        read_only=True,
+        help_text='Map of merged ids to the id they were merged into.',
+    )
+
+
+class BulkDeleteSerializer(serializers.Serializer):
+    '''Serializer for deleting tags or ingredients in bulk.'''
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+    )
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     '''Serializer for Recipes.'''
     tags = TagSerializer(many=True, required=False)
@@ -40,49 +107,71 @@ class RecipeSerializer(serializers.ModelSerializer):
     def _get_or_create_tag(self, tags, recipe):
         '''Handel getting or creating tags as needed.'''
         auth_user = self.context['request'].user
+        created_ids = []
         for tag in tags:
             tag_obj, created = Tag.objects.get_or_create(
                 user=auth_user,
-                **tag,
+                key=normalize_name(tag['name']),
+                defaults=tag,
             )
-            recipe.tags.add(tag_obj)
+            recipe.tags.add(tag_obj, through_defaults={'user': auth_user})
+            if created:
+                created_ids.append(tag_obj.id)
+        return created_ids
 
     def _get_or_create_ingredient(self, ingredients, recipe):
         '''Handel getting or creating ingredients as needed.'''
         auth_user = self.context['request'].user
+        created_ids = []
         for ingredient in ingredients:
             ingredient_obj, created = Ingredient.objects.get_or_create(
                 user=auth_user,
-                **ingredient
+                key=normalize_name(ingredient['name']),
+                defaults=ingredient,
             )
-            recipe.ingredients.add(ingredient_obj)
+            recipe.ingredients.add(
+                ingredient_obj, through_defaults={'user': auth_user})
+            if created:
+                created_ids.append(ingredient_obj.id)
+        return created_ids
 
+    @sharding.atomic()
     def create(self, validated_data):
         '''Create Recipe.'''
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
         recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tag(tags, recipe)
-        self._get_or_create_ingredient(ingredients, recipe)
+        tag_ids = self._get_or_create_tag(tags, recipe)
+        ingredient_ids = self._get_or_create_ingredient(ingredients, recipe)
+        hooks.attrs_saved(recipe.user_id, Tag, tag_ids)
+        hooks.attrs_saved(recipe.user_id, Ingredient, ingredient_ids)
+        hooks.recipes_saved(recipe.user_id, [recipe.id])
 
         return recipe
 
+    @sharding.atomic()
     def update(self, instance, validated_data):
         '''Update Recipe.'''
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
+        tag_ids = []
+        ingredient_ids = []
 
         if tags is not None:
             instance.tags.clear()
-            self._get_or_create_tag(tags, instance)
+            tag_ids = self._get_or_create_tag(tags, instance)
 
         if ingredients is not None:
             instance.ingredients.clear()
-            self._get_or_create_ingredient(ingredients, instance)
+            ingredient_ids = self._get_or_create_ingredient(
+                ingredients, instance)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
+        hooks.attrs_saved(instance.user_id, Tag, tag_ids)
+        hooks.attrs_saved(instance.user_id, Ingredient, ingredient_ids)
+        hooks.recipes_saved(instance.user_id, [instance.id])
         return instance
 
 
@@ -92,6 +181,132 @@ class RecipeDetailSerializer(RecipeSerializer):
         fields = RecipeSerializer.Meta.fields + ['description', 'image']
 
 
+def _relation_schema(component):
+    '''Return the schema of a relation given as IDs or expanded objects.'''
+    return {'oneOf': [
+        {'type': 'array', 'items': {'type': 'integer'}},
+        {
+            'type': 'array',
+            'items': {'$ref': f'#/components/schemas/{component}'},
+        },
+    ]}
+
+
+@extend_schema_field(_relation_schema('Tag'))
+class TagRelationField(serializers.ListField):
+    '''Tag IDs, or tag objects when `tags` is expanded.'''
+
+
+@extend_schema_field(_relation_schema('Ingredient'))
+class IngredientRelationField(serializers.ListField):
+    '''Ingredient IDs, or ingredient objects when expanded.'''
+
+
+class RecipeReadSerializer(RecipeSerializer):
+    '''Schema of recipes returned by RecipeReader.'''
+    tags = TagRelationField(read_only=True)
+    ingredients = IngredientRelationField(read_only=True)
+
+
+class RecipeDetailReadSerializer(RecipeDetailSerializer):
+    '''Schema of recipe details returned by RecipeReader.'''
+    tags = TagRelationField(read_only=True)
+    ingredients = IngredientRelationField(read_only=True)
+
+
+class RecipeChangesSerializer(serializers.Serializer):
+    '''Serializer for recipe changes in the change feed.'''
+    upserted = RecipeDetailSerializer(many=True, read_only=True)
+    deleted = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True)
+
+
+class TagChangesSerializer(serializers.Serializer):
+    '''Serializer for tag changes in the change feed.'''
+    upserted = TagSerializer(many=True, read_only=True)
+    deleted = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True)
+
+
+class IngredientChangesSerializer(serializers.Serializer):
+    '''Serializer for ingredient changes in the change feed.'''
+    upserted = IngredientSerializer(many=True, read_only=True)
+    deleted = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True)
+
+
+class ChangeFeedSerializer(serializers.Serializer):
+    '''Serializer for the change feed.'''
+    cursor = serializers.IntegerField(read_only=True)
+    has_more = serializers.BooleanField(read_only=True)
+    recipes = RecipeChangesSerializer(read_only=True)
+    tags = TagChangesSerializer(read_only=True)
+    ingredients = IngredientChangesSerializer(read_only=True)
+
+
+class SimilarRecipeSerializer(RecipeSerializer):
+    '''Serializer for a recipe ranked by similarity.'''
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['score']
+
+
+class CookableRecipeSerializer(RecipeSerializer):
+    '''Serializer for a recipe ranked by missing ingredients.'''
+    matched = serializers.IntegerField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['matched', 'missing']
+
+
+class PriceBucketSerializer(serializers.Serializer):
+    '''Serializer for a price histogram bucket.'''
+    min = serializers.DecimalField(
+        max_digits=5, decimal_places=2, allow_null=True, read_only=True)
+    max = serializers.DecimalField(
+        max_digits=5, decimal_places=2, allow_null=True, read_only=True)
+    count = serializers.IntegerField(read_only=True)
+
+
+class UsageSerializer(serializers.Serializer):
+    '''Serializer for a tag or ingredient with its recipe count.'''
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(read_only=True)
+    recipe_count = serializers.IntegerField(read_only=True)
+
+
+class RecipeStatsSerializer(serializers.Serializer):
+    '''Serializer for the stats of a user's recipes.'''
+    recipe_count = serializers.IntegerField(read_only=True)
+    average_time_minutes = serializers.FloatField(
+        allow_null=True, read_only=True)
+    average_price = serializers.DecimalField(
+        max_digits=5, decimal_places=2, allow_null=True, read_only=True)
+    price_distribution = PriceBucketSerializer(many=True, read_only=True)
+    top_tags = UsageSerializer(many=True, read_only=True)
+    top_ingredients = UsageSerializer(many=True, read_only=True)
+
+
+class ShoppingListRequestSerializer(serializers.Serializer):
+    '''Serializer for the recipes to shop for.'''
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=500,
+    )
+
+
+class ShoppingListItemSerializer(serializers.Serializer):
+    '''Serializer for an ingredient to buy, merged across recipes.'''
+    name = serializers.CharField(read_only=True)
+    ingredient_ids = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True)
+    recipe_ids = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True)
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
     '''Serializer for uploading image to recipe.'''
     class Meta:
@@ -99,3 +314,113 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image']
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': 'True'}}
+
+
+class RecipeReader:
+    '''Read-only fast path producing the same output as recipe serializers.
+
+    Builds plain dicts from `.values()` rows plus one query per nested
+    relation, skipping per-object field instantiation and
+    `to_representation` calls. Output is identical to the serializer
+    named by `serializer_class`, which stays the source of the schema.
+
+    Passing `fields` restricts output to those serializer fields, and
+    `expand` lists the nested relations rendered as objects; other
+    requested relations are rendered as lists of ids.
+    '''
+    nested = {
+        'tags': 'tag',
+        'ingredients': 'ingredient',
+    }
+
+    def __init__(self, serializer_class, request=None,
+                 fields=None, expand=None):
+        self.fields = [
+            f for f in serializer_class.Meta.fields
+            if fields is None or f in fields
+        ]
+        self.expand = set(self.nested) if expand is None else set(expand)
+        self.request = request
+        price_field = Recipe._meta.get_field('price')
+        self.price_quantum = Decimal('.1') ** price_field.decimal_places
+        self.image_storage = Recipe._meta.get_field('image').storage
+
+    def _price(self, value):
+        '''Render price the way DRF DecimalField does.'''
+        return '{:f}'.format(value.quantize(self.price_quantum))
+
+    def _image(self, name):
+        '''Render image the way DRF ImageField does.'''
+        if not name:
+            return None
+        url = self.image_storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+    def _related(self, relation, recipe_ids, user_ids):
+        '''Return {recipe_id: [...]} for a nested relation.'''
+        through = Recipe._meta.get_field(relation).remote_field.through
+        target = self.nested[relation]
+        rows = through.objects.filter(
+            user_id__in=user_ids,
+            recipe_id__in=recipe_ids,
+        ).order_by('pk')
+        related = defaultdict(list)
+        if relation not in self.expand:
+            for recipe_id, obj_id in rows.values_list(
+                    'recipe_id', f'{target}_id'):
+                related[recipe_id].append(obj_id)
+            return related
+
+        for recipe_id, obj_id, name in rows.values_list(
+                'recipe_id', f'{target}_id', f'{target}__name'):
+            related[recipe_id].append({'id': obj_id, 'name': name})
+        return related
+
+    def read_summaries(self, queryset):
+        '''Return representations from RecipeSummary rows.'''
+        columns = {'id': 'recipe_id'}
+        for relation in self.nested:
+            columns[relation] = (
+                relation if relation in self.expand
+                else summary.SUMMARY_RELATIONS[relation] + '_ids'
+            )
+        rows = queryset.values_list(
+            *[columns.get(field, field) for field in self.fields])
+
+        data = []
+        for row in rows:
+            item = dict(zip(self.fields, row))
+            if 'price' in item:
+                item['price'] = self._price(item['price'])
+            data.append(item)
+        return data
+
+    def read(self, queryset):
+        '''Return representations for every recipe in queryset.'''
+        columns = [f for f in self.fields if f not in self.nested]
+        columns.extend(
+            column for column in ['id', 'user_id'] if column not in columns)
+        rows = list(queryset.values(*columns))
+        recipe_ids = [row['id'] for row in rows]
+        user_ids = {row['user_id'] for row in rows}
+        related = {
+            relation: self._related(relation, recipe_ids, user_ids)
+            for relation in self.fields if relation in self.nested
+        }
+
+        data = []
+        for row in rows:
+            item = {}
+            for field in self.fields:
+                if field in related:
+                    item[field] = related[field].get(row['id'], [])
+                elif field == 'price':
+                    item[field] = self._price(row[field])
+                elif field == 'image':
+                    item[field] = self._image(row[field])
+                else:
+                    item[field] = row[field]
+            data.append(item)
+        return data
@@ -0,0 +1,17 @@
+'''Background tasks for recipes.'''
+from core import sharding
+from core.jobs import task
+from core.models import Recipe
+
+
+@task
+def delete_images(names):
+    '''Delete image files that no recipe refers to anymore.'''
+    storage = Recipe._meta.get_field('image').storage
+    in_use = set()
+    for _ in sharding.each_shard():
+        in_use.update(Recipe.objects.filter(
+            image__in=names).values_list('image', flat=True))
+    for name in names:
+        if name not in in_use:
+            storage.delete(name)
@@ -0,0 +1,210 @@
+'''Tests for the change feed API.'''
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import changes
+from core.models import (
+    Change,
+    Recipe,
+    Tag,
+)
+
+CHANGES_URL = reverse('recipe:changes')
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def recipe_detail_url(recipe_id):
+    '''Create and return recipe detail url.'''
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def tag_detail_url(tag_id):
+    '''Create and return a tag detail url.'''
+    return reverse('recipe:tag-detail', args=[tag_id])
+
+
+class PublicChangesAPITests(TestCase):
+    '''Test unauthenticated API requests.'''
+
+    def test_auth_required(self):
+        '''Test auth is required to read changes.'''
+        res = APIClient().get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateChangesAPITests(TestCase):
+    '''Test authenticated API requests.'''
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self):
+        '''Create a recipe with a tag through the API.'''
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 10,
+            'price': Decimal('2.50'),
+            'tags': [{'name': 'Vegan'}],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+        return Recipe.objects.get(id=res.data['id'])
+
+    def test_initial_cursor(self):
+        '''Test omitting `since` returns the current cursor only.'''
+        self.create_recipe()
+
+        res = self.client.get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['cursor'],
+            Change.objects.filter(user=self.user).latest('id').id,
+        )
+        self.assertEqual(res.data['recipes']['upserted'], [])
+
+    def test_create_then_delete_is_compacted(self):
+        '''Test a created then deleted recipe is reported as deleted.'''
+        cursor = self.client.get(CHANGES_URL).data['cursor']
+        recipe = self.create_recipe()
+        tag = recipe.tags.get()
+
+        res = self.client.get(CHANGES_URL, {'since': cursor})
+
+        self.assertEqual(
+            [item['id'] for item in res.data['recipes']['upserted']],
+            [recipe.id],
+        )
+        self.assertEqual(
+            res.data['recipes']['upserted'][0]['tags'],
+            [{'id': tag.id, 'name': 'Vegan'}],
+        )
+        self.assertEqual(
+            res.data['tags']['upserted'], [{'id': tag.id, 'name': 'Vegan'}])
+
+        self.client.delete(recipe_detail_url(recipe.id))
+        res = self.client.get(CHANGES_URL, {'since': cursor})
+
+        self.assertEqual(res.data['recipes'], {
+            'upserted': [],
+            'deleted': [recipe.id],
+        })
+
+    def test_tag_rename_updates_recipes(self):
+        '''Test renaming a tag reports the tag and its recipes.'''
+        recipe = self.create_recipe()
+        tag = recipe.tags.get()
+        cursor = self.client.get(CHANGES_URL).data['cursor']
+
+        self.client.patch(tag_detail_url(tag.id), {'name': 'Vegetarian'})
+        res = self.client.get(CHANGES_URL, {'since': cursor})
+
+        self.assertEqual(
+            res.data['tags']['upserted'],
+            [{'id': tag.id, 'name': 'Vegetarian'}],
+        )
+        self.assertEqual(
+            [item['id'] for item in res.data['recipes']['upserted']],
+            [recipe.id],
+        )
+
+    def test_changes_limited_to_user(self):
+        '''Test changes of other users are not returned.'''
+        other_user = get_user_model().objects.create_user(
+            'other@example.com',
+            'password123',
+        )
+        tag = Tag.objects.create(user=other_user, name='Other')
+        changes.record(other_user.id, Tag, [tag.id], Change.UPSERT)
+
+        res = self.client.get(CHANGES_URL, {'since': 0})
+
+        self.assertEqual(res.data['tags']['upserted'], [])
+        self.assertEqual(res.data['cursor'], 0)
+
+    def test_paging_with_limit(self):
+        '''Test `limit` pages through the log.'''
+        self.create_recipe()
+        self.create_recipe()
+
+        res = self.client.get(CHANGES_URL, {'since': 0, 'limit': 1})
+
+        self.assertTrue(res.data['has_more'])
+        res = self.client.get(
+            CHANGES_URL, {'since': res.data['cursor'], 'limit': 100})
+        self.assertFalse(res.data['has_more'])
+
+    def test_limit_out_of_range_rejected(self):
+        '''Test `limit` must be between 1 and the maximum.'''
+        for limit in ['0', '5001', 'x']:
+            with self.subTest(limit=limit):
+                res = self.client.get(
+                    CHANGES_URL, {'since': 0, 'limit': limit})
+
+                self.assertEqual(
+                    res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compaction(self):
+        '''Test compaction keeps results and expires old cursors.'''
+        recipe = self.create_recipe()
+        self.client.patch(
+            recipe_detail_url(recipe.id), {'title': 'New title'})
+        self.client.delete(recipe_detail_url(recipe.id))
+        before = self.client.get(CHANGES_URL, {'since': 0}).data
+
+        superseded, tombstones = changes.compact(30)
+
+        self.assertEqual(superseded, 2)
+        self.assertEqual(tombstones, 0)
+        self.assertEqual(
+            self.client.get(CHANGES_URL, {'since': 0}).data, before)
+
+        Change.objects.update(created=timezone.now() - timedelta(days=31))
+        changes.compact(30)
+        res = self.client.get(CHANGES_URL, {'since': 0})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    def test_compaction_horizon_per_user(self):
+        '''Test compacting a user's deletions keeps others' cursors.'''
+        other_user = get_user_model().objects.create_user(
+            'other@example.com',
+            'password123',
+        )
+        tag = Tag.objects.create(user=other_user, name='Other')
+        changes.record(other_user.id, Tag, [tag.id], Change.DELETE)
+        Change.objects.update(created=timezone.now() - timedelta(days=31))
+        self.create_recipe()
+
+        changes.compact(30)
+
+        self.assertEqual(changes.horizon(self.user.id), 0)
+        self.assertGreater(changes.horizon(other_user.id), 0)
+        res = self.client.get(CHANGES_URL, {'since': 0})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_initial_cursor_after_compaction(self):
+        '''Test a fresh cursor is usable after compaction passed it.'''
+        recipe = self.create_recipe()
+        self.client.delete(recipe_detail_url(recipe.id))
+        Change.objects.update(created=timezone.now() - timedelta(days=31))
+        changes.compact(30)
+
+        cursor = self.client.get(CHANGES_URL).data['cursor']
+        res = self.client.get(CHANGES_URL, {'since': cursor})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(cursor, changes.horizon(self.user.id))
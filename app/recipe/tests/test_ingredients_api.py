@@ -1,4 +1,5 @@
 '''Test for Ingredient API.'''
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.test import TestCase
@@ -17,6 +18,8 @@ from recipe.serializers import IngredientSerializer
 
 
 INGREDIENT_URL = reverse('recipe:ingredient-list')
+BULK_CREATE_URL = reverse('recipe:ingredient-bulk-create')
+AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
 
 
 def detail_url(ingredient_id):
@@ -99,3 +102,38 @@ class PrivateIngredientAPITest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         ingredients = Ingredient.objects.filter(user=self.user)
         self.assertFalse(ingredients.exists())
+
+    def test_autocomplete_after_write(self):
+        '''Test suggestions include ingredients created since the last.'''
+        Ingredient.objects.create(user=self.user, name='Tomato')
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tomatoes'})
+        self.assertEqual([item['name'] for item in res.data], ['Tomato'])
+
+        self.client.post(BULK_CREATE_URL, {
+            'names': ['Tomato paste', 'TOMATOES'],
+        }, format='json')
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tom'})
+
+        self.assertEqual(
+            [item['name'] for item in res.data], ['Tomato', 'Tomato paste'])
+
+    def test_autocomplete_whole_words(self):
+        '''Test typing a whole singular or plural word finds the item.'''
+        for name in ['Cookies', 'Pies', 'Tomatoes', 'Peaches', 'Pepper']:
+            Ingredient.objects.create(user=self.user, name=name)
+        cases = [
+            ('cookie', ['Cookies']),
+            ('cookies', ['Cookies']),
+            ('pie', ['Pies']),
+            ('tomatoe', ['Tomatoes']),
+            ('peach', ['Peaches']),
+            ('pe', ['Peaches', 'Pepper']),
+        ]
+        # Once from the cached vocabulary, once from the database.
+        for max_items in [5000, 0]:
+            with patch('core.autocomplete.CACHE_MAX_ITEMS', max_items):
+                for prefix, names in cases:
+                    with self.subTest(prefix=prefix, max_items=max_items):
+                        res = self.client.get(AUTOCOMPLETE_URL, {'q': prefix})
+                        self.assertEqual(
+                            [item['name'] for item in res.data], names)
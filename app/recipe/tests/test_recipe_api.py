@@ -1,18 +1,24 @@
 '''Test Recipe API.'''
 import tempfile
 import os
+from io import StringIO
+from unittest.mock import patch
 
 from PIL import Image
 
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
+from drf_spectacular.generators import SchemaGenerator
+
 
 from core.models import (
     Recipe,
@@ -26,6 +32,7 @@ from recipe.serializers import (
 )
 
 RECIPE_URL = reverse('recipe:recipe-list')
+COOKABLE_URL = reverse('recipe:recipe-cookable')
 
 
 def image_upload_url(recipe_id):
@@ -38,6 +45,11 @@ def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
 
+def similar_url(recipe_id):
+    '''Create and return the similar recipes url.'''
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
 def create_recipe(user, **params):
     '''Create and retun sample recipe.'''
     defaults = {
@@ -200,6 +212,24 @@ class PrivateRecipeAPITests(TestCase):
             ).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_reuses_normalized_ingredient(self):
+        '''Test nested ingredients match existing ones by normalized name.'''
+        tomato = Ingredient.objects.create(user=self.user, name='Tomato')
+        payload = {
+            'title': 'Salad',
+            'time_minutes': 5,
+            'price': Decimal('3.00'),
+            'ingredients': [{'name': ' tomatoes'}, {'name': 'TOMATO'}],
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(list(recipe.ingredients.all()), [tomato])
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 1)
+
     def test_update_recipe_assign_ingredient(self):
         '''Test assigning an exsisting incredient when updating recipe.'''
         ingredient1 = Ingredient.objects.create(user=self.user, name='Pepper')
@@ -238,6 +268,216 @@ class PrivateRecipeAPITests(TestCase):
         self.assertNotIn(s3.data, res.data)
 
 
+class RecipeReaderTests(TestCase):
+    '''Test the lean read path matches the recipe serializers.'''
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = create_user(
+            email='user@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+
+        self.recipe = create_recipe(user=self.user, price=Decimal('5'))
+        self.recipe.image = 'uploads/recipe/sample.jpg'
+        self.recipe.save()
+        for name in ['Vegan', 'Dinner']:
+            self.recipe.tags.add(
+                Tag.objects.create(user=self.user, name=name))
+        for name in ['Salt', 'Pepper']:
+            self.recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=name))
+        create_recipe(user=self.user, title='No relations')
+
+    def test_list_output_identical(self):
+        '''Test list output is byte-identical to RecipeSerializer.'''
+        res = self.client.get(RECIPE_URL)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+        serializer = RecipeSerializer(
+            recipes, many=True, context={'request': res.wsgi_request})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, JSONRenderer().render(serializer.data))
+
+    def test_detail_output_identical(self):
+        '''Test detail output is byte-identical to RecipeDetailSerializer.'''
+        res = self.client.get(detail_url(self.recipe.id))
+
+        serializer = RecipeDetailSerializer(
+            self.recipe, context={'request': res.wsgi_request})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, JSONRenderer().render(serializer.data))
+
+    def test_sparse_fields(self):
+        '''Test `fields` trims the output and skips nested queries.'''
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[1], {
+            'id': self.recipe.id,
+            'title': self.recipe.title,
+        })
+
+    def test_expand_limits_nested_objects(self):
+        '''Test relations missing from `expand` are returned as IDs.'''
+        res = self.client.get(detail_url(self.recipe.id), {
+            'fields': 'tags,ingredients,description',
+            'expand': 'tags',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.data), [
+            'tags', 'ingredients', 'description'])
+        self.assertEqual(
+            [tag['name'] for tag in res.data['tags']], ['Vegan', 'Dinner'])
+        self.assertEqual(
+            res.data['ingredients'],
+            list(self.recipe.ingredients.order_by('id').values_list(
+                'id', flat=True)),
+        )
+
+    def test_unknown_field_rejected(self):
+        '''Test unknown `fields` entries return a 400.'''
+        res = self.client.get(RECIPE_URL, {'fields': 'title,image'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
+
+    def test_unknown_relation_rejected(self):
+        '''Test unknown `expand` entries name the relation in the 400.'''
+        res = self.client.get(RECIPE_URL, {'expand': 'tags,steps'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['expand'], ['Unknown relation: steps'])
+
+    def test_schema_allows_ids_or_objects(self):
+        '''Test the schema documents relations as IDs or objects.'''
+        schemas = SchemaGenerator().get_schema(
+            request=None, public=True)['components']['schemas']
+
+        for component in ['RecipeRead', 'RecipeDetailRead']:
+            tags = schemas[component]['properties']['tags']
+            self.assertEqual(tags['oneOf'], [
+                {'type': 'array', 'items': {'type': 'integer'}},
+                {
+                    'type': 'array',
+                    'items': {'$ref': '#/components/schemas/Tag'},
+                },
+            ])
+            ingredients = schemas[component]['properties']['ingredients']
+            self.assertEqual(
+                ingredients['oneOf'][1]['items'],
+                {'$ref': '#/components/schemas/Ingredient'},
+            )
+
+    def test_detail_not_found(self):
+        '''Test retrieving a missing recipe returns 404.'''
+        res = self.client.get(detail_url(self.recipe.id + 100))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeDiscoveryTests(TestCase):
+    '''Test the similar recipes and cookable recipes APIs.'''
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def create(self, title, tags=(), ingredients=()):
+        '''Create a recipe through the API and return its id.'''
+        res = self.client.post(RECIPE_URL, {
+            'title': title,
+            'time_minutes': 10,
+            'price': Decimal('2.50'),
+            'tags': [{'name': name} for name in tags],
+            'ingredients': [{'name': name} for name in ingredients],
+        }, format='json')
+        return res.data['id']
+
+    def test_similar_ranked_by_overlap(self):
+        '''Test recipes are ranked by shared tags and ingredients.'''
+        base = self.create('Curry', ['Dinner'], ['Rice', 'Chicken'])
+        close = self.create('Biryani', ['Dinner'], ['Rice', 'Chicken'])
+        far = self.create('Rice pudding', ['Dessert'], ['Rice', 'Milk'])
+        self.create('Salad', ['Lunch'], ['Lettuce'])
+
+        res = self.client.get(similar_url(base))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [close, far])
+        self.assertEqual(res.data[0]['score'], 1.0)
+        self.assertEqual(res.data[1]['score'], 0.2)
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Dinner')
+
+    def test_similar_follows_writes(self):
+        '''Test rankings reflect recipes changed after the first read.'''
+        base = self.create('Curry', ['Dinner'], ['Rice'])
+        other = self.create('Stew', ['Lunch'], ['Beef'])
+        self.assertEqual(self.client.get(similar_url(base)).data, [])
+
+        self.client.patch(
+            detail_url(other), {'tags': [{'name': 'Dinner'}]}, format='json')
+        res = self.client.get(similar_url(base))
+        self.assertEqual([item['id'] for item in res.data], [other])
+
+        self.client.delete(detail_url(other))
+        self.assertEqual(self.client.get(similar_url(base)).data, [])
+
+    def test_similar_limited_to_own_recipes(self):
+        '''Test other users' recipes are neither ranked nor accessible.'''
+        base = self.create('Curry', ['Dinner'], ['Rice'])
+        other_client = APIClient()
+        other_client.force_authenticate(
+            create_user(email='other@example.com', password='test123'))
+        other_client.post(RECIPE_URL, {
+            'title': 'Curry', 'time_minutes': 10, 'price': Decimal('2.50'),
+            'tags': [{'name': 'Dinner'}],
+        }, format='json')
+
+        self.assertEqual(self.client.get(similar_url(base)).data, [])
+        self.assertEqual(other_client.get(similar_url(base)).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            self.client.get(similar_url(base), {'limit': 0}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    def test_cookable_ranked_by_missing(self):
+        '''Test recipes are ranked by how few ingredients they miss.'''
+        toast = self.create('Toast', ingredients=['Bread', 'Butter'])
+        sandwich = self.create(
+            'Sandwich', ingredients=['Bread', 'Cheese', 'Ham'])
+        cake = self.create('Cake', ingredients=['Flour', 'Eggs', 'Sugar'])
+        have = Ingredient.objects.filter(
+            user=self.user, name__in=['Bread', 'Butter', 'Cheese'],
+        ).values_list('id', flat=True)
+        ids = ','.join(str(ingredient_id) for ingredient_id in have)
+
+        res = self.client.get(COOKABLE_URL, {'ingredients': ids})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['id'], item['matched'], item['missing'])
+             for item in res.data],
+            [(toast, 2, 0), (sandwich, 2, 1), (cake, 0, 3)],
+        )
+        res = self.client.get(
+            COOKABLE_URL, {'ingredients': ids, 'max_missing': 1})
+        self.assertEqual([item['id'] for item in res.data], [toast, sandwich])
+
+    def test_cookable_invalid_params(self):
+        '''Test invalid cookable params are rejected.'''
+        for params in ({'ingredients': 'a'}, {'max_missing': -1},
+                       {'limit': 1000}):
+            with self.subTest(params=params):
+                res = self.client.get(COOKABLE_URL, params)
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class ImageUploadTests(TestCase):
     '''Test for the image upload API.'''
 
@@ -267,3 +507,109 @@ class ImageUploadTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def upload_image(self):
+        '''Upload an image and return its URL.'''
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            res = self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': image_file},
+                format='multipart',
+            )
+        self.recipe.refresh_from_db()
+        return res.data['image']
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=True)
+    def test_image_handed_off_to_proxy(self):
+        '''Test the owner gets an X-Accel-Redirect to the image.'''
+        url = self.upload_image()
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            f'/protected-media/{self.recipe.image.name}',
+        )
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertEqual(res.content, b'')
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=False)
+    def test_image_streamed_without_proxy(self):
+        '''Test the image is sent by Django when not behind the proxy.'''
+        url = self.upload_image()
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        with self.recipe.image.open('rb') as image_file:
+            self.assertEqual(b''.join(res.streaming_content),
+                             image_file.read())
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=False)
+    def test_missing_image_not_found(self):
+        '''Test a signed URL of a deleted file returns 404.'''
+        url = self.upload_image()
+        self.recipe.image.storage.delete(self.recipe.image.name)
+
+        res = APIClient().get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_image_hidden_from_other_users(self):
+        '''Test images of other users' recipes are not served unsigned.'''
+        url = self.upload_image().split('?')[0]
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user(
+            'other@example.com',
+            'password123',
+        ))
+
+        self.assertEqual(other.get(url).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(APIClient().get(url).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=True)
+    def test_signed_image_url_needs_no_token(self):
+        '''Test image URLs from the API work without a token until expired.'''
+        url = self.upload_image()
+        anonymous = APIClient()
+
+        self.assertEqual(anonymous.get(url).status_code, status.HTTP_200_OK)
+        for tampered in [
+            url.replace('signature=', 'signature=x'),
+            url.replace('expires=', 'expires=1'),
+        ]:
+            with self.subTest(url=tampered):
+                self.assertEqual(anonymous.get(tampered).status_code,
+                                 status.HTTP_401_UNAUTHORIZED)
+        with patch('core.storage.time.time', return_value=1e10):
+            self.assertEqual(anonymous.get(url).status_code,
+                             status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=True)
+    def test_untyped_image_left_to_proxy(self):
+        '''Test no Content-Type is sent for a file of unknown type.'''
+        Recipe.objects.filter(id=self.recipe.id).update(
+            image='uploads/recipe/image.unknown')
+
+        res = self.client.get(
+            reverse('media', args=['uploads/recipe/image.unknown']))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Content-Type', res)
+
+    def test_replaced_image_deleted_in_background(self):
+        '''Test replacing an image queues deletion of the old file.'''
+        self.upload_image()
+        old_path = self.recipe.image.path
+        self.upload_image()
+
+        self.assertTrue(os.path.exists(old_path))
+        call_command('run_workers', once=True, stdout=StringIO())
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(self.recipe.image.path))
@@ -0,0 +1,115 @@
+'''
+Tests for the shopping list API.
+'''
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe
+
+SHOPPING_LIST_URL = reverse('recipe:shopping-list')
+BULK_CREATE_URL = reverse('recipe:ingredient-bulk-create')
+
+
+def create_recipe(user, *ingredients):
+    '''Create and return a recipe using ingredients.'''
+    recipe = Recipe.objects.create(
+        user=user, title='Recipe', time_minutes=10, price=Decimal('5.00'))
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+class PublicShoppingListAPITests(TestCase):
+    '''Test unauthenticated API requests.'''
+
+    def test_auth_required(self):
+        '''Test auth is required to call API.'''
+        res = APIClient().post(SHOPPING_LIST_URL, {'recipes': [1]})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateShoppingListAPITests(TestCase):
+    '''Test authenticated API requests.'''
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def ingredient(self, name):
+        '''Create and return an ingredient of the user.'''
+        return Ingredient.objects.create(user=self.user, name=name)
+
+    def test_ingredients_merged_by_name(self):
+        '''Test ingredients shared across recipes are listed once.'''
+        salt = self.ingredient('Salt')
+        eggs = self.ingredient('Eggs')
+        first = create_recipe(self.user, salt, eggs)
+        second = create_recipe(self.user, salt, eggs)
+        create_recipe(self.user, self.ingredient('Flour'))
+
+        res = self.client.post(
+            SHOPPING_LIST_URL, {'recipes': [first.id, second.id]},
+            format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'name': 'Eggs', 'ingredient_ids': [eggs.id],
+             'recipe_ids': [first.id, second.id]},
+            {'name': 'Salt', 'ingredient_ids': [salt.id],
+             'recipe_ids': [first.id, second.id]},
+        ])
+
+    def test_constant_number_of_queries(self):
+        '''Test the list is built in the same queries for many recipes.'''
+        ingredients = [self.ingredient(f'Item {i}') for i in range(20)]
+        recipes = [
+            create_recipe(self.user, *ingredients[i % 10:i % 10 + 5])
+            for i in range(200)
+        ]
+
+        with self.assertNumQueries(2):
+            res = self.client.post(
+                SHOPPING_LIST_URL,
+                {'recipes': [recipe.id for recipe in recipes]},
+                format='json',
+            )
+        self.assertEqual(len(res.data), 14)
+
+    def test_bulk_created_ingredients_keyed(self):
+        '''Test ingredients created in bulk are keyed too.'''
+        self.client.post(
+            BULK_CREATE_URL, {'names': ['Pepper', 'PEPPERS']}, format='json')
+        recipe = create_recipe(
+            self.user, *Ingredient.objects.filter(user=self.user))
+
+        res = self.client.post(
+            SHOPPING_LIST_URL, {'recipes': [recipe.id]}, format='json')
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['name'], 'Pepper')
+        self.assertEqual(len(res.data[0]['ingredient_ids']), 1)
+
+    def test_other_users_recipes_rejected(self):
+        '''Test recipes of other users cannot be listed.'''
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'password123',
+        )
+        recipe = create_recipe(other, Ingredient.objects.create(
+            user=other, name='Secret'))
+
+        res = self.client.post(
+            SHOPPING_LIST_URL, {'recipes': [recipe.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['recipes'], [f'Unknown id: {recipe.id}'])
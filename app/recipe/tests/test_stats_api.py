@@ -0,0 +1,121 @@
+'''
+Tests for the recipe stats API.
+'''
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import stats
+from core.models import Recipe, Tag
+
+STATS_URL = reverse('recipe:stats')
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    '''Create and return recipe detail url.'''
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def tag_detail_url(tag_id):
+    '''Create and return tag detail url.'''
+    return reverse('recipe:tag-detail', args=[tag_id])
+
+
+class PublicStatsAPITests(TestCase):
+    '''Test unauthenticated API requests.'''
+
+    def test_auth_required(self):
+        '''Test auth is required to call API.'''
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateStatsAPITests(TestCase):
+    '''Test authenticated API requests.'''
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def create(self, price, time_minutes, tags=()):
+        '''Create a recipe through the API and return its id.'''
+        res = self.client.post(RECIPE_URL, {
+            'title': 'Recipe',
+            'time_minutes': time_minutes,
+            'price': price,
+            'tags': [{'name': name} for name in tags],
+        }, format='json')
+        return res.data['id']
+
+    def test_empty_stats(self):
+        '''Test stats of a user without recipes.'''
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertIsNone(res.data['average_price'])
+        self.assertEqual(
+            [bucket['count'] for bucket in res.data['price_distribution']],
+            [0] * (len(stats.PRICE_BUCKETS) + 1),
+        )
+
+    def test_stats_follow_writes(self):
+        '''Test stats are updated by creating, changing and deleting.'''
+        first = self.create('4.00', 10, ['Vegan', 'Quick'])
+        self.create('12.00', 30, ['Vegan'])
+        third = self.create('60.00', 50, ['Dessert'])
+        self.client.patch(detail_url(first), {'price': '8.00'}, format='json')
+        self.client.delete(detail_url(third))
+        quick = Tag.objects.get(user=self.user, name='Quick')
+        self.client.delete(tag_detail_url(quick.id))
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertEqual(res.data['average_time_minutes'], 20.0)
+        self.assertEqual(res.data['average_price'], '10.00')
+        self.assertEqual(
+            [bucket['count'] for bucket in res.data['price_distribution']],
+            [0, 1, 1, 0, 0],
+        )
+        self.assertEqual(res.data['price_distribution'][1]['min'], '5.00')
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count'])
+             for tag in res.data['top_tags']],
+            [('Vegan', 2)],
+        )
+
+    def test_rebuild_matches_incremental(self):
+        '''Test the rebuild command reproduces maintained rollups.'''
+        self.create('4.00', 10, ['Vegan', 'Quick'])
+        self.create('30.00', 25, ['Quick'])
+        maintained = self.client.get(STATS_URL).data
+        Recipe.objects.create(
+            user=self.user, title='Admin recipe', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+
+        out = StringIO()
+        call_command('rebuild_recipe_stats', stdout=out)
+
+        self.assertIn('1 users', out.getvalue())
+        rebuilt = self.client.get(STATS_URL).data
+        self.assertEqual(rebuilt['recipe_count'], 3)
+        self.assertEqual(
+            rebuilt['top_tags'], maintained['top_tags'])
+        call_command(
+            'rebuild_recipe_stats', user_id=self.user.id, stdout=StringIO())
+        self.assertEqual(self.client.get(STATS_URL).data, rebuilt)
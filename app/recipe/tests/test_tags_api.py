@@ -1,4 +1,7 @@
 '''Tests for Tags API.'''
+from decimal import Decimal
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
@@ -6,11 +9,18 @@ from django.test import TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from core.models import Tag
+from core.models import (
+    Recipe,
+    Tag,
+)
 
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
+BULK_CREATE_URL = reverse('recipe:tag-bulk-create')
+BULK_RENAME_URL = reverse('recipe:tag-bulk-rename')
+BULK_DELETE_URL = reverse('recipe:tag-bulk-delete')
+AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
 
 
 def detail_url(tag_id):
@@ -85,6 +95,18 @@ class PrivateTagsAPITests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
 
+    def test_update_tag_name_collision_rejected(self):
+        '''Test renaming a tag onto another tag's name fails.'''
+        Tag.objects.create(user=self.user, name='Dessert')
+        tag = Tag.objects.create(user=self.user, name='After dinner')
+
+        res = self.client.patch(detail_url(tag.id), {'name': ' desserts'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'After dinner')
+
     def test_delete_tag(self):
         '''Test deleting tags.'''
         tag = Tag.objects.create(user=self.user, name='Breakfast')
@@ -94,3 +116,147 @@ class PrivateTagsAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         tags = Tag.objects.filter(user=self.user)
         self.assertFalse(tags.exists())
+
+    def test_bulk_create_tags(self):
+        '''Test bulk creating tags reuses existing names.'''
+        existing = Tag.objects.create(user=self.user, name='Vegan')
+        payload = {'names': ['vegan ', 'Dinner', 'Lunch', 'Dinners']}
+
+        res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [tag['name'] for tag in res.data], ['Vegan', 'Dinner', 'Lunch'])
+        self.assertEqual(res.data[0]['id'], existing.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_create_concurrent_tag(self):
+        '''Test a tag created by a concurrent request is returned.'''
+        bulk_create = Tag.objects.bulk_create
+
+        def create_concurrently(objs, **kwargs):
+            Tag.objects.create(user=self.user, name='Dinner')
+            return bulk_create(objs, **kwargs)
+
+        with patch.object(
+                Tag.objects, 'bulk_create', side_effect=create_concurrently):
+            res = self.client.post(
+                BULK_CREATE_URL, {'names': ['Dinner', 'Lunch']},
+                format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [tag['name'] for tag in res.data], ['Dinner', 'Lunch'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_autocomplete_tags(self):
+        '''Test suggesting the user's tags starting with a prefix.'''
+        other_user = create_user(email='other@example.com')
+        Tag.objects.create(user=other_user, name='Dinner party')
+        for name in ['Lunch', 'Dinner', 'Diet', 'Quick dinner']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'DI'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data], ['Diet', 'Dinner'])
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'di', 'limit': 1})
+        self.assertEqual([tag['name'] for tag in res.data], ['Diet'])
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'dinners'})
+        self.assertEqual([tag['name'] for tag in res.data], ['Dinner'])
+
+    def test_autocomplete_requires_prefix(self):
+        '''Test autocomplete rejects a missing prefix or bad limit.'''
+        res = self.client.get(AUTOCOMPLETE_URL)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'd', 'limit': 500})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_rename_merges_on_collision(self):
+        '''Test renaming onto an existing name merges recipe links.'''
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        target = Tag.objects.create(user=self.user, name='Dessert')
+        source = Tag.objects.create(user=self.user, name='After dinner')
+        other = Tag.objects.create(user=self.user, name='Breakfst')
+        recipe.tags.add(source, target)
+        payload = {'items': [
+            {'id': source.id, 'name': 'Dessert'},
+            {'id': other.id, 'name': 'Breakfast'},
+        ]}
+
+        res = self.client.post(BULK_RENAME_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['merged'], {str(source.id): target.id})
+        self.assertEqual(
+            [tag['id'] for tag in res.data['results']],
+            [target.id, other.id],
+        )
+        self.assertFalse(Tag.objects.filter(id=source.id).exists())
+        self.assertEqual(list(recipe.tags.all()), [target])
+        other.refresh_from_db()
+        self.assertEqual(other.name, 'Breakfast')
+
+    def test_bulk_rename_swap_and_chain(self):
+        '''Test renames may take names other renamed tags give up.'''
+        lunch = Tag.objects.create(user=self.user, name='Lunch')
+        dinner = Tag.objects.create(user=self.user, name='Dinner')
+        brunch = Tag.objects.create(user=self.user, name='Brunch')
+        snack = Tag.objects.create(user=self.user, name='Snack')
+        cases = [
+            # A swap, then a chain.
+            {lunch.id: 'Dinner', dinner.id: 'Lunch'},
+            {brunch.id: 'Snack', snack.id: 'Supper'},
+        ]
+
+        for renames in cases:
+            payload = {'items': [
+                {'id': tag_id, 'name': name}
+                for tag_id, name in renames.items()
+            ]}
+
+            res = self.client.post(BULK_RENAME_URL, payload, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data['merged'], {})
+            for tag_id, name in renames.items():
+                with self.subTest(name=name):
+                    tag = Tag.objects.get(id=tag_id)
+                    self.assertEqual(tag.name, name)
+                    self.assertEqual(tag.key, name.lower())
+
+    def test_bulk_rename_other_users_tag_rejected(self):
+        '''Test renaming tags of another user fails without changes.'''
+        other_user = create_user(email='other@example.com')
+        tag = Tag.objects.create(user=other_user, name='Vegan')
+        payload = {'items': [{'id': tag.id, 'name': 'Mine'}]}
+
+        res = self.client.post(BULK_RENAME_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Vegan')
+
+    def test_bulk_delete_tags(self):
+        '''Test bulk deleting only removes the user's tags.'''
+        other_user = create_user(email='other@example.com')
+        other_tag = Tag.objects.create(user=other_user, name='Vegan')
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ['Lunch', 'Dinner']
+        ]
+        payload = {'ids': [tag.id for tag in tags] + [other_tag.id]}
+
+        res = self.client.post(BULK_DELETE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
+        self.assertTrue(Tag.objects.filter(id=other_tag.id).exists())
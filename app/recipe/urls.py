@@ -17,5 +17,12 @@ router.register('ingredients', views.IngredientViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
+    path('changes/', views.ChangeFeedView.as_view(), name='changes'),
+    path('stats/', views.RecipeStatsView.as_view(), name='stats'),
+    path(
+        'shopping-list/',
+        views.ShoppingListView.as_view(),
+        name='shopping-list',
+    ),
     path('', include(router.urls))
 ]
@@ -1,11 +1,16 @@
 '''Views for recipe APIs.'''
-from drf_spectacular.utils import (
-    extend_schema_view,
-    extend_schema,
-    OpenApiParameter,
-    OpenApiTypes,
-)
+import mimetypes
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Min
+from django.http import FileResponse, Http404, HttpResponse
+
 from rest_framework import (
+    exceptions,
+    generics,
     viewsets,
     mixins,
     status,
@@ -15,18 +20,92 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
+from core import (
+    autocomplete,
+    bulk,
+    changes,
+    cookable,
+    hooks,
+    jobs,
+    sharding,
+    similarity,
+    stats,
+    summary,
+)
 from core.models import (
+    Change,
     Recipe,
+    RecipeSummary,
     Tag,
     Ingredient,
+    normalize_name,
 )
+from core.openapi import (
+    extend_schema_view,
+    extend_schema,
+    OpenApiParameter,
+    OpenApiTypes,
+)
+
+from recipe import serializers, tasks
 
-from recipe import serializers
+CHANGES_DEFAULT_LIMIT = 500
+CHANGES_MAX_LIMIT = 5000
+SIMILAR_DEFAULT_LIMIT = 10
+SIMILAR_MAX_LIMIT = 50
+COOKABLE_DEFAULT_LIMIT = 20
+COOKABLE_MAX_LIMIT = 100
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+RECIPE_FIELDS_PARAMETER = OpenApiParameter(
+    'fields',
+    OpenApiTypes.STR,
+    description='Comma separated list of fields to return',
+)
+RECIPE_EXPAND_PARAMETER = OpenApiParameter(
+    'expand',
+    OpenApiTypes.STR,
+    description=(
+        'Comma separated list of nested relations (tags, ingredients) '
+        'to return as objects; others are returned as lists of IDs. '
+        'All relations are expanded when omitted.'
+    ),
+)
+
+
+def _limit_param(request, default, maximum):
+    '''Return the `limit` query param between 1 and maximum.'''
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= maximum:
+        raise exceptions.ValidationError(
+            {'limit': [f'Must be between 1 and {maximum}.']})
+    return limit
+
+
+def _since_param(request):
+    '''Return the `since` cursor query param, None when omitted.'''
+    value = request.query_params.get('since')
+    if value is None:
+        return None
+    try:
+        since = int(value)
+    except ValueError:
+        since = -1
+    if since < 0:
+        raise exceptions.ValidationError(
+            {'since': ['A non-negative integer is required.']})
+    return since
 
 
 @extend_schema_view(
     list=extend_schema(
         parameters=[
+            RECIPE_FIELDS_PARAMETER,
+            RECIPE_EXPAND_PARAMETER,
             OpenApiParameter(
                 'tags',
                 OpenApiTypes.STR,
@@ -37,20 +116,73 @@ from recipe import serializers
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredients IDs to filter',
             )
-        ]
-    )
+        ],
+        responses=serializers.RecipeReadSerializer(many=True),
+    ),
+    retrieve=extend_schema(
+        parameters=[
+            RECIPE_FIELDS_PARAMETER,
+            RECIPE_EXPAND_PARAMETER,
+        ],
+        responses=serializers.RecipeDetailReadSerializer,
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(sharding.UserShardMixin, viewsets.ModelViewSet):
     '''View for manage recipe APIs.'''
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {
+        'list': 'recipe_list',
+        'upload_image': 'recipe_upload',
+        'write': 'recipe_write',
+    }
 
     def _params_to_ints(self, qs):
         '''Convert string to list of integers.'''
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _params_to_names(self, param, allowed, kind='field'):
+        '''Convert comma separated query param to a list of allowed names.'''
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = sorted(set(names) - set(allowed))
+        if unknown:
+            raise exceptions.ValidationError(
+                {param: [
+                    f'Unknown {kind}: {name}' for name in unknown]})
+        return names
+
+    def _read_ranked(self, ranking):
+        '''Return list representations for [(recipe_id, extra fields)].'''
+        reader = serializers.RecipeReader(
+            serializers.RecipeSerializer, request=self.request)
+        recipes = {
+            item['id']: item for item in reader.read(Recipe.objects.filter(
+                user=self.request.user,
+                id__in=[recipe_id for recipe_id, _ in ranking],
+            ))
+        }
+        return [
+            {**recipes[recipe_id], **extra}
+            for recipe_id, extra in ranking if recipe_id in recipes
+        ]
+
+    def get_reader(self):
+        '''Return the lean reader honouring `fields` and `expand`.'''
+        serializer_class = self.get_serializer_class()
+        return serializers.RecipeReader(
+            serializer_class,
+            request=self.request,
+            fields=self._params_to_names(
+                'fields', serializer_class.Meta.fields),
+            expand=self._params_to_names(
+                'expand', serializers.RecipeReader.nested, 'relation'),
+        )
+
     def get_queryset(self):
         '''Retrive recipe for authenticated user.'''
         tags = self.request.query_params.get('tags')
@@ -68,29 +200,158 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return queryset.filter(
             user=self.request.user).order_by('-id').distinct()
 
+    def get_summary_queryset(self):
+        '''Retrive recipe summaries for authenticated user.'''
+        tags = self.request.query_params.get('tags')
+        ingredients = self.request.query_params.get('ingredients')
+        queryset = RecipeSummary.objects.all()
+
+        if tags:
+            tag_ids = self._params_to_ints(tags)
+            queryset = queryset.filter(tag_ids__overlap=tag_ids)
+
+        if ingredients:
+            ingredient_ids = self._params_to_ints(ingredients)
+            queryset = queryset.filter(ingredient_ids__overlap=ingredient_ids)
+
+        return queryset.filter(
+            user=self.request.user).order_by('-recipe')
+
     def get_serializer_class(self):
         '''Return the serializer class for request.'''
         if self.action == 'list':
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'similar':
+            return serializers.SimilarRecipeSerializer
+        elif self.action == 'cookable':
+            return serializers.CookableRecipeSerializer
         return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        '''List recipes through the lean read path.'''
+        if summary.is_enabled():
+            return Response(self.get_reader().read_summaries(
+                self.get_summary_queryset()))
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(self.get_reader().read(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        '''Retrieve a recipe through the lean read path.'''
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        data = self.get_reader().read(queryset)
+        if not data:
+            raise Http404
+        return Response(data[0])
+
     def perform_create(self, serializer):
         '''Create a new recipe.'''
         serializer.save(user=self.request.user)
 
+    @sharding.atomic()
+    def perform_destroy(self, instance):
+        '''Delete a recipe.'''
+        recipe_id = instance.id
+        image = instance.image.name
+        instance.delete()
+        hooks.recipes_deleted(instance.user_id, [recipe_id])
+        if image:
+            jobs.enqueue(tasks.delete_images, names=[image])
+
     @ action(methods=['POST'], detail=True, url_path='upload_image')
     def upload_image(self, request, pk=None):
         '''Upload an image to recipe.'''
         recipe = self.get_object()
+        previous = recipe.image.name
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            with sharding.atomic():
+                serializer.save()
+                hooks.recipes_saved(recipe.user_id, [recipe.id])
+                if previous:
+                    jobs.enqueue(tasks.delete_images, names=[previous])
             return Response(serializer.data, status.HTTP_200_OK)
         return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description=f'Number of recipes (max {SIMILAR_MAX_LIMIT})',
+            ),
+        ],
+        responses=serializers.SimilarRecipeSerializer(many=True),
+    )
+    @action(methods=['GET'], detail=True, url_path='similar')
+    def similar(self, request, pk=None):
+        '''List the recipes sharing the most tags and ingredients.'''
+        recipe = self.get_object()
+        limit = _limit_param(request, SIMILAR_DEFAULT_LIMIT, SIMILAR_MAX_LIMIT)
+        ranking = similarity.similar_recipes(
+            request.user.id, recipe.id, limit)
+        return Response(self._read_ranked([
+            (recipe_id, {'score': round(score, 4)})
+            for score, recipe_id in ranking
+        ]))
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'ingredients',
+                OpenApiTypes.STR,
+                description='Comma separated list of ingredient IDs at hand',
+            ),
+            OpenApiParameter(
+                'max_missing',
+                OpenApiTypes.INT,
+                description='Only return recipes missing at most this many',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description=f'Number of recipes (max {COOKABLE_MAX_LIMIT})',
+            ),
+        ],
+        responses=serializers.CookableRecipeSerializer(many=True),
+    )
+    @action(methods=['GET'], detail=False, url_path='cookable')
+    def cookable(self, request):
+        '''List recipes by how few ingredients at hand they miss.'''
+        ingredients = request.query_params.get('ingredients')
+        try:
+            ingredient_ids = (
+                self._params_to_ints(ingredients) if ingredients else [])
+        except ValueError:
+            raise exceptions.ValidationError(
+                {'ingredients': ['A list of integers is required.']})
+        max_missing = request.query_params.get('max_missing')
+        if max_missing is not None:
+            try:
+                max_missing = int(max_missing)
+            except ValueError:
+                max_missing = -1
+            if max_missing < 0:
+                raise exceptions.ValidationError(
+                    {'max_missing': ['A non-negative integer is required.']})
+        limit = _limit_param(
+            request, COOKABLE_DEFAULT_LIMIT, COOKABLE_MAX_LIMIT)
+
+        ranking = cookable.rank(
+            request.user.id, ingredient_ids, max_missing, limit)
+        return Response(self._read_ranked([
+            (recipe_id, {'matched': matched, 'missing': missing})
+            for missing, matched, recipe_id in ranking
+        ]))
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -101,15 +362,41 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 description='Filter by items assigned to recipes',
             )
         ]
-    )
+    ),
+    bulk_create=extend_schema(
+        responses={201: serializers.RecipeAttrSerializer(many=True)},
+    ),
+    bulk_rename=extend_schema(
+        responses=serializers.BulkRenameResultSerializer,
+    ),
+    bulk_delete=extend_schema(responses={204: None}),
+    autocomplete=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                required=True,
+                description='Typed prefix of the name',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description=(
+                    f'Number of suggestions (max {AUTOCOMPLETE_MAX_LIMIT})'),
+            ),
+        ],
+        responses=serializers.RecipeAttrSerializer(many=True),
+    ),
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(sharding.UserShardMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     '''Base ViewSet for Recipe attributes '''
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {'write': 'recipe_write'}
 
     def get_queryset(self):
         '''Retrive Tags for the authenticated user.'''
@@ -123,14 +410,338 @@ class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
             user=self.request.user
         ).order_by('-name').distinct()
 
+    def get_serializer_class(self):
+        '''Return the serializer class for request.'''
+        if self.action == 'bulk_create':
+            return serializers.BulkCreateSerializer
+        elif self.action == 'bulk_rename':
+            return serializers.BulkRenameSerializer
+        elif self.action == 'bulk_delete':
+            return serializers.BulkDeleteSerializer
+        return self.serializer_class
+
+    @sharding.atomic()
+    def perform_update(self, serializer):
+        '''Rename item and update the recipes using it.'''
+        name = serializer.validated_data.get('name')
+        if name is not None and self.queryset.filter(
+            user=self.request.user, key=normalize_name(name),
+        ).exclude(id=serializer.instance.id).exists():
+            raise exceptions.ValidationError(
+                {'name': ['An item with this name already exists.']})
+        instance = serializer.save()
+        hooks.attrs_saved(
+            instance.user_id,
+            self.queryset.model,
+            [instance.id],
+            summary.recipe_ids_for(
+                self.recipe_relation, instance.user_id, [instance.id]),
+        )
+
+    @sharding.atomic()
+    def perform_destroy(self, instance):
+        '''Delete item and update the recipes using it.'''
+        obj_id = instance.id
+        recipe_ids = summary.recipe_ids_for(
+            self.recipe_relation, instance.user_id, [obj_id])
+        instance.delete()
+        hooks.attrs_deleted(
+            instance.user_id, self.queryset.model, [obj_id], recipe_ids)
+
+    @action(methods=['POST'], detail=False, url_path='bulk_create')
+    def bulk_create(self, request):
+        '''Create items by name, returning existing ones for known names.'''
+        serializer = self.get_serializer(data=request.data)
+
+        if serializer.is_valid():
+            with sharding.atomic():
+                objs, created_ids = bulk.bulk_create(
+                    self.queryset.model,
+                    request.user,
+                    serializer.validated_data['names'],
+                )
+                hooks.attrs_saved(
+                    request.user.id, self.queryset.model, created_ids)
+            data = serializers.RecipeAttrSerializer(objs, many=True).data
+            return Response(data, status.HTTP_201_CREATED)
+        return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['POST'], detail=False, url_path='bulk_rename')
+    def bulk_rename(self, request):
+        '''Rename items, merging into existing items with the same name.'''
+        serializer = self.get_serializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        renames = {
+            item['id']: item['name']
+            for item in serializer.validated_data['items']
+        }
+        with sharding.atomic():
+            known = set(self.queryset.select_for_update().filter(
+                user=request.user, id__in=renames,
+            ).values_list('id', flat=True))
+            unknown = sorted(set(renames) - known)
+            if unknown:
+                return Response(
+                    {'items': [
+                        f'Unknown id: {obj_id}' for obj_id in unknown
+                    ]},
+                    status.HTTP_400_BAD_REQUEST,
+                )
+
+            result, renamed_ids, merges, recipe_ids = bulk.bulk_rename(
+                self.queryset.model,
+                self.recipe_relation,
+                request.user,
+                renames,
+            )
+            hooks.attrs_saved(
+                request.user.id, self.queryset.model, renamed_ids)
+            hooks.attrs_deleted(
+                request.user.id, self.queryset.model, list(merges),
+                recipe_ids)
+
+        results = list({
+            result[obj_id].id: result[obj_id] for obj_id in renames
+        }.values())
+        data = serializers.BulkRenameResultSerializer({
+            'results': results,
+            'merged': {str(k): v for k, v in merges.items()},
+        }).data
+        return Response(data, status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=False, url_path='bulk_delete')
+    def bulk_delete(self, request):
+        '''Delete items by id.'''
+        serializer = self.get_serializer(data=request.data)
+
+        if serializer.is_valid():
+            with sharding.atomic():
+                deleted_ids, recipe_ids = bulk.bulk_delete(
+                    self.queryset.model,
+                    self.recipe_relation,
+                    request.user,
+                    serializer.validated_data['ids'],
+                )
+                hooks.attrs_deleted(
+                    request.user.id, self.queryset.model, deleted_ids,
+                    recipe_ids)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['GET'], detail=False, url_path='autocomplete')
+    def autocomplete(self, request):
+        '''Suggest items whose name starts with the `q` prefix.'''
+        prefix = request.query_params.get('q', '')
+        if not prefix.strip():
+            raise exceptions.ValidationError(
+                {'q': ['A non-empty prefix is required.']})
+        limit = _limit_param(
+            request, AUTOCOMPLETE_DEFAULT_LIMIT, AUTOCOMPLETE_MAX_LIMIT)
+
+        items = autocomplete.suggest(
+            self.queryset.model, request.user.id, prefix, limit)
+        return Response([{'id': pk, 'name': name} for pk, name in items])
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     '''Manage Tags in database.'''
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    recipe_relation = 'tags'
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     '''Manage Ingredients in database.'''
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    recipe_relation = 'ingredients'
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'since',
+            OpenApiTypes.INT,
+            description=(
+                'Cursor returned by the previous call. Omit to get the '
+                'current cursor before downloading the full library.'
+            ),
+        ),
+        OpenApiParameter(
+            'limit',
+            OpenApiTypes.INT,
+            description=f'Maximum log entries read (max {CHANGES_MAX_LIMIT})',
+        ),
+    ],
+    responses={
+        200: serializers.ChangeFeedSerializer,
+        410: OpenApiTypes.OBJECT,
+    },
+)
+class ChangeFeedView(sharding.UserShardMixin, generics.GenericAPIView):
+    '''View for changes to recipes, tags and ingredients since a cursor.'''
+    serializer_class = serializers.ChangeFeedSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    kinds = [
+        ('recipes', Recipe),
+        ('tags', Tag),
+        ('ingredients', Ingredient),
+    ]
+
+    def _upserted(self, model, ids):
+        '''Return the current representation of changed objects.'''
+        queryset = model.objects.filter(
+            user=self.request.user, id__in=ids).order_by('id')
+        if model is Recipe:
+            reader = serializers.RecipeReader(
+                serializers.RecipeDetailSerializer, request=self.request)
+            return reader.read(queryset)
+        return list(queryset.values('id', 'name'))
+
+    def get(self, request):
+        '''Return compact deltas since the `since` cursor.'''
+        since = _since_param(request)
+        limit = _limit_param(request, CHANGES_DEFAULT_LIMIT, CHANGES_MAX_LIMIT)
+        horizon = changes.horizon(request.user.id)
+        empty = {key: {'upserted': [], 'deleted': []} for key, _ in self.kinds}
+        if since is None:
+            # The user's latest entry may predate the horizon when their
+            # older entries were compacted away.
+            return Response({
+                'cursor': max(
+                    changes.current_cursor(request.user.id), horizon),
+                'has_more': False,
+                **empty,
+            })
+
+        if since < horizon:
+            return Response(
+                {'detail': 'Cursor expired, a full resync is required.'},
+                status.HTTP_410_GONE,
+            )
+
+        cursor, has_more, actions = changes.latest(
+            request.user.id, since, limit)
+        data = {'cursor': cursor, 'has_more': has_more, **empty}
+        for key, model in self.kinds:
+            kind_actions = actions.get(model._meta.model_name, {})
+            upsert_ids = [
+                obj_id for obj_id, action in kind_actions.items()
+                if action == Change.UPSERT
+            ]
+            upserted = self._upserted(model, upsert_ids) if upsert_ids else []
+            present = {item['id'] for item in upserted}
+            data[key] = {
+                'upserted': upserted,
+                'deleted': sorted(
+                    obj_id for obj_id in kind_actions
+                    if obj_id not in present
+                ),
+            }
+        return Response(data)
+
+
+class RecipeStatsView(sharding.UserShardMixin, generics.GenericAPIView):
+    '''View for aggregated stats of the user's recipes.
+
+    Served from rollup tables maintained by the write paths, so the cost
+    does not grow with the size of the library.
+    '''
+    serializer_class = serializers.RecipeStatsSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        '''Return recipe count, averages, price histogram and top items.'''
+        serializer = self.get_serializer(stats.get_stats(request.user.id))
+        return Response(serializer.data)
+
+
+@extend_schema(responses=serializers.ShoppingListItemSerializer(many=True))
+class ShoppingListView(sharding.UserShardMixin, generics.GenericAPIView):
+    '''View for the ingredients needed by a set of recipes.
+
+    Ingredients are merged by their normalized name (`Ingredient.key`,
+    computed when they are saved), so "Salt" and "salt " are listed once.
+    '''
+    serializer_class = serializers.ShoppingListRequestSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        '''Return the merged ingredients of the given recipes.'''
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        recipe_ids = set(serializer.validated_data['recipes'])
+        known = set(Recipe.objects.filter(
+            user=request.user, id__in=recipe_ids,
+        ).values_list('id', flat=True))
+        unknown = sorted(recipe_ids - known)
+        if unknown:
+            return Response(
+                {'recipes': [f'Unknown id: {pk}' for pk in unknown]},
+                status.HTTP_400_BAD_REQUEST,
+            )
+
+        through = Recipe._meta.get_field('ingredients').remote_field.through
+        items = through.objects.filter(
+            user=request.user,
+            recipe_id__in=known,
+        ).values('ingredient__key').annotate(
+            name=Min('ingredient__name'),
+            ingredient_ids=ArrayAgg(
+                'ingredient_id', distinct=True, ordering='ingredient_id'),
+            recipe_ids=ArrayAgg(
+                'recipe_id', distinct=True, ordering='recipe_id'),
+        ).order_by('ingredient__key')
+        return Response(
+            serializers.ShoppingListItemSerializer(items, many=True).data)
+
+
+@extend_schema(responses={(200, 'image/*'): OpenApiTypes.BINARY})
+class RecipeImageView(sharding.UserShardMixin, generics.GenericAPIView):
+    '''Serve a recipe image for a signed URL or to the recipe's owner.
+
+    Image URLs in API responses are signed (see SignedMediaStorage), so
+    they work as `<img src>`; unsigned ones need the owner's token.
+    Behind nginx (MEDIA_ACCEL_REDIRECT) the response only names the file
+    in `X-Accel-Redirect` and nginx sends it from an internal location,
+    so image bytes never pass through a worker. Image names are unique
+    per upload, so responses can be cached for good.
+    '''
+    authentication_classes = [TokenAuthentication]
+    permission_classes = []
+    cache_control = 'private, max-age=31536000, immutable'
+
+    def get(self, request, name):
+        '''Return the image, or 404 unless the URL or user may see it.'''
+        storage = Recipe._meta.get_field('image').storage
+        if not storage.is_signed(name, request.query_params):
+            if not request.user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            if not Recipe.objects.filter(
+                    user=request.user, image=name).exists():
+                raise Http404
+        content_type = mimetypes.guess_type(name)[0]
+        if settings.MEDIA_ACCEL_REDIRECT:
+            response = HttpResponse(content_type=content_type)
+            if content_type is None:
+                # Rather than text/html; nginx then types it by extension.
+                del response['Content-Type']
+            response['X-Accel-Redirect'] = (
+                settings.MEDIA_ACCEL_PREFIX + quote(name))
+        else:
+            try:
+                image = storage.open(name)
+            except FileNotFoundError:
+                # Signed URLs outlive files deleted with their recipe.
+                raise Http404
+            response = FileResponse(image, content_type=content_type)
+        response['Cache-Control'] = self.cache_control
+        return response
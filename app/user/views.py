@@ -1,9 +1,13 @@
 '''View for the user API.'''
 
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, authentication, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core import deletion
+from core.openapi import extend_schema
+
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
@@ -21,7 +25,7 @@ class CreateTokenView(ObtainAuthToken):
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     '''Manage the authenticated user.'''
     serializer_class = UserSerializer
     authentication_classes = [authentication.TokenAuthentication]
@@ -30,3 +34,9 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         '''Retrieve and return the authenticated user.'''
         return self.request.user
+
+    @extend_schema(responses={status.HTTP_202_ACCEPTED: None})
+    def destroy(self, request, *args, **kwargs):
+        '''Deactivate the user and delete their data in the background.'''
+        deletion.schedule(request.user)
+        return Response(status=status.HTTP_202_ACCEPTED)
@@ -3,6 +3,31 @@ server {
 
     location /static {
         alias /vol/static;
+        gzip_static on;
+        expires 1h;
+    }
+
+    # Fingerprinted files from collectstatic never change.
+    location ~ "^/static/static/.+\.[0-9a-f]{12}\.\w+$" {
+        root /vol;
+        gzip_static on;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
+    # Recipe images are only served through the app's ownership or
+    # signature check.
+    location /static/media/ {
+        return 404;
+    }
+
+    # Target of X-Accel-Redirect from the app (MEDIA_ACCEL_PREFIX). The
+    # Cache-Control header set by the app is kept; nginx adds ETag,
+    # Last-Modified and byte range support.
+    location /protected-media/ {
+        internal;
+        alias /vol/static/media/;
+        sendfile on;
+        tcp_nopush on;
     }
 
     location / {
@@ -10,4 +35,4 @@ server {
         include              /etc/nginx/uwsgi_params;
         client_max_body_size 10M;
     }
-}
\ No newline at end of file
+}
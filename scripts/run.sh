@@ -2,8 +2,14 @@
 
 set -e
 
-python manage.py wait_for_db
-python manage.py collectstatic --noinput
-python manage.py migrate
+python manage.py bootstrap
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# uWSGI options are sized to the container's CPUs and can be overridden
+# with WSGI_* variables, see `python manage.py help uwsgi_config`.
+python manage.py uwsgi_config --output /tmp/uwsgi.ini
+
+# Workers use WORKER_SETTINGS_MODULE, e.g. app.settings_api for an
+# API-only pool without admin, sessions and schema views. The app is
+# loaded once in the master and forked (no lazy-apps).
+DJANGO_SETTINGS_MODULE=${WORKER_SETTINGS_MODULE:-app.settings} \
+    uwsgi --ini /tmp/uwsgi.ini